@@ -13,6 +13,20 @@
 #define ANGLE_RIGHT 40
 
 #define SERVO_SPEED_DELAY 15 // 每移动1度需要的时间（毫秒），值越小速度越快
+
+// --- 二进制指令帧（见 detect/command_protocol.py），第一个字节仍是指令字符，兼容单字符格式 ---
+// 版本 2: timestamp 为发送时刻（不是采集时间，推理耗时不计入过期判断），并带有主机每次启动随机生成的会话号
+#define PROTOCOL_VERSION 2
+#define FRAME_SIZE 22
+#define FLAG_ANGLE 0x01
+#define FLAG_INTENSITY 0x02
+#define FLAG_ACK_REQUEST 0x08 // 主机请求应答：回复 'A' + 版本 + 0 + seq（共 7 字节）
+#define ACK_SIZE 7
+#define STALE_PACKET_MS 300 // 发送后在网络中比历史最小延迟多滞留这么久（毫秒）的数据包视为过期
+// 重新同步：会话号变化（主机重启）时立即进行；主机时钟跳变等其他情况按下面的条件兜底
+#define REORDER_WINDOW 64       // 序号比上一个小超过这么多时视为序号重置，而不是网络乱序
+#define RESYNC_SILENCE_MS 3000  // 超过这么久没有接受数据包（主机心跳为 1 秒）时，下一个数据包重新同步
+#define RESYNC_REJECTS 10       // 连续丢弃这么多个数据包后重新同步（序号重置、主机时钟跳变）
 Adafruit_NeoPixel pixels(1, LED_PIN, NEO_GRB + NEO_KHZ800);
 int targetAngle = ANGLE_CENTER;  // 舵机的目标角度
 int currentAngle = ANGLE_CENTER; // 舵机的当前角度
@@ -26,6 +40,58 @@ WiFiUDP udp;
 char incomingPacket[255]; // 用于存储接收到的UDP数据包
 Servo myServo;
 
+uint32_t lastSeq = 0;        // 最近接受的指令序号
+uint32_t lastSession = 0;    // 最近接受的指令的会话号
+bool hasSeq = false;
+uint32_t minClockOffset = 0; // 本地时钟与主机时间戳之差的（缓慢上浮的）最小值
+bool hasClockOffset = false;
+uint32_t lastAcceptTime = 0;  // 最近接受数据包的本地时间
+uint16_t consecutiveRejects = 0;
+
+// 校验二进制帧的序号和时间戳：重复、乱序或过期的数据包返回 false
+bool acceptFrame(uint32_t seq, uint32_t hostTimestamp, uint32_t session) {
+  uint32_t now = millis();
+  int32_t seqDelta = (int32_t)(seq - lastSeq);
+  if (hasSeq && (session != lastSession || now - lastAcceptTime > RESYNC_SILENCE_MS ||
+                 seqDelta < -REORDER_WINDOW || consecutiveRejects >= RESYNC_REJECTS)) {
+    // 清除序号和时钟偏差，以本数据包重新开始
+    Serial.printf("重新同步: 会话 %08x -> %08x, seq=%u, last=%u, 连续丢弃 %u 个\n", lastSession, session, seq,
+                  lastSeq, consecutiveRejects);
+    hasSeq = false;
+    hasClockOffset = false;
+    consecutiveRejects = 0;
+  }
+
+  if (hasSeq && seqDelta <= 0) {
+    Serial.printf("丢弃重复/乱序数据包: seq=%u, last=%u\n", seq, lastSeq);
+    consecutiveRejects++;
+    return false;
+  }
+
+  uint32_t offset = now - hostTimestamp;
+  if (!hasClockOffset || (int32_t)(offset - minClockOffset) < 0) {
+    minClockOffset = offset;
+    hasClockOffset = true;
+  }
+  int32_t age = (int32_t)(offset - minClockOffset);
+  if (age > STALE_PACKET_MS) {
+    Serial.printf("丢弃过期数据包: seq=%u, 延迟 %d ms\n", seq, age);
+    minClockOffset++; // 缓慢上浮，抵消两端时钟漂移
+    consecutiveRejects++;
+    return false;
+  }
+  if (age > 0) {
+    minClockOffset++;
+  }
+
+  lastSeq = seq;
+  lastSession = session;
+  hasSeq = true;
+  lastAcceptTime = now;
+  consecutiveRejects = 0;
+  return true;
+}
+
 void setup() {
     // 初始化舵机
   pixels.begin(); // 初始化NeoPixel条
@@ -73,26 +139,62 @@ void loop() {
     if (len > 0) {
       incomingPacket[len] = 0;
     }
-    Serial.printf("收到来自 %s 的数据包: %s\n", udp.remoteIP().toString().c_str(), incomingPacket);
-    
     char command = incomingPacket[0];
+    int overrideAngle = -1;
+    uint8_t intensity = 150;
+    if (len >= FRAME_SIZE && (uint8_t)incomingPacket[1] == PROTOCOL_VERSION) {
+      uint8_t flags = (uint8_t)incomingPacket[2];
+      uint32_t seq, hostTimestamp, session;
+      int16_t angle;
+      memcpy(&seq, incomingPacket + 3, 4);
+      memcpy(&hostTimestamp, incomingPacket + 7, 4);
+      memcpy(&angle, incomingPacket + 11, 2);
+      memcpy(&session, incomingPacket + 14, 4);
+      Serial.printf("收到来自 %s 的指令帧: %c seq=%u\n", udp.remoteIP().toString().c_str(), command, seq);
+      if (flags & FLAG_ACK_REQUEST) {
+        // 收到即应答（重复 / 过期的帧也应答），主机据此统计往返延迟和丢包
+        uint8_t ack[ACK_SIZE] = {'A', PROTOCOL_VERSION, 0};
+        memcpy(ack + 3, &seq, 4);
+        udp.beginPacket(udp.remoteIP(), udp.remotePort());
+        udp.write(ack, ACK_SIZE);
+        udp.endPacket();
+      }
+      if (!acceptFrame(seq, hostTimestamp, session)) {
+        command = 0; // 忽略该数据包
+      }
+      if (flags & FLAG_ANGLE) {
+        overrideAngle = constrain(angle, ANGLE_RIGHT, ANGLE_LEFT);
+      }
+      if (flags & FLAG_INTENSITY) {
+        intensity = (uint8_t)incomingPacket[13];
+      }
+    } else {
+      Serial.printf("收到来自 %s 的数据包: %s\n", udp.remoteIP().toString().c_str(), incomingPacket);
+    }
+
     switch (command) {
       case 'L':
-        targetAngle = ANGLE_LEFT;
-        pixels.setPixelColor(0, pixels.Color(0, 150, 0)); // 绿色
+        targetAngle = overrideAngle >= 0 ? overrideAngle : ANGLE_LEFT;
+        pixels.setPixelColor(0, pixels.Color(0, intensity, 0)); // 绿色
         pixels.show();
         break;
       case 'R':
-        targetAngle = ANGLE_RIGHT;
-        pixels.setPixelColor(0, pixels.Color(0, 150, 0)); // 绿色
+        targetAngle = overrideAngle >= 0 ? overrideAngle : ANGLE_RIGHT;
+        pixels.setPixelColor(0, pixels.Color(0, intensity, 0)); // 绿色
         pixels.show();
         break;
       case 'S':
       case 'C':
         targetAngle = ANGLE_CENTER;
-        pixels.setPixelColor(0, pixels.Color(150, 0, 0)); // 红色
+        pixels.setPixelColor(0, pixels.Color(intensity, 0, 0)); // 红色
         pixels.show();   // 更新条上的LED颜色
         break;
+      case 'D':
+        // 主机看门狗：超过期限没有新决策（推理或摄像头卡住），回中并用蓝色提示降级
+        targetAngle = ANGLE_CENTER;
+        pixels.setPixelColor(0, pixels.Color(0, 0, intensity)); // 蓝色
+        pixels.show();
+        break;
     }
   }
 
@@ -0,0 +1,194 @@
+"""
+自适应推理频率：SEARCHING 且中央区域附近没有障碍物时每 k 帧才运行一次 YOLO，
+AVOIDING 或有框靠近 left_bound / right_bound 时每帧都运行；
+两次推理之间用匀速运动模型外推跟踪框，状态机仍然每帧都能得到更新。
+
+对比工具（与全帧率推理比较 CPU 节省和决策一致率）:
+    python adaptive_inference.py path/to/clip.mp4 --interval 3          # 真实推理对比
+    python adaptive_inference.py --session sessions/walk1 --interval 3  # 在录制结果上模拟，无需模型
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+
+
+class TrackPropagator:
+    """保存最近一次检测到的跟踪框，并按每个ID的帧间速度外推到后续帧"""
+
+    def __init__(self):
+        self.frame_size = None
+        self.reset()
+
+    def reset(self, frame_index=0):
+        """清空保存的跟踪框和速度，画面尺寸保留"""
+        self.ids = np.empty(0, dtype=int)
+        self.boxes = np.empty((0, 4), dtype=np.float64)
+        self.velocity = np.empty((0, 4), dtype=np.float64)
+        self.confs = np.empty(0, dtype=np.float32)
+        self.clss = np.empty(0, dtype=int)
+        self.frame_index = frame_index
+
+    def update(self, tracks, frame_index, frame_size=None):
+        """用新的检测结果更新，匹配到上一次同ID的框时计算速度（像素/帧）"""
+        if frame_size is not None:
+            self.frame_size = frame_size
+        if tracks is None:
+            self.reset(frame_index)
+            return
+        boxes, ids, confs, clss = tracks
+        boxes = boxes.astype(np.float64)
+        velocity = np.zeros_like(boxes)
+        gap = frame_index - self.frame_index
+        if gap > 0 and len(self.ids):
+            order = np.argsort(self.ids)
+            positions = np.searchsorted(self.ids, ids, sorter=order)
+            positions = np.clip(positions, 0, len(self.ids) - 1)
+            matched = self.ids[order[positions]] == ids
+            previous = self.boxes[order[positions[matched]]]
+            velocity[matched] = (boxes[matched] - previous) / gap
+        self.ids, self.boxes, self.velocity, self.confs, self.clss = ids, boxes, velocity, confs, clss
+        self.frame_index = frame_index
+
+    def predict(self, frame_index):
+        """外推到 frame_index，返回与 extract_tracks 相同格式的结果"""
+        if len(self.ids) == 0:
+            return None
+        boxes = self.boxes + self.velocity * (frame_index - self.frame_index)
+        if self.frame_size is not None:
+            width, height = self.frame_size
+            boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+            boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+        return boxes.astype(int), self.ids, self.confs, self.clss
+
+
+class AdaptiveScheduler:
+    """决定当前帧是否需要运行检测器"""
+
+    def __init__(self, left_bound, right_bound, frame_width, interval=None, margin_percent=None):
+        if interval is None:
+            interval = core.SEARCH_INFERENCE_INTERVAL
+        if margin_percent is None:
+            margin_percent = core.NEAR_CORRIDOR_MARGIN
+        self.interval = max(1, interval)
+        margin = frame_width * margin_percent
+        self.near_left = left_bound - margin
+        self.near_right = right_bound + margin
+        self.frames_since_run = self.interval  # 第一帧一定运行
+        self.runs = 0
+        self.skips = 0
+
+    def should_run(self, state, tracks, class_mask, conf_threshold=None):
+        """AVOIDING、有障碍物靠近中央区域或距上次推理已满 interval 帧时返回 True"""
+        run = state == core.STATE_AVOIDING or self.frames_since_run >= self.interval
+        if not run and tracks is not None:
+            if conf_threshold is None:
+                conf_threshold = core.CONFIDENCE_THRESHOLD
+            boxes, ids, confs, clss = tracks
+            near = (boxes[:, 2] > self.near_left) & (boxes[:, 0] < self.near_right)
+            run = bool(np.any(near & (confs > conf_threshold) & class_mask[clss]))
+        if run:
+            self.frames_since_run = 1
+            self.runs += 1
+        else:
+            self.frames_since_run += 1
+            self.skips += 1
+        return run
+
+
+def run_video(model, video_path, adaptive, interval=None, margin_percent=None):
+    """在视频上运行（自适应或全帧率），返回 (逐帧指令, 推理次数, CPU秒数)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {video_path}")
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    left_bound, right_bound = core.compute_bounds(frame_width)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound, verbose=False)
+    class_mask = core.build_class_mask(model.names)
+    scheduler = AdaptiveScheduler(left_bound, right_bound, frame_width, interval, margin_percent)
+    propagator = TrackPropagator()
+    tracking = core.open_tracking(model, cap)
+
+    commands = []
+    inferences = 0
+    frame_index = 0
+    cpu_start = time.process_time()
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            predicted = propagator.predict(frame_index)
+            if not adaptive or scheduler.should_run(state_machine.state, predicted, class_mask):
+                tracks = core.track_frame(model, frame, tracking)[1]
+                propagator.update(tracks, frame_index, (frame_width, frame_height))
+                inferences += 1
+            else:
+                tracks = predicted
+            commands.append(state_machine.update(core.filter_detections(tracks, class_mask)))
+            frame_index += 1
+    finally:
+        cap.release()
+    return commands, inferences, time.process_time() - cpu_start
+
+
+def simulate_session(session, interval=None, margin_percent=None):
+    """
+    在录制结果上模拟自适应推理：跳过的帧用外推结果代替录制结果。
+    返回 (全帧率指令, 自适应指令, 推理次数)。跳帧时真实跟踪器看到的帧间隔更大，因此这只是近似。
+    """
+    class_mask = core.build_class_mask(session.names)
+    full = core.run_decisions(session.iter_tracks(), session.frame_width, class_mask)
+
+    left_bound, right_bound = core.compute_bounds(session.frame_width)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound, verbose=False)
+    scheduler = AdaptiveScheduler(left_bound, right_bound, session.frame_width, interval, margin_percent)
+    propagator = TrackPropagator()
+    commands = []
+    for frame_index in range(len(session)):
+        predicted = propagator.predict(frame_index)
+        if scheduler.should_run(state_machine.state, predicted, class_mask):
+            tracks = session.tracks(frame_index)
+            tracks = tracks if len(tracks[1]) else None
+            propagator.update(tracks, frame_index, (session.frame_width, session.frame_height))
+        else:
+            tracks = predicted
+        commands.append(state_machine.update(core.filter_detections(tracks, class_mask)))
+    return [command for _, command in full], commands, scheduler.runs
+
+
+def agreement(commands_a, commands_b):
+    same = sum(1 for a, b in zip(commands_a, commands_b) if a == b)
+    return same / max(len(commands_a), 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="自适应推理频率与全帧率推理对比")
+    parser.add_argument("video", nargs="?", default=None, help="用于对比的视频文件")
+    parser.add_argument("--session", nargs="*", default=[], help="在录制结果上模拟（无需模型）")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--interval", type=int, default=core.SEARCH_INFERENCE_INTERVAL, help="SEARCHING 时的推理间隔帧数")
+    parser.add_argument("--margin", type=float, default=core.NEAR_CORRIDOR_MARGIN, help="中央区域两侧的“靠近”余量（占画面宽度）")
+    args = parser.parse_args()
+
+    if args.video:
+        from ultralytics import YOLO
+
+        full_commands, full_runs, full_cpu = run_video(YOLO(args.model), args.video, False)
+        adaptive_commands, adaptive_runs, adaptive_cpu = run_video(YOLO(args.model), args.video, True,
+                                                                   args.interval, args.margin)
+        print(f"全帧率: 推理 {full_runs} 次, CPU {full_cpu:.1f} s")
+        print(f"自适应: 推理 {adaptive_runs} 次, CPU {adaptive_cpu:.1f} s "
+              f"(节省 {(1 - adaptive_cpu / max(full_cpu, 1e-9)) * 100:.1f}%)")
+        print(f"决策一致率: {agreement(full_commands, adaptive_commands) * 100:.2f}%")
+
+    for path in args.session:
+        from detection_log import DetectionSession
+
+        full_commands, adaptive_commands, runs = simulate_session(DetectionSession(path), args.interval, args.margin)
+        print(f"{path}: 推理 {runs}/{len(full_commands)} 帧 ({runs / max(len(full_commands), 1) * 100:.1f}%), "
+              f"决策一致率 {agreement(full_commands, adaptive_commands) * 100:.2f}%")
@@ -0,0 +1,307 @@
+"""
+CPU 推理后端选择：'pytorch' 直接加载 .pt 权重；'onnx' / 'openvino' 第一次运行时把权重导出为对应格式，
+之后从 MODEL_CACHE_DIR 加载。可选 INT8 量化版本，用 datasets 目录中的图片和 CALIBRATION_SOURCES 的抽帧做校准；
+ONNX 量化时检测头的后处理节点（Concat / Split / DFL / Sigmoid 等）保持 float32。
+'pytorch' 后端在 CACHE_FUSED_MODEL 开启时同样缓存融合 Conv+BN 之后的模型，减少冷启动时间。
+
+缓存目录按权重文件的哈希区分，权重更新后会自动重新导出:
+    MODEL_CACHE_DIR/<权重名>-<哈希>/<后端>[-int8]-<imgsz>/
+
+所有后端都返回 ultralytics 的 YOLO 对象，model.track / model.names 的用法与 .pt 权重完全相同，
+因此后面的筛选和状态机不需要任何改动。
+
+预先导出（例如在部署前）:
+    python backends.py --model yolov8n.pt --backend onnx --int8
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets")
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+QUANTIZE_VERSION = 2  # 量化方式改变时递增，旧版本的 INT8 缓存会重新导出
+MIN_CALIBRATION_SAMPLES = 50  # 校准画面少于该数量时给出警告
+# 检测头中不量化的算子类型：框坐标（像素）和类别概率（0~1）在最后的 Concat 中共用一个量化尺度，
+# 量化后类别分数几乎全部丢失；DFL 的 Softmax 和框解码同样对量化误差敏感
+HEAD_EXCLUDE_OPS = ('Concat', 'Split', 'Reshape', 'Transpose', 'Softmax', 'Sigmoid', 'Mul', 'Add', 'Sub', 'Div',
+                    'Slice')
+
+
+def parse_backend(spec):
+    """'onnx-int8' -> ('onnx', True)"""
+    backend, _, suffix = spec.partition('-')
+    if backend not in BACKENDS or suffix not in ('', 'int8') or (backend == 'pytorch' and suffix):
+        raise ValueError(f"未知的推理后端 '{spec}'，可选: pytorch, onnx, onnx-int8, openvino, openvino-int8")
+    return backend, suffix == 'int8'
+
+
+def backend_name(backend, int8):
+    return f"{backend}-int8" if int8 else backend
+
+
+def weights_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def cache_dir_for(model_path, backend, int8, imgsz, cache_root=None):
+    cache_root = cache_root or core.MODEL_CACHE_DIR
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(cache_root, f"{stem}-{weights_hash(model_path)}", f"{backend_name(backend, int8)}-{imgsz}")
+
+
+def read_cache_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def find_artifact(cache_dir, backend):
+    pattern = '*.onnx' if backend == 'onnx' else '*_openvino_model'
+    matches = sorted(glob.glob(os.path.join(cache_dir, pattern)))
+    return matches[0] if matches else None
+
+
+def calibration_images(image_dir=CALIBRATION_DIR):
+    return sorted(p for p in glob.glob(os.path.join(image_dir, '**', '*'), recursive=True)
+                  if p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def iter_calibration_frames(sources, limit):
+    """依次返回校准画面（BGR）：图片目录中的图片，以及从视频中均匀抽取的帧，最多 limit 张"""
+    directories = [source for source in sources if os.path.isdir(source)]
+    videos = [source for source in sources if not os.path.isdir(source)]
+    count = 0
+    for directory in directories:
+        for path in calibration_images(directory):
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            if count >= limit:
+                return
+            count += 1
+            yield image
+    for index, path in enumerate(videos):
+        budget = (limit - count) // (len(videos) - index)
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            print(f"警告: 无法打开校准视频 {path}")
+            continue
+        step = max(1, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) // max(budget, 1))
+        frame_index = 0
+        try:
+            while count < limit and budget > 0 and cap.grab():
+                if frame_index % step == 0:
+                    success, frame = cap.retrieve()
+                    if success:
+                        count += 1
+                        budget -= 1
+                        yield frame
+                frame_index += 1
+        finally:
+            cap.release()
+
+
+def prepare_calibration(cache_dir, sources=None, limit=None):
+    """把 datasets 目录的图片和 CALIBRATION_SOURCES 的抽帧写入 cache_dir/calibration，返回 (目录, 画面数)"""
+    sources = [CALIBRATION_DIR] + list(core.CALIBRATION_SOURCES if sources is None else sources)
+    directory = os.path.join(cache_dir, "calibration")
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for count, image in enumerate(iter_calibration_frames(sources, limit or core.CALIBRATION_SAMPLES), 1):
+        cv2.imwrite(os.path.join(directory, f"{count:05d}.jpg"), image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    if count == 0:
+        raise FileNotFoundError(f"在 {', '.join(sources)} 中没有找到校准图片")
+    if count < MIN_CALIBRATION_SAMPLES:
+        print(f"警告: INT8 校准画面只有 {count} 张，量化误差可能较大，建议在 CALIBRATION_SOURCES 中加入实际场景的视频")
+    return directory, count
+
+
+def head_nodes(model):
+    """检测头（产生模型输出的模块，YOLOv8 中为 /model.22/）里属于 HEAD_EXCLUDE_OPS 的节点名"""
+    producers = {output: node for node in model.graph.node for output in node.output}
+    last = producers[model.graph.output[0].name]
+    prefix = last.name.rsplit('/', 1)[0] + '/' if '/' in last.name else last.name
+    return [node.name for node in model.graph.node
+            if node.name.startswith(prefix) and node.op_type in HEAD_EXCLUDE_OPS]
+
+
+def letterbox(image, imgsz):
+    """与 ultralytics 预处理一致：等比缩放后用灰色(114)填充为 imgsz x imgsz，返回 1x3xHxW 的 float32"""
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def quantize_onnx(fp32_path, int8_path, imgsz, calibration_dir):
+    """用 ONNX Runtime 静态量化（QDQ 格式，按通道），校准数据为 calibration_dir 中的图片，检测头的后处理不量化"""
+    import onnx
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    images = calibration_images(calibration_dir)
+    if not images:
+        raise FileNotFoundError(f"在 {calibration_dir} 中没有找到校准图片")
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class ImageReader(CalibrationDataReader):
+        def __init__(self):
+            self.paths = iter(images)
+
+        def get_next(self):
+            path = next(self.paths, None)
+            return None if path is None else {input_name: letterbox(cv2.imread(path), imgsz)}
+
+    prepared_path = int8_path + ".prep.onnx"
+    quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)  # 导出的输入尺寸是固定的
+    excluded = head_nodes(onnx.load(prepared_path))
+    quantize_static(prepared_path, int8_path, ImageReader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, nodes_to_exclude=excluded)
+    os.remove(prepared_path)
+
+    # 保留 ultralytics 写入的元数据（类别名、步长、输入尺寸），否则加载后类别名会丢失
+    source, quantized = onnx.load(fp32_path), onnx.load(int8_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, int8_path)
+    print(f"INT8 量化完成，校准图片 {len(images)} 张，检测头中 {len(excluded)} 个节点保持 float32")
+
+
+def write_calibration_yaml(cache_dir, names, calibration_dir):
+    """
+    OpenVINO INT8 导出（NNCF）需要一个数据集描述文件，这里指向 prepare_calibration 写出的目录；
+    ultralytics 的 NNCF 导出自己会把检测头的后处理排除在量化之外
+    """
+    path = os.path.join(cache_dir, "calibration.yaml")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"path: {calibration_dir}\ntrain: .\nval: .\nnames:\n")
+        for index, name in names.items():
+            f.write(f"  {index}: {name}\n")
+    return path
+
+
+def export_model(model_path, backend, int8=False, imgsz=None, cache_root=None):
+    """导出（或从缓存中取出）指定后端的模型文件，返回其路径"""
+    from ultralytics import YOLO
+
+    imgsz = imgsz or core.INFERENCE_IMGSZ
+    cache_dir = cache_dir_for(model_path, backend, int8, imgsz, cache_root)
+    artifact = find_artifact(cache_dir, backend)
+    if artifact is not None:
+        if not int8 or read_cache_meta(cache_dir).get('quantize_version') == QUANTIZE_VERSION:
+            return artifact
+        print(f"{cache_dir} 中的 INT8 模型由旧的量化方式生成，重新导出")
+        shutil.rmtree(cache_dir)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    start = time.perf_counter()
+    model = YOLO(model_path)
+    print(f"正在导出 {model_path} -> {backend_name(backend, int8)} (imgsz={imgsz})，只在第一次运行时进行...")
+    calibration_dir, samples = prepare_calibration(cache_dir) if int8 else (None, 0)
+    if backend == 'onnx':
+        exported = model.export(format='onnx', imgsz=imgsz, simplify=True)
+        artifact = os.path.join(cache_dir, os.path.basename(exported))
+        shutil.move(exported, artifact)
+        if int8:
+            fp32_path = artifact
+            artifact = os.path.splitext(fp32_path)[0] + "_int8.onnx"
+            quantize_onnx(fp32_path, artifact, imgsz, calibration_dir)
+            os.remove(fp32_path)
+    else:
+        data = write_calibration_yaml(cache_dir, model.names, calibration_dir) if int8 else None
+        exported = model.export(format='openvino', imgsz=imgsz, int8=int8, data=data)
+        artifact = os.path.join(cache_dir, os.path.basename(os.path.normpath(exported)))
+        shutil.move(exported, artifact)
+    if calibration_dir is not None:
+        shutil.rmtree(calibration_dir)
+
+    with open(os.path.join(cache_dir, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump({'source': os.path.abspath(model_path), 'backend': backend, 'int8': int8, 'imgsz': imgsz,
+                   'quantize_version': QUANTIZE_VERSION if int8 else None, 'calibration_samples': samples,
+                   'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+                   'export_seconds': time.perf_counter() - start}, f, ensure_ascii=False, indent=2)
+    print(f"导出完成 ({time.perf_counter() - start:.1f} s)，已缓存到 {artifact}")
+    return artifact
+
+
+def warmup_model(model, imgsz=None, frames=None):
+    """用空白帧推理几次，把图优化、内存分配等一次性开销放在第一帧画面之前"""
+    imgsz = imgsz or core.INFERENCE_IMGSZ
+    frames = core.WARMUP_FRAMES if frames is None else frames
+    blank = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(frames):
+        model.predict(blank, imgsz=imgsz, verbose=False)
+
+
+def load_fused_pytorch(model_path, imgsz):
+    """加载融合 Conv+BN 后的 pytorch 模型；第一次运行时融合并缓存，之后直接从缓存加载"""
+    from ultralytics import YOLO
+
+    cache_dir = cache_dir_for(model_path, 'pytorch', False, imgsz)
+    fused_path = os.path.join(cache_dir, os.path.splitext(os.path.basename(model_path))[0] + "_fused.pt")
+    if os.path.exists(fused_path):
+        return YOLO(fused_path)
+
+    import torch
+
+    model = YOLO(model_path)
+    model.fuse()
+    os.makedirs(cache_dir, exist_ok=True)
+    # 保存 float32 模型本身：ultralytics 的 model.save 会转为 half，融合后的权重再取整会带来额外误差
+    torch.save({'model': model.model, 'train_args': dict(getattr(model.model, 'args', {}) or {})}, fused_path)
+    print(f"融合后的模型已缓存到 {fused_path}")
+    return model
+
+
+def load_model(model_path=None, backend=None, int8=None, imgsz=None, warmup=None):
+    """按配置加载模型并预热；未指定的参数使用 demo_v3.py 顶部的配置"""
+    from ultralytics import YOLO
+
+    model_path = model_path or core.MODEL_PATH
+    backend = backend or core.INFERENCE_BACKEND
+    int8 = core.BACKEND_INT8 if int8 is None else int8
+    imgsz = imgsz or core.INFERENCE_IMGSZ
+    if backend == 'pytorch':
+        model = load_fused_pytorch(model_path, imgsz) if core.CACHE_FUSED_MODEL else YOLO(model_path)
+    else:
+        model = YOLO(export_model(model_path, backend, int8, imgsz), task='detect')
+    warmup_model(model, imgsz, warmup)
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出并缓存 ONNX / OpenVINO 推理模型")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 权重路径")
+    parser.add_argument("--backend", default='onnx', choices=BACKENDS[1:], help="导出格式")
+    parser.add_argument("--int8", action="store_true", help="导出 INT8 量化版本")
+    parser.add_argument("--imgsz", type=int, default=core.INFERENCE_IMGSZ, help="推理输入尺寸")
+    parser.add_argument("--calibration", nargs='*', default=None,
+                        help="INT8 校准素材（视频文件或图片目录），默认 CALIBRATION_SOURCES")
+    parser.add_argument("--samples", type=int, default=core.CALIBRATION_SAMPLES, help="INT8 校准最多使用的画面数")
+    args = parser.parse_args()
+    if args.calibration is not None:
+        core.CALIBRATION_SOURCES = args.calibration
+    core.CALIBRATION_SAMPLES = args.samples
+
+    print(export_model(args.model, args.backend, args.int8, args.imgsz))
@@ -0,0 +1,112 @@
+"""
+检测筛选微基准：对比原来的逐框 Python 循环（类别名查列表 + 字典 + 再次遍历求最大面积）
+与 demo_v3 中基于类别ID查找表的整体数组筛选 + argmax，以及写入预分配 DetectionStore 的版本；
+并对比 AVOIDING 状态下按跟踪ID查找障碍物的开销（字典列表线性查找 / 数组比较 / 轨迹表 O(1) 查表）。
+用法: python bench_filter.py [--repeat 2000]
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+import demo_v3 as core
+
+# COCO 类别名（与 yolov8n.pt / yolo11n.pt 的 model.names 一致）
+COCO_NAMES = dict(enumerate([
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat', 'traffic light',
+    'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow',
+    'elephant', 'bear', 'zebra', 'giraffe', 'backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee',
+    'skis', 'snowboard', 'sports ball', 'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard',
+    'tennis racket', 'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair', 'couch',
+    'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone',
+    'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear',
+    'hair drier', 'toothbrush']))
+
+
+def legacy_filter(tracks, names):
+    """原 demo_v3.py 中的逐框筛选循环"""
+    detections = []
+    boxes, ids, confs, clss = tracks
+    for i, box in enumerate(boxes):
+        class_name = names[clss[i]]
+        area = (box[2] - box[0]) * (box[3] - box[1])
+        if confs[i] > core.CONFIDENCE_THRESHOLD and class_name in core.OBSTACLE_CLASSES \
+                and area > core.MIN_AREA_THRESHOLD:
+            detections.append({'id': ids[i], 'box': box, 'center_x': (box[0] + box[2]) / 2})
+    return detections
+
+
+def legacy_find_closest(detections):
+    """原 demo_v3.py 中的 find_closest_obstacle"""
+    closest_obstacle = None
+    max_area = 0
+    for obstacle in detections:
+        x1, y1, x2, y2 = obstacle['box']
+        area = (x2 - x1) * (y2 - y1)
+        if area > max_area:
+            max_area = area
+            closest_obstacle = obstacle
+    return closest_obstacle
+
+
+def make_tracks(num_boxes, rng, width=1280, height=720):
+    """生成随机的跟踪结果，框大小覆盖面积阈值上下"""
+    x1 = rng.integers(0, width - 20, num_boxes)
+    y1 = rng.integers(0, height - 20, num_boxes)
+    w = rng.integers(10, 400, num_boxes)
+    h = rng.integers(10, 400, num_boxes)
+    boxes = np.stack([x1, y1, np.minimum(x1 + w, width), np.minimum(y1 + h, height)], axis=1).astype(int)
+    ids = np.arange(1, num_boxes + 1)
+    confs = rng.uniform(0.1, 1.0, num_boxes).astype(np.float32)
+    clss = rng.integers(0, len(COCO_NAMES), num_boxes)
+    return boxes, ids, confs, clss
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检测筛选微基准")
+    parser.add_argument("--repeat", type=int, default=2000, help="每种规模的重复次数")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    class_mask = core.build_class_mask(COCO_NAMES)
+
+    store = core.create_detection_store()
+    lookups = []
+    print(f"{'框数':>6}{'循环 us':>12}{'数组 us':>12}{'加速':>8}{'存储 us':>12}")
+    for num_boxes in (10, 100, 300):
+        tracks = make_tracks(num_boxes, rng)
+
+        # 先确认两种实现选出的最近障碍物一致
+        legacy_closest = legacy_find_closest(legacy_filter(tracks, COCO_NAMES))
+        batch = core.filter_detections(tracks, class_mask)
+        index = batch.closest_index()
+        assert (legacy_closest is None) == (index < 0)
+        assert legacy_closest is None or legacy_closest['id'] == batch.ids[index]
+
+        legacy = timeit.timeit(lambda: legacy_find_closest(legacy_filter(tracks, COCO_NAMES)), number=args.repeat)
+        vectorized = timeit.timeit(lambda: core.filter_detections(tracks, class_mask).closest_index(),
+                                   number=args.repeat)
+        stored = timeit.timeit(lambda: core.load_detections(store, tracks, class_mask).closest_index(),
+                               number=args.repeat)
+        legacy_us = legacy / args.repeat * 1e6
+        vectorized_us = vectorized / args.repeat * 1e6
+        print(f"{num_boxes:>6}{legacy_us:>12.1f}{vectorized_us:>12.1f}{legacy_us / vectorized_us:>7.1f}x"
+              f"{stored / args.repeat * 1e6:>12.1f}")
+
+        # 查找当前帧中最后一个障碍物的ID（线性查找的最坏情况）
+        if len(batch):
+            target = int(batch.ids[-1])
+            detections = legacy_filter(tracks, COCO_NAMES)
+            core.load_detections(store, tracks, class_mask)
+            assert store.find(target) == batch.find(target)
+            lookups.append((num_boxes,
+                            timeit.timeit(lambda: next((d for d in detections if d['id'] == target), None),
+                                          number=args.repeat),
+                            timeit.timeit(lambda: batch.find(target), number=args.repeat),
+                            timeit.timeit(lambda: store.find(target), number=args.repeat)))
+
+    print(f"\n{'框数':>6}{'字典 us':>12}{'数组 us':>12}{'查表 us':>12}")
+    for num_boxes, legacy, vectorized, table in lookups:
+        print(f"{num_boxes:>6}{legacy / args.repeat * 1e6:>12.2f}{vectorized / args.repeat * 1e6:>12.2f}"
+              f"{table / args.repeat * 1e6:>12.2f}")
@@ -0,0 +1,39 @@
+"""
+对比有界面模式（逐帧 plot / 绘制 / imshow / 写视频）与无界面模式在同一段视频上的 FPS 和每帧CPU时间。
+用法: python bench_headless.py path/to/clip.mp4 [--model yolov8n.pt]
+注意: 有界面模式需要可用的显示环境。
+"""
+import argparse
+import os
+import tempfile
+
+from ultralytics import YOLO
+
+import demo_v3 as core
+
+
+def run_once(model_path, video_path, headless):
+    # 每次使用新的模型实例，避免跟踪器状态在两次运行之间共享
+    model = YOLO(model_path)
+    output_path = os.path.join(tempfile.gettempdir(), "bench_headless_output.mp4")
+    return core.process_video_file(model, video_path, output_path, headless=headless)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="有界面 / 无界面模式性能对比")
+    parser.add_argument("video", help="用于测试的视频文件")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    args = parser.parse_args()
+
+    gui_stats = run_once(args.model, args.video, headless=False)
+    headless_stats = run_once(args.model, args.video, headless=True)
+    if gui_stats is None or headless_stats is None:
+        raise SystemExit(1)
+
+    print("\n--- 有界面 vs 无界面 ---")
+    print(f"{'模式':<10}{'帧数':>8}{'FPS':>10}{'CPU ms/帧':>12}")
+    for label, stats in (("gui", gui_stats), ("headless", headless_stats)):
+        print(f"{label:<10}{stats['frames']:>8}{stats['fps']:>10.1f}{stats['cpu_ms_per_frame']:>12.1f}")
+    if gui_stats['fps'] > 0 and headless_stats['cpu_ms_per_frame'] > 0:
+        print(f"FPS 提升: {headless_stats['fps'] / gui_stats['fps']:.2f}x, "
+              f"每帧CPU节省: {gui_stats['cpu_ms_per_frame'] - headless_stats['cpu_ms_per_frame']:.1f} ms")
@@ -0,0 +1,136 @@
+"""
+触发方式对比：同一段素材分别用 area（面积最大的障碍物进入中央区域）和 ttc（碰撞时间低于阈值）触发避障，
+比较每条轨迹的首次触发时刻、ttc 相对 area 提前的时间，以及对静止 / 远离目标的无谓触发次数。
+每次触发按跟踪ID配对；同一ID在两种方式下都触发时才计算提前量。
+
+素材可以是视频文件（逐帧按 TRACKER 跟踪）或 detection_log.py 录制的目录（不经过模型）。
+用法:
+    python bench_ttc.py clip.mp4 sessions/walk1
+    python bench_ttc.py sessions/walk1 --threshold 1.5 --window 8
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+from roi_inference import first_triggers
+
+MODES = ('area', 'ttc')
+PAIR_WINDOW = 3.0  # 两种方式的触发相差超过该秒数时视为不同的事件，不计算提前量
+
+
+def load_tracks(path, model_path):
+    """返回 (逐帧跟踪结果, 逐帧时间戳, 画面宽度, 类别掩码)"""
+    if os.path.isdir(path):
+        from detection_log import DetectionSession
+
+        session = DetectionSession(path)
+        return (list(session.iter_tracks()), np.asarray(session.timestamps, dtype=np.float64), session.frame_width,
+                core.build_class_mask(session.names))
+
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    tracking = core.open_tracking(model, cap)
+    track_frames = []
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            track_frames.append(core.track_frame(model, frame, tracking)[1])
+    finally:
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        cap.release()
+    return track_frames, np.arange(len(track_frames)) / fps, frame_width, core.build_class_mask(model.names)
+
+
+def analyze(track_frames, timestamps, frame_width, class_mask, mode):
+    """
+    逐帧运行状态机，返回 (逐帧指令, 触发列表)。每次触发记录 (帧序号, 跟踪ID, 该目标当时的碰撞时间)；
+    碰撞时间总是在按 TTC_MIN_AREA 筛选的另一份存储上估计（area 方式的存储里小于 MIN_AREA_THRESHOLD 的历史被筛掉了），
+    用来判断触发的目标是否真的在靠近。
+    """
+    left_bound, right_bound = core.compute_bounds(frame_width)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound, verbose=False, trigger_mode=mode)
+    store = core.create_detection_store()
+    probe = core.create_detection_store()
+    min_area = core.default_min_area(mode)
+    commands, triggers = [], []
+    for index, tracks in enumerate(track_frames):
+        previous = state_machine.state
+        detections = core.load_detections(store, tracks, class_mask, min_area=min_area, timestamp=timestamps[index])
+        core.load_detections(probe, tracks, class_mask, min_area=core.TTC_MIN_AREA, timestamp=timestamps[index])
+        commands.append(state_machine.update(detections))
+        if previous == core.STATE_SEARCHING and state_machine.state == core.STATE_AVOIDING:
+            row = probe.find(state_machine.tracked_obstacle_id)
+            ttc = probe.time_to_collision(core.TTC_WINDOW)[row] if row >= 0 else np.inf
+            triggers.append((index, state_machine.tracked_obstacle_id, float(ttc)))
+    return commands, triggers
+
+
+def decision_cost(track_frames, timestamps, frame_width, class_mask, mode, repeats):
+    """run_decisions 的每帧耗时（微秒），取 repeats 次中最快的一次"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        core.run_decisions(track_frames, frame_width, class_mask, timestamps=timestamps, trigger_mode=mode)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(track_frames), 1) * 1e6
+
+
+def lead_times(area_triggers, ttc_triggers, timestamps):
+    """
+    每次 area 触发与同一跟踪ID、PAIR_WINDOW 秒以内最近的一次 ttc 触发之间的时间差（秒），正数表示 ttc 更早；
+    跟踪器复用ID时，同一ID的多次触发也能分别配对
+    """
+    leads = []
+    for area_index, track_id, _ in area_triggers:
+        candidates = [timestamps[area_index] - timestamps[index] for index, other_id, _ in ttc_triggers
+                      if other_id == track_id and abs(timestamps[area_index] - timestamps[index]) <= PAIR_WINDOW]
+        if candidates:
+            leads.append(float(min(candidates, key=abs)))
+    return leads
+
+
+def needless(triggers):
+    """触发时目标没有在变大（碰撞时间为 inf）的次数"""
+    return sum(1 for _, _, ttc in triggers if not np.isfinite(ttc))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="area / ttc 触发方式对比")
+    parser.add_argument("sources", nargs='+', help="视频文件或检测结果录制目录")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径（只用于视频文件）")
+    parser.add_argument("--threshold", type=float, default=None, help="TTC_THRESHOLD_SECONDS")
+    parser.add_argument("--window", type=int, default=None, help="TTC_WINDOW")
+    parser.add_argument("--repeats", type=int, default=5, help="测量决策耗时的重复次数")
+    args = parser.parse_args()
+    if args.threshold is not None:
+        core.TTC_THRESHOLD_SECONDS = args.threshold
+    if args.window is not None:
+        core.TTC_WINDOW = args.window
+
+    for path in args.sources:
+        track_frames, timestamps, frame_width, class_mask = load_tracks(path, args.model)
+        print(f"\n--- {path}: {len(track_frames)} 帧 ---")
+        results = {}
+        for mode in MODES:
+            commands, triggers = analyze(track_frames, timestamps, frame_width, class_mask, mode)
+            cost = decision_cost(track_frames, timestamps, frame_width, class_mask, mode, max(1, args.repeats))
+            results[mode] = triggers
+            print(f"{mode:<5} 触发 {len(first_triggers(commands)):>3} 次 (帧 {[t[0] for t in triggers][:10]}), "
+                  f"目标没有靠近的触发 {needless(triggers)} 次, 决策 {cost:.1f} us/帧")
+        leads = lead_times(results['area'], results['ttc'], timestamps)
+        if leads:
+            print(f"同一目标 ttc 比 area 提前: 平均 {np.mean(leads):.2f} s, 最小 {min(leads):.2f} s, "
+                  f"最大 {max(leads):.2f} s ({len(leads)} 次触发)")
+        else:
+            print("没有两种方式都触发的目标")
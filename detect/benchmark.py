@@ -0,0 +1,230 @@
+"""
+检测脚本基准测试：以最快速度重放 datasets/demo 中的图片和任意视频文件，
+按阶段（解码 / 跟踪 / 张量转换 / 筛选 / 状态机）统计 p50/p95/p99，
+便于在不同模型文件（yolov8n.pt 与 weights/yolo11n.pt）、推理后端和参数之间做前后对比。
+指定多个 --backends 时，以第一个后端为基准报告其它后端的逐帧决策一致率和检测框 F1（IoU >= 0.5）。
+用法:
+    python benchmark.py --models yolov8n.pt weights/yolo11n.pt --video path/to/clip.mp4 --json output/bench.json
+    python benchmark.py --backends pytorch onnx onnx-int8 openvino openvino-int8
+    python benchmark.py --compare output/bench.json   # 与上一次的结果比较
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+from backends import backend_name, load_model, parse_backend
+from offline_engine import box_iou
+from stage_timer import StageTimer
+
+DEMO_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets", "demo")
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+MATCH_IOU_THRESHOLD = 0.5
+
+
+def load_demo_images(image_dir=DEMO_IMAGE_DIR):
+    paths = sorted(p for p in glob.glob(os.path.join(image_dir, '*')) if p.lower().endswith(IMAGE_EXTENSIONS))
+    return [(os.path.basename(p), cv2.imread(p)) for p in paths]
+
+
+def iter_source_frames(source, repeat):
+    """返回 (帧迭代器, 帧宽)；图片列表重复 repeat 次，视频逐帧解码"""
+    if isinstance(source, list):
+        frames = [frame for _, frame in source]
+
+        def generate():
+            for _ in range(repeat):
+                for frame in frames:
+                    yield frame
+        return generate(), max(frame.shape[1] for frame in frames)
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {source}")
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+
+    def generate():
+        try:
+            while True:
+                success, frame = cap.read()
+                if not success:
+                    break
+                yield frame
+        finally:
+            cap.release()
+    return generate(), frame_width
+
+
+def benchmark_source(model, class_mask, source, repeat=1):
+    """在一个帧源上以最快速度运行 跟踪 -> 转换 -> 筛选 -> 状态机，返回统计结果"""
+    frames, frame_width = iter_source_frames(source, repeat)
+    left_bound, right_bound = core.compute_bounds(frame_width)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound, verbose=False)
+    store = core.create_detection_store()
+    tracking = core.open_tracking(model)  # 每个帧源使用新的跟踪器
+    timer = StageTimer(True)
+    commands = []
+    frame_boxes = []
+
+    count = 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    t = timer.start()
+    for frame in frames:
+        frame_start = t = timer.lap('decode', t)
+        if tracking is not None:
+            tracks = tracking.track(frame)
+            t = timer.lap('track', t)
+        else:
+            # 每个帧源的第一帧重建跟踪器，避免不同帧源之间的跟踪状态互相影响
+            results = model.track(frame, persist=count > 0, tracker="bytetrack.yaml", verbose=False)
+            t = timer.lap('track', t)
+            tracks = core.extract_tracks(results[0])
+            t = timer.lap('to_numpy', t)
+        detections = core.load_detections(store, tracks, class_mask)
+        t = timer.lap('filter', t)
+        commands.append(state_machine.update(detections))
+        t = timer.lap('state_machine', t)
+        frame_boxes.append(detections.boxes.copy())
+        timer.record('frame', t - frame_start)
+        count += 1
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        'frames': count,
+        'fps': count / wall if wall > 0 else 0.0,
+        'cpu_ms_per_frame': cpu * 1000 / count if count else 0.0,
+        'stages': timer.summary(),
+        'commands': ''.join(commands),
+        'frame_boxes': frame_boxes,  # 仅用于后端之间的精度比较，不写入JSON
+    }
+
+
+def match_f1(reference_frames, candidate_frames, iou_threshold=MATCH_IOU_THRESHOLD):
+    """逐帧按IoU贪心匹配筛选后的检测框，返回整体 F1"""
+    matched = total = 0
+    for reference, candidate in zip(reference_frames, candidate_frames):
+        total += len(reference) + len(candidate)
+        if len(reference) == 0 or len(candidate) == 0:
+            continue
+        iou = box_iou(reference, candidate)
+        while True:
+            i, j = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[i, j] < iou_threshold:
+                break
+            matched += 1
+            iou[i, :] = 0
+            iou[:, j] = 0
+    return 2 * matched / total if total else 1.0
+
+
+def accuracy_against(result, reference, reference_name):
+    same = sum(1 for a, b in zip(result['commands'], reference['commands']) if a == b)
+    return {
+        'reference': reference_name,
+        'decision_agreement': same / max(len(reference['commands']), 1),
+        'box_f1': match_f1(reference['frame_boxes'], result['frame_boxes']),
+    }
+
+
+def run_benchmark(model_paths, videos, repeat, warmup=3, backends=('pytorch',)):
+    sources = {'demo_images': load_demo_images()}
+    for video in videos:
+        sources[os.path.basename(video)] = video
+
+    report = {
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'settings': {
+            'confidence_threshold': core.CONFIDENCE_THRESHOLD,
+            'min_area_threshold': core.MIN_AREA_THRESHOLD,
+            'center_dead_zone_percent': core.CENTER_DEAD_ZONE_PERCENT,
+            'obstacle_classes': core.OBSTACLE_CLASSES,
+            'repeat': repeat,
+            'imgsz': core.INFERENCE_IMGSZ,
+        },
+        'models': {},
+    }
+    for model_path in model_paths:
+        references = {}
+        for spec in backends:
+            backend, int8 = parse_backend(spec)
+            # pytorch 后端沿用原来的键名，便于与旧的结果文件比较
+            key = model_path if backend == 'pytorch' else f"{model_path}@{backend_name(backend, int8)}"
+            model = load_model(model_path, backend, int8, warmup=0)
+            class_mask = core.build_class_mask(model.names)
+            # 预热：第一次推理包含模型初始化开销，不计入结果
+            warm_frame = sources['demo_images'][0][1]
+            for _ in range(warmup):
+                model.track(warm_frame, persist=False, tracker="bytetrack.yaml", verbose=False)
+
+            report['models'][key] = {}
+            for name, source in sources.items():
+                result = benchmark_source(model, class_mask, source, repeat if name == 'demo_images' else 1)
+                if name in references:
+                    result['accuracy'] = accuracy_against(result, references[name], backends[0])
+                else:
+                    references[name] = result
+                print_result(key, name, result)
+                report['models'][key][name] = result
+        for sources_result in report['models'].values():
+            for result in sources_result.values():
+                result.pop('frame_boxes', None)
+    return report
+
+
+def print_result(model_path, source_name, result):
+    print(f"\n=== {model_path} @ {source_name}: {result['frames']} 帧, {result['fps']:.1f} FPS, "
+          f"CPU {result['cpu_ms_per_frame']:.1f} ms/帧 ===")
+    print(f"{'阶段':<14}{'p50':>9}{'p95':>9}{'p99':>9}{'平均':>9}")
+    for stage, stats in result['stages'].items():
+        print(f"{stage:<14}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['mean_ms']:>9.2f}")
+    accuracy = result.get('accuracy')
+    if accuracy:
+        print(f"相对 {accuracy['reference']}: 决策一致率 {accuracy['decision_agreement'] * 100:.2f}%, "
+              f"检测框 F1 {accuracy['box_f1']:.3f}")
+
+
+def compare_reports(current, previous):
+    """打印两次运行之间 FPS 与 p50 帧耗时的变化，以及决策序列是否一致"""
+    print("\n--- 与上一次结果比较 ---")
+    for model_path, sources in current['models'].items():
+        for name, result in sources.items():
+            old = previous.get('models', {}).get(model_path, {}).get(name)
+            if old is None:
+                continue
+            fps_change = (result['fps'] / old['fps'] - 1) * 100 if old['fps'] else 0.0
+            p50_now = result['stages']['frame']['p50_ms']
+            p50_old = old['stages']['frame']['p50_ms']
+            same = "一致" if result.get('commands') == old.get('commands') else "不一致"
+            print(f"{model_path} @ {name}: FPS {old['fps']:.1f} -> {result['fps']:.1f} ({fps_change:+.1f}%), "
+                  f"p50 {p50_old:.2f} -> {p50_now:.2f} ms, 决策序列{same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检测脚本基准测试")
+    parser.add_argument("--models", nargs="+", default=[core.MODEL_PATH], help="要比较的模型文件")
+    parser.add_argument("--backends", nargs="+", default=['pytorch'],
+                        help="要比较的推理后端：pytorch / onnx / onnx-int8 / openvino / openvino-int8，第一个作为精度基准")
+    parser.add_argument("--video", nargs="*", default=[], help="额外的视频文件")
+    parser.add_argument("--repeat", type=int, default=20, help="demo 图片重复的轮数")
+    parser.add_argument("--json", default=None, help="保存结果的JSON路径")
+    parser.add_argument("--compare", default=None, help="与之前保存的JSON结果比较")
+    args = parser.parse_args()
+
+    bench_report = run_benchmark(args.models, args.video, args.repeat, backends=args.backends)
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare, encoding='utf-8') as f:
+            compare_reports(bench_report, json.load(f))
+    if args.json:
+        output_dir = os.path.dirname(args.json)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(bench_report, f, ensure_ascii=False, indent=2)
+        print(f"\n基准结果已保存到 {args.json}")
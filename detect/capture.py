@@ -0,0 +1,279 @@
+"""
+低延迟采集：代替各脚本里写死的 cv2.VideoCapture(2, cv2.CAP_DSHOW)（DirectShow 只在 Windows 上可用）。
+
+CameraCapture: Linux 上使用 V4L2，Windows 上使用 DirectShow。打开时请求 CAPTURE_BUFFER_SIZE 帧的驱动缓冲区和
+CAPTURE_FOURCC（默认 MJPG，USB 带宽占用小，高分辨率下也能跑满帧率）；后台线程循环 grab() + retrieve()，
+MJPEG 解码不占用主循环，只保留最新的一帧，主循环来不及处理的帧在这里丢弃，而不是在驱动缓冲区里排队变旧。
+每帧带有采集时间（time.monotonic() 秒）：V4L2 缓冲区自带的时间戳可用时直接使用，否则取 grab() 返回的时刻。
+
+FileCapture: 按视频原始帧率实时播放文件，行为与摄像头相同（处理不过来时丢帧、每帧带采集时间），
+没有摄像头时也能测试采集和帧龄统计。
+
+两者都兼容 cv2.VideoCapture 的 isOpened / read / get / release 接口，read() 之后 capture_time 为该帧的采集时间。
+设置了 stop_event 时，read() 在等待新帧期间事件被置位会返回 (False, None)，摄像头卡住时也能按信号退出。
+FrameAgeStats 统计决策时的帧龄（决策时刻 - 采集时间），分位数取最近 FRAME_AGE_WINDOW 帧。
+
+帧龄测量（对比 cv2.VideoCapture 默认设置与本模块的采集，模拟每帧 --work-ms 的处理耗时）:
+    python capture.py 0 --seconds 10 --work-ms 60
+    python capture.py path/to/clip.mp4 --work-ms 60      # 没有摄像头时用实时播放的视频文件
+"""
+import argparse
+import collections
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+
+DRIVER_STAMP_WINDOW = 5.0  # 驱动时间戳与当前时间相差超过该秒数时视为不可用（文件位置、其他时钟）
+READ_POLL_SECONDS = 0.1  # read() 等待新帧时检查停止事件的间隔
+RELEASE_TIMEOUT = 2.0  # release() 等待采集线程退出的时间
+FRAME_AGE_WINDOW = 10000  # FrameAgeStats 保留的最近帧数
+
+
+def is_camera(source):
+    return isinstance(source, int) or str(source).isdigit()
+
+
+def camera_api(backend=None):
+    """'auto' -> 按操作系统选择 V4L2 / DirectShow"""
+    backend = backend or core.CAPTURE_BACKEND
+    if backend == 'auto':
+        backend = 'v4l2' if sys.platform.startswith('linux') else 'dshow' if sys.platform == 'win32' else 'any'
+    return {'v4l2': cv2.CAP_V4L2, 'dshow': cv2.CAP_DSHOW, 'any': cv2.CAP_ANY}[backend]
+
+
+def driver_timestamp(cap, now):
+    """V4L2 缓冲区的时间戳（CLOCK_MONOTONIC，与 time.monotonic() 同一时钟），不可用时返回 None"""
+    stamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+    if 0 < now - stamp < DRIVER_STAMP_WINDOW:
+        return stamp
+    return None
+
+
+class ThreadedCapture:
+    """后台线程读取帧，只保留最新的一帧；子类实现 _next() 返回 (帧, 采集时间)，结束时返回 None"""
+
+    def __init__(self, cap, name, stop_event=None):
+        self.cap = cap
+        self.stop_event = stop_event  # 外部的停止事件（如 install_stop_handler 的返回值）
+        self.capture_time = None
+        self.frames = 0  # 后台线程读到的帧数
+        self.delivered = 0  # read() 返回的帧数
+        self.drops = 0  # 没有被 read() 取走就被新帧覆盖的帧数
+        self._latest = None
+        self._ended = not cap.isOpened()
+        self._release_pending = False
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        if cap.isOpened():
+            self.thread.start()
+
+    def _next(self):
+        raise NotImplementedError
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                item = self._next()
+                if item is None:
+                    break
+                with self._cond:
+                    if self._latest is not None:
+                        self.drops += 1
+                    self._latest = item
+                    self.frames += 1
+                    self._cond.notify()
+        finally:
+            with self._cond:
+                self._ended = True
+                release = self._release_pending
+                self._cond.notify_all()
+            if release:
+                self.cap.release()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def stopped(self):
+        return self._stop.is_set() or (self.stop_event is not None and self.stop_event.is_set())
+
+    def read(self):
+        """等待下一帧（不会重复返回同一帧），结束或收到停止事件时返回 (False, None)"""
+        with self._cond:
+            while self._latest is None and not self._ended:
+                if self.stopped():
+                    return False, None
+                self._cond.wait(READ_POLL_SECONDS)
+            if self._latest is None:
+                return False, None
+            (frame, self.capture_time), self._latest = self._latest, None
+        self.delivered += 1
+        return True, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        """停止采集线程后释放设备；线程仍阻塞在 grab() 中时由它退出时释放，避免与 grab() 同时访问设备"""
+        self._stop.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=RELEASE_TIMEOUT)
+        with self._cond:
+            if not self._ended:
+                self._release_pending = True
+                print(f"警告: 采集线程 {RELEASE_TIMEOUT:.0f} s 内没有退出，设备将在线程退出时释放")
+                return
+        self.cap.release()
+
+    def summary(self):
+        return f"采集: 读取 {self.frames} 帧, 交给主循环 {self.delivered} 帧, 采集线程丢弃 {self.drops} 帧"
+
+
+class CameraCapture(ThreadedCapture):
+    """V4L2 / DirectShow 摄像头，最小驱动缓冲区 + MJPEG，后台线程解码"""
+
+    def __init__(self, index, backend=None, fourcc=None, buffer_size=None, width=None, height=None,
+                 stop_event=None):
+        cap = cv2.VideoCapture(int(index), camera_api(backend))
+        fourcc = core.CAPTURE_FOURCC if fourcc is None else fourcc
+        buffer_size = core.CAPTURE_BUFFER_SIZE if buffer_size is None else buffer_size
+        width = width or core.CAPTURE_WIDTH
+        height = height or core.CAPTURE_HEIGHT
+        if cap.isOpened():
+            # 先设置像素格式再设置分辨率，部分 V4L2 驱动只在 MJPG 下提供高分辨率
+            if fourcc:
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+            if width and height:
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            if buffer_size:
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+        self.driver_stamps = 0
+        super().__init__(cap, f"capture{index}", stop_event)
+
+    def _next(self):
+        if not self.cap.grab():
+            return None
+        now = time.monotonic()
+        stamp = driver_timestamp(self.cap, now)
+        if stamp is not None:
+            self.driver_stamps += 1
+        # retrieve() 完成 MJPEG 解码，在采集线程中进行
+        success, frame = self.cap.retrieve()
+        if not success:
+            return None
+        return frame, stamp if stamp is not None else now
+
+    def fourcc(self):
+        code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        return ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+
+    def summary(self):
+        return (f"{super().summary()}, 格式 {self.fourcc()}, 驱动时间戳 {self.driver_stamps}/{self.frames} 帧"
+                f"（其余使用 grab() 返回时刻）")
+
+
+class FileCapture(ThreadedCapture):
+    """按原始帧率实时播放视频文件，每帧的采集时间为其计划播放时刻"""
+
+    def __init__(self, path, realtime=True, stop_event=None):
+        cap = cv2.VideoCapture(path)
+        fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+        self.frame_interval = 1.0 / fps if realtime and fps > 0 else 0.0
+        self.start_time = None
+        self.index = 0
+        super().__init__(cap, "capture-file", stop_event)
+
+    def _next(self):
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+        due = self.start_time + self.index * self.frame_interval
+        delay = due - time.monotonic()
+        if delay > 0 and self._stop.wait(delay):
+            return None
+        success, frame = self.cap.read()
+        if not success:
+            return None
+        self.index += 1
+        return frame, due if self.frame_interval else time.monotonic()
+
+
+def open_capture(source=None, realtime=True, stop_event=None):
+    """整数（或数字字符串）为摄像头编号，否则为按实时速度播放的视频文件"""
+    source = core.CAMERA_INDEX if source is None else source
+    if is_camera(source):
+        return CameraCapture(source, stop_event=stop_event)
+    return FileCapture(source, realtime, stop_event)
+
+
+class FrameAgeStats:
+    """决策时的帧龄（决策时刻 - 采集时间）；分位数取最近 window 帧，最大值和帧数覆盖整次运行"""
+
+    def __init__(self, window=FRAME_AGE_WINDOW):
+        self.ages = collections.deque(maxlen=window)
+        self.count = 0
+        self.max_age = 0.0
+
+    def record(self, capture_time, now=None):
+        now = time.monotonic() if now is None else now
+        age = now - capture_time
+        self.ages.append(age)
+        self.count += 1
+        self.max_age = max(self.max_age, age)
+
+    def summary(self):
+        if not self.ages:
+            return "帧龄: 没有记录"
+        p50, p95, p99 = np.percentile(self.ages, [50, 95, 99]) * 1000
+        return (f"决策时帧龄 p50 {p50:.0f} ms / p95 {p95:.0f} ms / p99 {p99:.0f} ms / "
+                f"最大 {self.max_age * 1000:.0f} ms ({self.count} 帧)")
+
+
+def measure(cap, seconds, work_ms):
+    """读取并模拟处理 seconds 秒，返回 FrameAgeStats；cap 为普通 cv2.VideoCapture 时尽量使用驱动时间戳"""
+    ages = FrameAgeStats()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        success, frame = cap.read()
+        if not success:
+            break
+        capture_time = getattr(cap, 'capture_time', None)
+        if capture_time is None:
+            now = time.monotonic()
+            capture_time = driver_timestamp(cap, now) or now
+        time.sleep(work_ms / 1000.0)  # 代替推理和决策
+        ages.record(capture_time)
+    return ages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="采集帧龄测量")
+    parser.add_argument("source", nargs='?', default=None, help="摄像头编号或视频文件路径（默认使用 CAMERA_INDEX）")
+    parser.add_argument("--seconds", type=float, default=10.0, help="每种方式的测量时长")
+    parser.add_argument("--work-ms", type=float, default=60.0, help="模拟的每帧处理耗时（毫秒）")
+    args = parser.parse_args()
+    source = core.CAMERA_INDEX if args.source is None else args.source
+
+    results = []
+    if is_camera(source):
+        # 原来的方式：默认缓冲区和像素格式，在主循环中同步读取；帧龄只有驱动时间戳可用时才准确
+        plain = cv2.VideoCapture(int(source), camera_api())
+        if plain.isOpened():
+            results.append(("cv2.VideoCapture 默认设置", measure(plain, args.seconds, args.work_ms), None))
+        plain.release()
+    cap = open_capture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"错误: 无法打开帧源 {source}")
+    results.append(("capture.py", measure(cap, args.seconds, args.work_ms), cap))
+    cap.release()
+
+    print(f"\n--- 帧龄（模拟每帧处理 {args.work_ms:.0f} ms） ---")
+    for label, ages, capture in results:
+        print(f"{label}: {ages.summary()}")
+        if capture is not None:
+            print(f"  {capture.summary()}")
@@ -0,0 +1,156 @@
+"""
+主机 -> ESP32 的指令协议。
+
+二进制指令帧（小端，共 22 字节）:
+    偏移  长度  字段
+    0     1     command      'L' / 'R' / 'C' / 'S' / 'D'（ASCII，放在第一个字节以兼容旧固件）
+    1     1     version      协议版本，当前为 2
+    2     1     flags        bit0: 携带目标角度  bit1: 携带强度  bit2: 心跳包  bit3: 请求应答
+    3     4     seq          递增序号（每个会话从 1 开始），用于识别乱序、重复的数据包
+    7     4     timestamp_ms 发送时刻的主机单调时钟（毫秒，取低32位），设备据此判断数据包是否在网络中滞留过久
+    11    2     angle        目标角度（有符号，flags.bit0 置位时有效）
+    13    1     intensity    强度 0~255（flags.bit1 置位时有效）
+    14    4     session      发送端启动时随机生成的会话号；变化说明主机重启，设备立即重新同步序号和时钟
+    18    4     capture_ms   产生该决策的帧的采集时间（主机单调时钟，毫秒），只用于统计端到端延迟
+
+版本 1 的帧只有前 14 字节，timestamp_ms 为采集时间：推理耗时波动会被设备当作网络延迟，新鲜的指令被判为过期。
+
+旧固件只读取第一个字节，因此收到二进制帧时行为与单字符格式完全相同；
+COMMAND_PROTOCOL = 'ascii' 时仍只发送单个字符。
+
+应答帧（设备 -> 主机，小端，共 7 字节，仅在 flags.bit3 置位时发送）:
+    0     1     'A'
+    1     1     version
+    2     1     flags        保留，为 0
+    3     4     seq          被应答的指令帧序号
+"""
+import os
+import struct
+import time
+from collections import namedtuple
+
+PROTOCOL_VERSION = 2
+FRAME_FORMAT = '<cBBIIhBII'
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+
+FLAG_ANGLE = 0x01
+FLAG_INTENSITY = 0x02
+FLAG_HEARTBEAT = 0x04
+FLAG_ACK_REQUEST = 0x08
+
+ACK_FORMAT = '<cBBI'
+ACK_SIZE = struct.calcsize(ACK_FORMAT)
+
+VALID_COMMANDS = ('L', 'R', 'C', 'S', 'D')  # 'D': 看门狗的降级提示，需要更新后的固件
+
+CommandFrame = namedtuple('CommandFrame', ['command', 'seq', 'timestamp_ms', 'angle', 'intensity', 'flags',
+                                           'session', 'capture_ms'], defaults=(None, None))
+
+
+def new_session():
+    """随机的非零32位会话号"""
+    return int.from_bytes(os.urandom(4), 'little') or 1
+
+
+def monotonic_ms(seconds=None):
+    """主机单调时钟（毫秒，低32位）"""
+    if seconds is None:
+        seconds = time.monotonic()
+    return int(seconds * 1000) & 0xFFFFFFFF
+
+
+def encode_frame(command, seq, timestamp_ms, angle=None, intensity=None, heartbeat=False, ack=False, session=0,
+                 capture_ms=None):
+    """timestamp_ms 为发送时刻，capture_ms 为采集时间（默认与 timestamp_ms 相同）"""
+    capture_ms = timestamp_ms if capture_ms is None else capture_ms
+    flags = FLAG_ACK_REQUEST if ack else 0
+    if angle is not None:
+        flags |= FLAG_ANGLE
+    if intensity is not None:
+        flags |= FLAG_INTENSITY
+    if heartbeat:
+        flags |= FLAG_HEARTBEAT
+    return struct.pack(FRAME_FORMAT, command.encode(), PROTOCOL_VERSION, flags, seq & 0xFFFFFFFF,
+                       timestamp_ms & 0xFFFFFFFF, int(angle or 0), int(intensity or 0), session & 0xFFFFFFFF,
+                       capture_ms & 0xFFFFFFFF)
+
+
+def decode_frame(packet):
+    """解析二进制帧或旧的单字符格式；旧格式的 seq / timestamp_ms 为 None"""
+    if len(packet) >= FRAME_SIZE and packet[1] == PROTOCOL_VERSION:
+        command, _, flags, seq, timestamp_ms, angle, intensity, session, capture_ms = \
+            struct.unpack_from(FRAME_FORMAT, packet)
+        return CommandFrame(command.decode(), seq, timestamp_ms,
+                            angle if flags & FLAG_ANGLE else None,
+                            intensity if flags & FLAG_INTENSITY else None, flags, session, capture_ms)
+    if not packet:
+        return None
+    return CommandFrame(chr(packet[0]), None, None, None, None, 0)
+
+
+def encode_ack(seq):
+    return struct.pack(ACK_FORMAT, b'A', PROTOCOL_VERSION, 0, seq & 0xFFFFFFFF)
+
+
+def decode_ack(packet):
+    """解析应答帧，返回被应答的序号；不是应答帧时返回 None"""
+    if len(packet) >= ACK_SIZE and packet[:1] == b'A' and packet[1] == PROTOCOL_VERSION:
+        return struct.unpack_from(ACK_FORMAT, packet)[3]
+    return None
+
+
+def seq_newer(seq, last_seq):
+    """按32位序号回绕规则判断 seq 是否比 last_seq 新"""
+    return 0 < ((seq - last_seq) & 0xFFFFFFFF) < 0x80000000
+
+
+class CommandSender:
+    """
+    决策变化时立即发送，决策不变时按 heartbeat_interval 低频发送心跳。
+    protocol 为 'binary' 时发送二进制指令帧，为 'ascii' 时发送旧的单字符格式。
+    """
+
+    def __init__(self, sock, address, protocol='binary', heartbeat_interval=1.0):
+        self.sock = sock
+        self.address = address
+        self.protocol = protocol
+        self.heartbeat_interval = heartbeat_interval
+        self.seq = 0
+        self.session = new_session()
+        self.last_command = None
+        self.last_send_time = 0.0
+        self.sent = 0
+        self.changes = 0
+        self.heartbeats = 0
+
+    def send(self, command, stamp=None, angle=None, intensity=None, heartbeat=False):
+        """立即发送一条指令；stamp 为产生该决策的帧的 time.monotonic() 采集时间"""
+        if self.protocol == 'binary':
+            self.seq += 1
+            payload = encode_frame(command, self.seq, monotonic_ms(), angle, intensity, heartbeat,
+                                   session=self.session, capture_ms=monotonic_ms(stamp))
+        else:
+            payload = command.encode()
+        self.sock.sendto(payload, self.address)
+        self.last_command = command
+        self.last_send_time = time.monotonic()
+        self.sent += 1
+        return payload
+
+    def update(self, command, stamp=None, angle=None, intensity=None):
+        """每帧调用：指令变化时立即发送，否则到了心跳时间才发送。返回本次是否发送"""
+        if command != self.last_command:
+            self.changes += 1
+            self.send(command, stamp, angle, intensity)
+            return True
+        if time.monotonic() - self.last_send_time >= self.heartbeat_interval:
+            self.heartbeats += 1
+            self.send(command, stamp, angle, intensity, heartbeat=True)
+            return True
+        return False
+
+    def summary(self):
+        return f"指令发送 {self.sent} 次（决策变化 {self.changes} 次，心跳 {self.heartbeats} 次）"
+
+    def close(self):
+        self.sock.close()
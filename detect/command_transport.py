@@ -0,0 +1,346 @@
+"""
+多设备指令分发：一台主机同时驱动多个触觉执行器（左 / 右手腕、触觉腰带等）。
+
+asyncio 事件循环运行在后台线程中，所有设备共用一个UDP套接字。视觉循环调用 update() / send() 只是把决策
+交给事件循环（call_soon_threadsafe），不会在 sendto 上阻塞，设备数量增加也不影响帧循环。
+每个设备独立维护序号、心跳和统计：
+- 提交 -> 发出 的排队延迟
+- 指令帧请求应答（FLAG_ACK_REQUEST）时，发出 -> 收到应答 的往返延迟，以及超时未应答的数量
+
+设备在 demo_v3.py 的 DEVICES 中配置，role 决定该设备收到的指令（见 ROLE_COMMANDS）。
+接口与 CommandSender 相同（send / update / summary / close），可以直接替换。
+
+自检（在本机启动若干个模拟设备，不需要硬件）:
+    python command_transport.py --devices 24 --seconds 5 --loss 0.05
+"""
+import argparse
+import asyncio
+import collections
+import random
+import socket
+import threading
+import time
+
+import numpy as np
+
+from command_protocol import (FLAG_ACK_REQUEST, decode_ack, decode_frame, encode_ack, encode_frame, monotonic_ms,
+                              new_session)
+
+ACK_TIMEOUT = 0.5  # 超过该时间（秒）未收到应答视为丢失
+HEARTBEAT_TICK = 0.02  # 事件循环检查心跳和应答超时的间隔（秒）
+LATENCY_WINDOW = 2000  # 每个设备保留最近多少次延迟用于统计
+
+# 设备角色 -> 指令映射：左右手腕只提示各自方向的转向，另一侧收到 'C' 回中
+ROLE_COMMANDS = {
+    'all': {},
+    'left': {'R': 'C'},
+    'right': {'L': 'C'},
+}
+
+
+class Device:
+    """一个执行器的地址、角色和发送统计"""
+
+    def __init__(self, name, host, port, role='all'):
+        if role not in ROLE_COMMANDS:
+            raise ValueError(f"未知的设备角色 '{role}'，可选: {', '.join(ROLE_COMMANDS)}")
+        self.name = name
+        self.address = (socket.gethostbyname(host), port)  # 应答按来源地址匹配，这里先解析主机名
+        self.role = role
+        self.seq = 0
+        self.last_command = None
+        self.last_send_time = 0.0
+        self.sent = 0
+        self.heartbeats = 0
+        self.acked = 0
+        self.lost = 0
+        self.pending = {}  # seq -> 发出时间
+        self.queue_latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.ack_rtts = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def command_for(self, command):
+        return ROLE_COMMANDS[self.role].get(command, command)
+
+    def summary(self):
+        line = (f"{self.name} {self.address[0]}:{self.address[1]} [{self.role}]: 发送 {self.sent} 次"
+                f"（心跳 {self.heartbeats} 次）")
+        if self.queue_latencies:
+            p50, p99 = np.percentile(self.queue_latencies, [50, 99]) * 1000
+            line += f", 排队 p50 {p50:.2f} ms / p99 {p99:.2f} ms"
+        if self.acked or self.lost:
+            line += f", 应答 {self.acked} 次, 丢失 {self.lost} 次"
+        if self.ack_rtts:
+            p50, p99 = np.percentile(self.ack_rtts, [50, 99]) * 1000
+            line += f", 往返 p50 {p50:.2f} ms / p99 {p99:.2f} ms"
+        return line
+
+
+class _AckProtocol(asyncio.DatagramProtocol):
+    def __init__(self, owner):
+        self.owner = owner
+
+    def datagram_received(self, data, address):
+        self.owner._on_datagram(data, address)
+
+    def error_received(self, exc):
+        # 目标端口没有监听时本机会收到 ICMP 端口不可达，不影响其他设备
+        self.owner.errors += 1
+
+
+class CommandTransport:
+    """
+    在后台线程的 asyncio 事件循环中向多个设备发送指令。
+    devices 为 (名称, 主机, 端口, 角色) 的列表；ack=True 时每帧请求应答（仅 'binary' 协议）。
+    """
+
+    def __init__(self, devices, protocol='binary', heartbeat_interval=1.0, ack=True, ack_timeout=ACK_TIMEOUT):
+        self.protocol = protocol
+        self.heartbeat_interval = heartbeat_interval
+        self.ack = ack and protocol == 'binary'
+        self.session = new_session()  # 本次运行的会话号，设备据此识别主机重启
+        self.ack_timeout = ack_timeout
+        self.devices = {}
+        self._by_address = {}
+        for spec in devices:
+            self.add_device(*spec)
+        self.last_command = None
+        self.changes = 0
+        self.errors = 0
+        self.loop = asyncio.new_event_loop()
+        self.transport = None
+        self._ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="command-transport", daemon=True)
+        self.thread.start()
+        self._ready.wait()
+
+    # --- 设备注册表（任意线程调用） ---
+    def add_device(self, name, host, port, role='all'):
+        device = Device(name, host, port, role)
+        self.devices[name] = device
+        self._by_address[device.address] = device
+        return device
+
+    def remove_device(self, name):
+        device = self.devices.pop(name, None)
+        if device is not None:
+            self._by_address.pop(device.address, None)
+        return device
+
+    # --- 视觉循环调用的接口，只提交不等待 ---
+    def send(self, command, stamp=None, angle=None, intensity=None):
+        """立即向所有设备发送一条指令；command 也可以是 {设备名: 指令} 的字典"""
+        self.last_command = command
+        self.loop.call_soon_threadsafe(self._dispatch, command, stamp, angle, intensity, True, time.monotonic())
+
+    def update(self, command, stamp=None, angle=None, intensity=None):
+        """每帧调用：决策变化时提交给事件循环，只发给映射后指令有变化的设备；心跳由事件循环定时发送。返回决策是否变化"""
+        if command == self.last_command:
+            return False
+        self.last_command = command
+        self.changes += 1
+        self.loop.call_soon_threadsafe(self._dispatch, command, stamp, angle, intensity, False, time.monotonic())
+        return True
+
+    @property
+    def sent(self):
+        return sum(device.sent for device in list(self.devices.values()))
+
+    def summary(self):
+        devices = list(self.devices.values())
+        acked = sum(device.acked for device in devices)
+        lost = sum(device.lost for device in devices)
+        lines = [f"指令分发: {len(devices)} 个设备，共发送 {self.sent} 次（决策变化 {self.changes} 次），"
+                 f"应答 {acked} 次，丢失 {lost} 次，发送错误 {self.errors} 次"]
+        lines += ["  " + device.summary() for device in devices]
+        return "\n".join(lines)
+
+    def close(self, timeout=None):
+        """等待已提交的指令发出（以及最多 ack_timeout 秒的应答）后关闭事件循环"""
+        if not self.thread.is_alive():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        future.result(timeout if timeout is not None else self.ack_timeout + 1.0)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    # --- 以下在事件循环线程中运行 ---
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._open())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _open(self):
+        self.transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _AckProtocol(self), local_addr=('0.0.0.0', 0))
+        self._heartbeat_task = self.loop.create_task(self._heartbeat())
+
+    async def _shutdown(self):
+        deadline = time.monotonic() + self.ack_timeout
+        while time.monotonic() < deadline and any(device.pending for device in self.devices.values()):
+            await asyncio.sleep(HEARTBEAT_TICK)
+        self._expire(float('inf'))
+        self._heartbeat_task.cancel()
+        self.transport.close()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_TICK)
+            now = time.monotonic()
+            for device in list(self.devices.values()):
+                if device.last_command is not None and now - device.last_send_time >= self.heartbeat_interval:
+                    device.heartbeats += 1
+                    self._send_to(device, device.last_command, None, None, None, True, now)
+            self._expire(now - self.ack_timeout)
+
+    def _expire(self, before):
+        for device in list(self.devices.values()):
+            expired = [seq for seq, sent in device.pending.items() if sent <= before]
+            for seq in expired:
+                del device.pending[seq]
+            device.lost += len(expired)
+
+    def _dispatch(self, command, stamp, angle, intensity, force, submitted):
+        for device in list(self.devices.values()):
+            if isinstance(command, dict):
+                device_command = command.get(device.name)
+                if device_command is None:
+                    continue
+            else:
+                device_command = device.command_for(command)
+            if force or device_command != device.last_command:
+                self._send_to(device, device_command, stamp, angle, intensity, False, submitted)
+
+    def _send_to(self, device, command, stamp, angle, intensity, heartbeat, submitted):
+        if self.protocol == 'binary':
+            device.seq += 1
+            payload = encode_frame(command, device.seq, monotonic_ms(), angle, intensity, heartbeat, self.ack,
+                                   self.session, monotonic_ms(stamp))
+        else:
+            payload = command.encode()
+        self.transport.sendto(payload, device.address)
+        now = time.monotonic()
+        if self.ack:
+            device.pending[device.seq] = now
+        device.queue_latencies.append(now - submitted)
+        device.last_command = command
+        device.last_send_time = now
+        device.sent += 1
+
+    def _on_datagram(self, data, address):
+        device = self._by_address.get(address)
+        seq = decode_ack(data)
+        if device is None or seq is None:
+            return
+        sent = device.pending.pop(seq, None)
+        if sent is not None:
+            device.acked += 1
+            device.ack_rtts.append(time.monotonic() - sent)
+
+
+class StandIn(asyncio.DatagramProtocol):
+    """本机模拟设备：记录最后一条指令并回复应答，按 loss 概率丢弃收到的数据包"""
+
+    def __init__(self, loss=0.0):
+        self.loss = loss
+        self.transport = None
+        self.received = 0
+        self.last_command = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        if random.random() < self.loss:
+            return
+        frame = decode_frame(data)
+        if frame is None:
+            return
+        self.received += 1
+        self.last_command = frame.command
+        if frame.flags & FLAG_ACK_REQUEST:
+            self.transport.sendto(encode_ack(frame.seq), address)
+
+
+def start_stand_ins(count, loss):
+    """在单独的线程中启动 count 个模拟设备，返回 (loop, [(端口, StandIn)])"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    stand_ins = []
+
+    async def open_all():
+        for _ in range(count):
+            transport, protocol = await loop.create_datagram_endpoint(lambda: StandIn(loss),
+                                                                      local_addr=('127.0.0.1', 0))
+            stand_ins.append((transport.get_extra_info('sockname')[1], protocol))
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(open_all())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="stand-ins", daemon=True).start()
+    ready.wait()
+    return loop, stand_ins
+
+
+def blocking_cost(ports, frames=200):
+    """对比：在帧循环里逐个设备同步 sendto 的耗时（毫秒/帧）"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    start = time.perf_counter()
+    for seq in range(frames):
+        payload = encode_frame('S', seq, monotonic_ms())
+        for port in ports:
+            sock.sendto(payload, ('127.0.0.1', port))
+    sock.close()
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def self_check(count, seconds, fps, loss):
+    loop, stand_ins = start_stand_ins(count, loss)
+    roles = list(ROLE_COMMANDS)
+    devices = [(f"dev{i}", '127.0.0.1', port, roles[i % len(roles)]) for i, (port, _) in enumerate(stand_ins)]
+    transport = CommandTransport(devices, heartbeat_interval=0.5)
+    script = ['S', 'L', 'L', 'S', 'R', 'C']
+    costs = []
+    frames = int(seconds * fps)
+    start = time.monotonic()
+    for index in range(frames):
+        command = script[(index // 15) % len(script)]
+        begin = time.perf_counter()
+        transport.update(command, time.monotonic())
+        costs.append(time.perf_counter() - begin)
+        time.sleep(max(0.0, start + (index + 1) / fps - time.monotonic()))
+    transport.send('C')
+    time.sleep(transport.heartbeat_interval + 0.3)  # 丢包时等下一次心跳补发
+    transport.close()
+    print(transport.summary())
+
+    wrong = [name for (port, stand_in), name in zip(stand_ins, transport.devices)
+             if stand_in.last_command != transport.devices[name].command_for('C')]
+    p50, p99 = np.percentile(costs, [50, 99]) * 1e6
+    print(f"update() 调用耗时: p50 {p50:.1f} us, p99 {p99:.1f} us（{count} 个设备）")
+    # 同步发送的对比放在检查最终指令之后，它发出的 'S' 会覆盖模拟设备记录的最后一条指令
+    print(f"对比：帧循环内同步逐个 sendto: {blocking_cost([port for port, _ in stand_ins]):.3f} ms/帧")
+    rtts = np.concatenate([list(device.ack_rtts) for device in transport.devices.values()]) * 1000
+    if len(rtts):
+        print(f"全部设备往返延迟: p50 {np.percentile(rtts, 50):.2f} ms, p99 {np.percentile(rtts, 99):.2f} ms")
+    loop.call_soon_threadsafe(loop.stop)
+    if wrong:
+        print(f"失败: {len(wrong)} 个设备最后的指令不是 'C': {', '.join(wrong)}")
+        return False
+    print(f"通过: {count} 个设备都收到了最终的 'C'")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多设备指令分发自检（本机模拟设备）")
+    parser.add_argument("--devices", type=int, default=24, help="模拟设备数量")
+    parser.add_argument("--seconds", type=float, default=5.0, help="模拟运行时长（秒）")
+    parser.add_argument("--fps", type=float, default=30.0, help="模拟的视觉帧率")
+    parser.add_argument("--loss", type=float, default=0.0, help="模拟设备的丢包率（0~1）")
+    args = parser.parse_args()
+
+    raise SystemExit(0 if self_check(args.devices, args.seconds, args.fps, args.loss) else 1)
@@ -0,0 +1,152 @@
+"""
+帧延迟预算与决策看门狗。
+
+DeadlineScheduler: 每帧有 FRAME_BUDGET_MS 的延迟预算（采集 -> 决策）。推理开始前帧龄已经超过预算的帧直接丢弃，
+不再晚一步处理；决策完成时超过预算的帧计为一次超时。帧龄使用 capture.py 采集源提供的每帧采集时间；
+传入普通 cv2.VideoCapture 时拿不到采集时间，stamp() 按 read() 是否立即返回估计：立即返回说明帧早已在
+驱动缓冲区里排队，按“上一帧采集时间 + 帧间隔”估计其采集时间，因此推理卡顿之后积压的旧帧会被依次丢弃。
+
+DecisionWatchdog: 后台线程检查最近一次新鲜决策的时间。model.track 或 cap.read() 卡住、超过期限没有新决策时
+发送安全指令 FAILSAFE_COMMAND（'C' 回中，或 'D' 降级提示），恢复后的第一条决策立即发送。期限取
+DECISION_DEADLINE_MS 与 DECISION_DEADLINE_FACTOR × 最近决策间隔 p95 中的较大者，慢速 CPU 上正常的帧间隔不会触发；
+推理进行中（begin_inference() / end_inference() 之间）再多等 DECISION_INFERENCE_GRACE_MS。
+主循环通过 watchdog.decide() 发送指令，与看门狗共用一把锁。
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+import demo_v3 as core
+
+LATENCY_WINDOW = 2000  # 保留最近多少帧的采集 -> 决策延迟用于统计
+INTERVAL_WINDOW = 120  # 看门狗按最近多少个决策间隔估计帧时间
+MIN_INTERVAL_SAMPLES = 10  # 决策间隔样本少于该值时只使用 DECISION_DEADLINE_MS
+
+
+class DeadlineScheduler:
+    """按帧龄决定是否处理本帧，并统计超过预算的帧"""
+
+    def __init__(self, budget_ms=None, frame_interval=None):
+        self.budget = (core.FRAME_BUDGET_MS if budget_ms is None else budget_ms) / 1000.0
+        self.frame_interval = frame_interval or 1.0 / 30
+        self.last_capture = None
+        self.admitted = 0
+        self.dropped = 0
+        self.late = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def stamp(self, read_start, read_end):
+        """估计 read() 返回的帧的采集时间（time.monotonic() 秒）"""
+        capture = read_end
+        if self.last_capture is not None and read_end - read_start < self.frame_interval / 2:
+            # 立即返回：缓冲区中排队的帧，比上一帧晚一个帧间隔采集
+            capture = min(read_end, self.last_capture + self.frame_interval)
+        self.last_capture = capture
+        return capture
+
+    def admit(self, capture_time, now=None):
+        """帧龄未超过预算时返回 True；否则计为丢弃"""
+        now = time.monotonic() if now is None else now
+        if now - capture_time > self.budget:
+            self.dropped += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def complete(self, capture_time, now=None):
+        """决策完成时调用，返回本帧是否超过预算"""
+        now = time.monotonic() if now is None else now
+        latency = now - capture_time
+        self.latencies.append(latency)
+        late = latency > self.budget
+        self.late += late
+        return late
+
+    def summary(self):
+        line = (f"延迟预算 {self.budget * 1000:.0f} ms: 处理 {self.admitted} 帧, 超时丢弃 {self.dropped} 帧, "
+                f"决策超时 {self.late} 帧")
+        if self.latencies:
+            p50, p99 = np.percentile(self.latencies, [50, 99]) * 1000
+            line += f", 采集->决策 p50 {p50:.0f} ms / p99 {p99:.0f} ms"
+        return line
+
+
+class DecisionWatchdog:
+    """超过 deadline 没有新鲜决策时发送安全指令"""
+
+    def __init__(self, sender, deadline_ms=None, failsafe=None, check_interval=0.02, factor=None, grace_ms=None):
+        self.sender = sender
+        self.min_deadline = (core.DECISION_DEADLINE_MS if deadline_ms is None else deadline_ms) / 1000.0
+        self.deadline = self.min_deadline
+        self.factor = core.DECISION_DEADLINE_FACTOR if factor is None else factor
+        self.grace = (core.DECISION_INFERENCE_GRACE_MS if grace_ms is None else grace_ms) / 1000.0
+        self.failsafe = failsafe or core.FAILSAFE_COMMAND
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.last_fresh = time.monotonic()
+        self.intervals = collections.deque(maxlen=INTERVAL_WINDOW)
+        self.inference_since = None
+        self.tripped = False
+        self.misses = 0
+        self.longest_stall = 0.0
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+
+    def start(self):
+        self.last_fresh = time.monotonic()
+        self.thread.start()
+        return self
+
+    def decide(self, command, stamp=None, first=False):
+        """主循环发送新鲜决策；first=True 或刚从安全指令恢复时立即发送。返回本次是否发送"""
+        with self.lock:
+            now = time.monotonic()
+            interval = now - self.last_fresh
+            self.longest_stall = max(self.longest_stall, interval)
+            self.last_fresh = now
+            if not first:
+                # 偶发卡顿在 p95 中被忽略；持续偏慢的帧时间会抬高期限，避免每帧都触发安全指令
+                self._update_deadline(interval)
+            if first or self.tripped:
+                self.tripped = False
+                self.sender.send(command, stamp)
+                return True
+            return self.sender.update(command, stamp)
+
+    def _update_deadline(self, interval):
+        self.intervals.append(interval)
+        if self.factor and len(self.intervals) >= MIN_INTERVAL_SAMPLES:
+            self.deadline = max(self.min_deadline, self.factor * float(np.percentile(self.intervals, 95)))
+
+    def begin_inference(self):
+        """推理开始；推理进行中超过期限时再等待 grace 才发送安全指令"""
+        with self.lock:
+            self.inference_since = time.monotonic()
+
+    def end_inference(self):
+        with self.lock:
+            self.inference_since = None
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            with self.lock:
+                stalled = time.monotonic() - self.last_fresh
+                limit = self.deadline + (self.grace if self.inference_since is not None else 0.0)
+                if stalled > limit and not self.tripped:
+                    self.tripped = True
+                    self.misses += 1
+                    self.sender.send(self.failsafe)
+                    print(f"看门狗: {stalled * 1000:.0f} ms 没有新决策，已发送安全指令 '{self.failsafe}'")
+                elif self.tripped:
+                    self.sender.update(self.failsafe)  # 卡顿期间按心跳间隔重复安全指令
+
+    def stop(self):
+        self._stop.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def summary(self):
+        return (f"看门狗: 期限 {self.deadline * 1000:.0f} ms（下限 {self.min_deadline * 1000:.0f} ms）, 超期 {self.misses} 次（发送 '{self.failsafe}'），"
+                f"最长无决策 {self.longest_stall * 1000:.0f} ms")
@@ -1,166 +1,892 @@
 import cv2
+import numpy as np
+import os
+import signal
 import socket
+import threading
 import time
-from ultralytics import YOLO
+from collections import namedtuple
+
+from command_protocol import CommandSender
+from stage_timer import StageTimer
+from track_store import DetectionStore
+
+# 进程启动时间，用于统计“启动 -> 首条指令”的耗时。ultralytics / torch 只在加载模型时才导入（见 backends.py）
+STARTUP_T0 = time.monotonic()
 
 # --- 主模式选择 ---
+# 'camera'   -> 单线程实时摄像头检测与无线控制
+# 'video'    -> 检测本地视频文件并保存结果
+# 'pipeline' -> 多线程流水线（采集/推理/决策/渲染并行，见 pipeline.py）
+# 'offline'  -> 批量 / 多进程离线处理视频文件，只输出决策序列（见 offline_engine.py）
 MODE = 'camera'
 
+# --- 无界面模式配置 ---
+# 开启后不做任何逐帧绘制、复制和窗口显示（适用于无屏幕的可穿戴设备），用 Ctrl+C / SIGTERM 结束
+HEADLESS = False
+DEBUG_SNAPSHOT_INTERVAL = 0  # 调试快照保存间隔（秒），0 表示关闭
+DEBUG_SNAPSHOT_SCALE = 0.25  # 调试快照的缩放比例
+DEBUG_SNAPSHOT_DIR = "output/snapshots"
+
+# --- 分阶段计时配置 ---
+# 开启后记录采集/推理/转换/筛选/状态机/发送/绘制/显示各阶段耗时，退出时打印 p50/p95/p99 并写出 JSON
+# 也可以通过环境变量 TN_STAGE_TIMING=1 开启
+STAGE_TIMING = os.environ.get("TN_STAGE_TIMING") == "1"
+TIMING_REPORT_PATH = "output/timing_report.json"
+
+# --- 采样分析配置（见 profiler.py） ---
+# 'window': 从启动起按 PROFILE_RATE_HZ 采样帧循环的调用栈 PROFILE_WINDOW_SECONDS 秒
+# 'slow':   持续采样最近 PROFILE_LOOKBACK_SECONDS 秒，帧耗时超过 PROFILE_SLOW_FRAME_MS 时导出该帧期间的调用栈
+# 输出 collapsed stack / speedscope JSON / 按函数汇总；也可以通过环境变量 TN_PROFILE=window 或 TN_PROFILE=slow 开启
+PROFILE_MODE = os.environ.get("TN_PROFILE", "")
+PROFILE_RATE_HZ = 200
+PROFILE_WINDOW_SECONDS = 10.0
+PROFILE_SLOW_FRAME_MS = 100
+PROFILE_LOOKBACK_SECONDS = 2.0  # 不应短于最慢的一帧
+PROFILE_MAX_CAPTURES = 10  # slow 模式单独导出的慢帧数，之后的慢帧只计入退出时的合计
+PROFILE_DIR = "output/profiles"
+
+# --- 运行遥测配置（见 telemetry.py） ---
+# 开启后摄像头模式每帧写一条记录（帧龄、推理耗时、障碍物数量、状态、指令、发送时间）到环形缓冲区，
+# 后台线程批量写入轮转日志，并在本机提供 HTTP 指标页；也可以通过环境变量 TN_TELEMETRY=1 开启
+TELEMETRY = os.environ.get("TN_TELEMETRY") == "1"
+TELEMETRY_DIR = "output/telemetry"
+TELEMETRY_FORMAT = 'jsonl'  # 'jsonl' 或 'binary'
+TELEMETRY_RING_SIZE = 4096  # 环形缓冲区记录数（30 FPS 下约 2 分钟）
+TELEMETRY_FLUSH_INTERVAL = 1.0  # 后台线程写日志的间隔（秒）
+TELEMETRY_MAX_BYTES = 16 * 1024 * 1024  # 单个日志文件超过该大小时轮转
+TELEMETRY_BACKUPS = 5  # 保留的旧日志文件数
+TELEMETRY_HTTP_HOST = '127.0.0.1'
+TELEMETRY_HTTP_PORT = 8765  # 指标页端口，0 表示不启动
+
+# --- 检测结果录制配置 ---
+# 设置为目录路径后，摄像头/视频模式会把每帧的原始跟踪结果录制下来，供 detection_log.py 重放调参
+RECORD_PATH = None
+
+# --- 自适应推理频率配置 ---
+# 开启后摄像头模式在 SEARCHING 且中央区域附近没有障碍物时每 SEARCH_INFERENCE_INTERVAL 帧才运行一次 YOLO，
+# 中间帧按匀速运动外推跟踪框（见 adaptive_inference.py）；AVOIDING 时始终每帧推理
+ADAPTIVE_INFERENCE = False
+SEARCH_INFERENCE_INTERVAL = 3
+NEAR_CORRIDOR_MARGIN = 0.1  # 中央区域两侧各扩展画面宽度的 10% 视为“靠近”
+
+# --- 中央通道 ROI 推理配置 ---
+# 开启后摄像头模式在 SEARCHING 时只对中央区域两侧各加 ROI_SIDE_MARGIN 的竖条以 ROI_SEARCH_IMGSZ 推理，
+# AVOIDING 时恢复整帧推理；检测框映射回整帧后由独立的 ByteTrack 跟踪（见 roi_inference.py）
+ROI_INFERENCE = False
+ROI_SIDE_MARGIN = 0.15
+ROI_SEARCH_IMGSZ = 480
+
+# --- 跟踪器配置（见 trackers.py） ---
+# 'bytetrack': model.track(tracker="bytetrack.yaml")（原来的方式）
+# 'iou': model.predict + 内置的向量化 IoU / 中心点匹配，跟踪开销低，适合性能较弱的CPU
+# ROI 推理和多路流模式使用独立运行的同名跟踪器
+TRACKER = 'bytetrack'
+
+# --- 运动门控配置（见 motion_gate.py） ---
+# 画面几乎不变时跳过推理，沿用上一次的检测结果和决策；跳过的帧不写入 RECORD_PATH 录制
+MOTION_GATING = False
+MOTION_DOWNSCALE_WIDTH = 64  # 帧差使用的缩小宽度（像素）
+MOTION_PIXEL_THRESHOLD = 12  # 灰度差超过该值的像素视为变化
+MOTION_AREA_FRACTION = 0.005  # 变化像素超过该比例时运行推理
+MOTION_REFRESH_SECONDS = 0.5  # 距上一次推理超过该时间时强制推理
+
+# --- 延迟预算与看门狗配置（见 deadline.py） ---
+# 两者默认关闭：慢速 CPU 上帧时间可能接近预算，需要先按实测帧时间调整
+DEADLINE_SCHEDULING = False  # 推理开始前帧龄已超过 FRAME_BUDGET_MS 的帧直接丢弃
+FRAME_BUDGET_MS = 150  # 每帧 采集 -> 决策 的延迟预算（毫秒）
+DECISION_WATCHDOG = False  # 超过期限没有新决策时发送 FAILSAFE_COMMAND
+DECISION_DEADLINE_MS = 500  # 看门狗期限下限（毫秒）
+DECISION_DEADLINE_FACTOR = 4  # 期限至少为最近决策间隔 p95 的该倍数；0 时固定使用 DECISION_DEADLINE_MS
+DECISION_INFERENCE_GRACE_MS = 1000  # 推理仍在进行时，超过期限后再等待的时间（毫秒）
+FAILSAFE_COMMAND = 'C'  # 'C' 回中；'D' 为降级提示（舵机回中、LED 蓝色）
+# 注意: 'D' 需要更新后的固件（control/tactile.ino），旧固件不认识 'D'，看门狗触发时设备不会回中
+
+# --- 摄像头与视频配置 ---
+CAMERA_INDEX = 2  # 也可以设置为视频文件路径，按原始帧率实时播放，代替摄像头测试（见 capture.py）
+CAPTURE_BACKEND = 'auto'  # 'auto': Linux 使用 V4L2，Windows 使用 DirectShow；也可以指定 'v4l2' / 'dshow' / 'any'
+CAPTURE_FOURCC = 'MJPG'  # 请求的像素格式，None 保持驱动默认
+CAPTURE_BUFFER_SIZE = 1  # 驱动缓冲区帧数，越小读到的帧越新
+CAPTURE_WIDTH = None  # 请求的分辨率，None 保持驱动默认
+CAPTURE_HEIGHT = None
+VIDEO_INPUT_PATH = "path/to/your/video.mp4"  # 视频模式的输入；流水线模式下摄像头不可用时也回退到该视频文件
+VIDEO_OUTPUT_PATH = "output/result_video.mp4"  # 视频模式处理结果的保存路径
+VIDEO_DISPLAY = True  # 视频模式是否显示窗口（不影响写出结果视频）
+
+# --- 视频输出配置（见 video_writer.py） ---
+ASYNC_VIDEO_WRITER = True  # 在单独的进程中编码结果视频，主循环只复制画面到共享内存
+OUTPUT_SCALE = 1.0  # 输出分辨率缩放比例，例如 0.5 为半尺寸
+OUTPUT_STRIDE = 1  # 每隔几帧写出一帧，例如 2 为隔帧写出
+OUTPUT_OVERLAY_ONLY = False  # 只写检测框和决策信息（黑色背景），不写原始画面
+
 # --- 网络配置 ---
 ESP32_IP = "192.168.147.27"  # <--- !!! 修改为你的ESP32的实际IP地址 !!!
 ESP32_PORT = 12345
+COMMAND_PROTOCOL = 'binary'  # 'binary' -> 带序号和时间戳的二进制指令帧（兼容旧固件）；'ascii' -> 单字符格式
+HEARTBEAT_INTERVAL = 1.0  # 决策变化时立即发送，决策不变时的心跳间隔（秒）
+
+# --- 多设备配置（见 command_transport.py） ---
+# 非空时通过后台 asyncio 事件循环向这里的所有设备发送指令（不再使用上面的 ESP32_IP）；
+# 每项为 (名称, IP, 端口, 角色)，角色: 'all' 接收全部指令，'left' / 'right' 只提示各自方向的转向
+DEVICES = []  # 例如 [('left', '192.168.147.28', 12345, 'left'), ('right', '192.168.147.29', 12345, 'right')]
+COMMAND_ACK = True  # 要求设备应答，用于统计每个设备的往返延迟和丢包（需要更新后的固件）
 
 # --- YOLO模型与跟踪配置 ---
 MODEL_PATH = 'yolov8n.pt'
 CONFIDENCE_THRESHOLD = 0.5
 OBSTACLE_CLASSES = ['person', 'bicycle', 'car', 'motorcycle', 'bus', 'train', 'truck']
 
+# --- 推理后端配置（见 backends.py） ---
+# 'pytorch'  -> 直接加载 .pt 权重
+# 'onnx'     -> ONNX Runtime；'openvino' -> OpenVINO。第一次运行时导出并缓存到 MODEL_CACHE_DIR，之后直接加载
+INFERENCE_BACKEND = 'pytorch'
+BACKEND_INT8 = False  # 使用在 datasets 目录图片上校准的 INT8 量化模型（仅 onnx / openvino）
+CALIBRATION_SOURCES = []  # 额外的 INT8 校准素材（视频文件或图片目录），建议加入实际场景的录像
+CALIBRATION_SAMPLES = 300  # INT8 校准最多使用的画面数，从视频中均匀抽帧
+INFERENCE_IMGSZ = 640
+MODEL_CACHE_DIR = "output/model_cache"
+WARMUP_FRAMES = 3  # 加载后用空白帧预热的次数
+CACHE_FUSED_MODEL = True  # pytorch 后端：把融合 Conv+BN 后的模型缓存到 MODEL_CACHE_DIR，下次启动直接加载
+
 # --- 检测与避障逻辑配置 ---
 CENTER_DEAD_ZONE_PERCENT = 0.4  # 中央区域占比扩大到40%
 MIN_AREA_THRESHOLD = 8000  # 最小障碍物面积阈值，根据实际情况调整
 AVOIDANCE_DIRECTION = 'L'  # 默认的避障转向：'L' 或 'R'
 
+# --- 触发方式配置 ---
+# 'area': 面积最大的障碍物中心进入中央区域时触发（原来的方式，面积代表距离）
+# 'ttc':  按框高和面积的增长率估计每个障碍物的碰撞时间（time-to-collision），中央区域内碰撞时间低于
+#         TTC_THRESHOLD_SECONDS 的障碍物触发避障，碰撞时间最短的优先；快速靠近的目标更早触发，
+#         远处静止的大目标不再触发。碰撞时间由轨迹表中的历史估计，摄像头 / 视频 / 流水线模式和重放都支持
+TRIGGER_MODE = 'area'
+TTC_THRESHOLD_SECONDS = 2.0
+TTC_WINDOW = 10  # 估计增长率使用的最近帧数（不超过 TRACK_HISTORY）
+TTC_MIN_AREA = 2000  # ttc 模式下代替 MIN_AREA_THRESHOLD 的面积下限，远处的小目标也参与估计
+TTC_CLOSE_AREA = 60000  # 框大到贴近画面边缘、不再变大时，面积超过该值也触发
+
+# --- 检测结果存储配置（见 track_store.py） ---
+MAX_DETECTIONS = 300  # 每帧最多保存的障碍物数量（与 ultralytics 默认的 max_det 相同）
+TRACK_TABLE_SIZE = 256  # 轨迹表槽位数，按 track_id % TRACK_TABLE_SIZE 循环复用
+TRACK_HISTORY = 30  # 每条轨迹保留的历史帧数
+
 # --- 【新增】状态机配置 ---
 STATE_SEARCHING = "SEARCHING"
 STATE_AVOIDING = "AVOIDING"
-current_state = STATE_SEARCHING
-tracked_obstacle_id = None
 
 
-def find_closest_obstacle(detections):
-    """从所有检测到的障碍物中，找到面积最大的那一个（作为最近的代表）"""
-    closest_obstacle = None
-    max_area = 0
+def compute_bounds(frame_width, dead_zone_percent=None):
+    """根据画面宽度计算中央死区的左右边界"""
+    if dead_zone_percent is None:
+        dead_zone_percent = CENTER_DEAD_ZONE_PERCENT
+    dead_zone_width = frame_width * dead_zone_percent
+    left_bound = (frame_width / 2) - (dead_zone_width / 2)
+    right_bound = (frame_width / 2) + (dead_zone_width / 2)
+    return left_bound, right_bound
+
+
+def extract_tracks(result):
+    """把单帧跟踪结果从张量转换为 numpy 数组 (boxes, ids, confs, clss)；没有跟踪ID时返回 None"""
+    if result.boxes.id is None:  # 检查是否有跟踪ID
+        return None
+    boxes = result.boxes.xyxy.cpu().numpy().astype(int)
+    ids = result.boxes.id.cpu().numpy().astype(int)
+    confs = result.boxes.conf.cpu().numpy()
+    clss = result.boxes.cls.cpu().numpy().astype(int)
+    return boxes, ids, confs, clss
+
+
+def build_class_mask(names, obstacle_classes=None):
+    """模型加载后调用一次：把 OBSTACLE_CLASSES 解析为按类别ID索引的布尔查找表"""
+    if obstacle_classes is None:
+        obstacle_classes = OBSTACLE_CLASSES
+    mask = np.zeros(max(names) + 1, dtype=bool)
+    for class_id, class_name in names.items():
+        mask[class_id] = class_name in obstacle_classes
+    return mask
+
+
+class DetectionBatch:
+    """一帧中筛选后的障碍物，按列存放在 numpy 数组中"""
+    __slots__ = ('ids', 'boxes', 'areas', 'center_x')
+
+    def __init__(self, ids, boxes, areas, center_x):
+        self.ids = ids
+        self.boxes = boxes
+        self.areas = areas
+        self.center_x = center_x
+
+    def __len__(self):
+        return len(self.ids)
+
+    def closest_index(self):
+        """面积最大的障碍物（作为最近的代表）的下标，没有障碍物时返回 -1"""
+        if len(self.ids) == 0:
+            return -1
+        return int(np.argmax(self.areas))
+
+    def find(self, track_id):
+        """查找指定跟踪ID的下标，不存在时返回 -1"""
+        matches = np.flatnonzero(self.ids == track_id)
+        return int(matches[0]) if len(matches) else -1
+
+    def time_to_collision(self, window):
+        """单帧结果没有轨迹历史，碰撞时间全部为 inf"""
+        return np.full(len(self.ids), np.inf)
+
+
+EMPTY_BATCH = DetectionBatch(np.empty(0, dtype=int), np.empty((0, 4), dtype=int), np.empty(0, dtype=int),
+                             np.empty(0, dtype=float))
+
+
+def filter_detections(tracks, class_mask, conf_threshold=None, min_area=None):
+    """按置信度、类别、面积整体做数组筛选，返回 DetectionBatch"""
+    if tracks is None:
+        return EMPTY_BATCH
+    if conf_threshold is None:
+        conf_threshold = CONFIDENCE_THRESHOLD
+    if min_area is None:
+        min_area = default_min_area()
+    boxes, ids, confs, clss = tracks
 
-    for obstacle in detections:
-        x1, y1, x2, y2 = obstacle['box']
-        area = (x2 - x1) * (y2 - y1)
-        if area > max_area:
-            max_area = area
-            closest_obstacle = obstacle
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = (confs > conf_threshold) & class_mask[clss] & (areas > min_area)
+    kept_boxes = boxes[keep]
+    return DetectionBatch(ids[keep], kept_boxes, areas[keep], (kept_boxes[:, 0] + kept_boxes[:, 2]) / 2)
 
-    return closest_obstacle
 
+def default_min_area(trigger_mode=None):
+    """ttc 模式使用更低的面积下限，远处的目标由碰撞时间判断"""
+    return TTC_MIN_AREA if (trigger_mode or TRIGGER_MODE) == 'ttc' else MIN_AREA_THRESHOLD
 
-def process_live_camera(model):
+
+def create_detection_store(frame_rate=30):
+    """按配置创建预分配的检测结果存储；frame_rate 用于没有时间戳时换算碰撞时间"""
+    return DetectionStore(MAX_DETECTIONS, TRACK_TABLE_SIZE, TRACK_HISTORY, frame_rate)
+
+
+def load_detections(store, tracks, class_mask, conf_threshold=None, min_area=None, timestamp=None):
+    """与 filter_detections 相同的筛选，但写入预分配的 DetectionStore 并更新轨迹表；timestamp 为采集时间（秒）"""
+    if conf_threshold is None:
+        conf_threshold = CONFIDENCE_THRESHOLD
+    if min_area is None:
+        min_area = default_min_area()
+    return store.load(tracks, class_mask, conf_threshold, min_area, timestamp)
+
+
+def extract_detections(result, class_mask):
+    """从单帧跟踪结果中提取所有有效的障碍物"""
+    return filter_detections(extract_tracks(result), class_mask)
+
+
+# 状态机某一帧的只读副本，供其他线程绘制（与 AvoidanceStateMachine 的属性同名，可直接传给 draw_overlay）
+StateSnapshot = namedtuple('StateSnapshot', ['left_bound', 'right_bound', 'state', 'tracked_obstacle_id'])
+
+
+class AvoidanceStateMachine:
     """
-    处理实时摄像头流，实现基于状态机和对象跟踪的智能避障。
+    SEARCHING / AVOIDING 状态机。
+    每帧输入筛选后的检测结果，输出应发送给ESP32的指令。
     """
-    global current_state, tracked_obstacle_id
 
-    # 初始化网络
+    def __init__(self, left_bound, right_bound, direction=None, verbose=True, trigger_mode=None):
+        self.left_bound = left_bound
+        self.right_bound = right_bound
+        self.direction = direction or AVOIDANCE_DIRECTION
+        self.verbose = verbose
+        self.trigger_mode = trigger_mode or TRIGGER_MODE
+        self.state = STATE_SEARCHING
+        self.tracked_obstacle_id = None
+
+    def reset(self):
+        self.state = STATE_SEARCHING
+        self.tracked_obstacle_id = None
+
+    def snapshot(self):
+        return StateSnapshot(self.left_bound, self.right_bound, self.state, self.tracked_obstacle_id)
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def update(self, detections):
+        """推进一帧状态机（输入为 DetectionStore 或 DetectionBatch），返回本帧指令"""
+        command = 'C'  # 默认指令
+
+        if self.state == STATE_SEARCHING:
+            command = 'C'  # 保持直行
+            if self.trigger_mode == 'ttc':
+                target = self.most_urgent(detections)
+            else:
+                # 找到最近的障碍物；如果最近的障碍物在中央区域，则启动避障
+                target = detections.closest_index()
+                if target >= 0 and not self.left_bound < detections.center_x[target] < self.right_bound:
+                    target = -1
+            if target >= 0:
+                self.state = STATE_AVOIDING
+                self.tracked_obstacle_id = int(detections.ids[target])
+                command = self.direction  # 发送转向指令
+                self._log(f"--- 状态切换: SEARCHING -> AVOIDING (ID: {self.tracked_obstacle_id}) ---")
+
+        elif self.state == STATE_AVOIDING:
+            command = self.direction  # 保持转向
+
+            # 检查被跟踪的障碍物是否还在
+            index = detections.find(self.tracked_obstacle_id)
+            if index >= 0:
+                # 如果障碍物已经移动到侧方，说明避障成功
+                center_x = detections.center_x[index]
+                if center_x < self.left_bound or center_x > self.right_bound:
+                    self._log(f"--- 状态切换: AVOIDING -> SEARCHING (成功越过 ID: {self.tracked_obstacle_id}) ---")
+                    self.state = STATE_SEARCHING
+                    self.tracked_obstacle_id = None
+                    command = 'C'
+            else:
+                # 如果被跟踪的障碍物已经消失，也认为避障成功
+                self.state = STATE_SEARCHING
+                self.tracked_obstacle_id = None
+                command = 'C'
+                self._log(f"--- 状态切换: AVOIDING -> SEARCHING (目标 ID 消失) ---")
+
+        return command
+
+    def most_urgent(self, detections):
+        """ttc 模式：中央区域内碰撞时间低于阈值（或面积超过 TTC_CLOSE_AREA）的障碍物中最紧迫的下标，没有时返回 -1"""
+        if len(detections) == 0:
+            return -1
+        ttc = detections.time_to_collision(TTC_WINDOW)
+        inside = (detections.center_x > self.left_bound) & (detections.center_x < self.right_bound)
+        urgent = np.flatnonzero(inside & ((ttc < TTC_THRESHOLD_SECONDS) | (detections.areas > TTC_CLOSE_AREA)))
+        if len(urgent) == 0:
+            return -1
+        # 碰撞时间最短的优先，都只满足面积条件时取面积最大的
+        return int(urgent[np.lexsort((-detections.areas[urgent], ttc[urgent]))[0]])
+
+
+def run_decisions(track_frames, frame_width, class_mask, dead_zone_percent=None, direction=None,
+                  conf_threshold=None, min_area=None, timestamps=None, trigger_mode=None, frame_rate=30):
+    """
+    对逐帧跟踪结果（extract_tracks 的输出序列）离线运行状态机，返回每帧的 (状态, 指令)。
+    timestamps 为每帧的时间（秒），没有时按 frame_rate 换算。未指定的参数使用本文件顶部的配置。
+    """
+    left_bound, right_bound = compute_bounds(frame_width, dead_zone_percent)
+    state_machine = AvoidanceStateMachine(left_bound, right_bound, direction, verbose=False, trigger_mode=trigger_mode)
+    store = create_detection_store(frame_rate)
+    if min_area is None:
+        min_area = default_min_area(trigger_mode)
+    decisions = []
+    for index, tracks in enumerate(track_frames):
+        timestamp = timestamps[index] if timestamps is not None else None
+        command = state_machine.update(load_detections(store, tracks, class_mask, conf_threshold, min_area, timestamp))
+        decisions.append((state_machine.state, command))
+    return decisions
+
+
+def draw_overlay(frame, result, state_machine, command=None, detections=None):
+    """
+    绘制检测框、辅助线和状态信息，返回用于显示的图像。
+    result 为 None（本帧未运行推理）时改为绘制 detections 中外推得到的框。
+    """
+    # 绘制检测框和ID
+    if result is None:
+        annotated_frame = frame
+        if detections is not None:
+            for box, track_id in zip(detections.boxes, detections.ids):
+                cv2.rectangle(annotated_frame, (int(box[0]), int(box[1])), (int(box[2]), int(box[3])), (0, 200, 255), 2)
+                cv2.putText(annotated_frame, f"id:{track_id}*", (int(box[0]), int(box[1]) - 5),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 255), 2)
+    elif result.boxes.id is not None:
+        annotated_frame = result.plot()
+    else:
+        annotated_frame = frame
+
+    return draw_status(annotated_frame, state_machine.left_bound, state_machine.right_bound, state_machine.state,
+                       state_machine.tracked_obstacle_id, command)
+
+
+def draw_status(image, left_bound, right_bound, state, tracked_id, command=None):
+    """绘制辅助线和状态信息"""
+    left_bound, right_bound = int(left_bound), int(right_bound)
+    cv2.line(image, (left_bound, 0), (left_bound, image.shape[0]), (255, 0, 0), 1)
+    cv2.line(image, (right_bound, 0), (right_bound, image.shape[0]), (255, 0, 0), 1)
+    cv2.putText(image, f"State: {state}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+    cv2.putText(image, f"Tracking ID: {tracked_id}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+    if command is not None:
+        cv2.putText(image, f"Decision: {command}", (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+    return image
+
+
+def install_stop_handler():
+    """无界面模式下用 SIGINT / SIGTERM 代替按键退出，返回收到信号后被置位的事件"""
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        print(f"收到信号 {signum}，准备退出...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, handle_signal)
+    return stop_event
+
+
+class DebugSnapshotter:
+    """按固定的低频率保存缩小后的调试快照，只在真正保存时才做缩放和绘制"""
+
+    def __init__(self, interval=DEBUG_SNAPSHOT_INTERVAL, scale=DEBUG_SNAPSHOT_SCALE, output_dir=DEBUG_SNAPSHOT_DIR):
+        self.interval = interval
+        self.scale = scale
+        self.output_dir = output_dir
+        self.last_save_time = 0
+        if self.interval > 0:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+    def maybe_save(self, frame, detections, state_machine, command):
+        if self.interval <= 0:
+            return
+        current_time = time.time()
+        if current_time - self.last_save_time < self.interval:
+            return
+        self.last_save_time = current_time
+
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        for box in detections.boxes:
+            x1, y1, x2, y2 = (int(v * self.scale) for v in box)
+            cv2.rectangle(small, (x1, y1), (x2, y2), (0, 255, 0), 1)
+        cv2.putText(small, f"{state_machine.state} {command}", (5, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.4,
+                    (0, 255, 255), 1)
+        filename = f"snapshot_{int(current_time * 1000)}.jpg"
+        cv2.imwrite(os.path.join(self.output_dir, filename), small)
+
+
+class RunStats:
+    """统计处理帧数、墙钟时间和CPU时间，用于比较有界面/无界面模式的开销"""
+
+    def __init__(self):
+        self.frames = 0
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    def tick(self):
+        self.frames += 1
+
+    def summary(self):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        return {
+            'frames': self.frames,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'fps': self.frames / wall if wall > 0 else 0.0,
+            'cpu_ms_per_frame': cpu * 1000 / self.frames if self.frames else 0.0,
+        }
+
+    def report(self, label):
+        stats = self.summary()
+        print(f"[{label}] {stats['frames']} 帧, {stats['fps']:.1f} FPS, "
+              f"CPU {stats['cpu_ms_per_frame']:.1f} ms/帧")
+        return stats
+
+
+def open_recorder(cap, model, source):
+    """RECORD_PATH 已设置时创建检测结果录制器"""
+    if not RECORD_PATH:
+        return None
+    from detection_log import DetectionRecorder
+    return DetectionRecorder(RECORD_PATH, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                             int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), cap.get(cv2.CAP_PROP_FPS), model.names,
+                             source, MODEL_PATH)
+
+
+def open_tracking(model, cap=None, frame_rate=None):
+    """
+    TRACKER 不是 'bytetrack' 时返回 model.predict + 内置跟踪器，否则返回 None（使用 model.track）。
+    跟踪器的帧率取自 cap，没有 cap 时（图片、批量解码）使用 frame_rate，默认 30
+    """
+    if TRACKER == 'bytetrack':
+        return None
+    from trackers import PredictTracking, create_tracker
+    if cap is not None:
+        frame_rate = int(cap.get(cv2.CAP_PROP_FPS))
+    return PredictTracking(model, create_tracker(TRACKER, int(frame_rate or 0) or 30))
+
+
+def video_fps(path):
+    """视频文件的帧率，读不到时返回 None"""
+    cap = cv2.VideoCapture(path)
+    try:
+        return cap.get(cv2.CAP_PROP_FPS) or None
+    finally:
+        cap.release()
+
+
+def track_frame(model, frame, tracking=None):
+    """
+    对一帧运行跟踪，返回 (result, tracks)。tracking 为 open_tracking 的返回值：
+    None 时使用 model.track（ByteTrack），否则使用 model.predict + 内置跟踪器（没有 result，返回 None）
+    """
+    if tracking is not None:
+        return None, tracking.track(frame)
+    results = model.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False)
+    return results[0], extract_tracks(results[0])
+
+
+def open_sender():
+    """创建指令发送器：配置了 DEVICES 时使用多设备分发，否则只向 ESP32_IP 发送"""
+    if DEVICES:
+        from command_transport import CommandTransport
+        sender = CommandTransport(DEVICES, COMMAND_PROTOCOL, HEARTBEAT_INTERVAL, COMMAND_ACK)
+        print(f"UDP模式启动，将向 {len(DEVICES)} 个设备发送数据: {', '.join(name for name, *_ in DEVICES)}")
+        return sender
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    esp32_address = (ESP32_IP, ESP32_PORT)
+    sender = CommandSender(sock, (ESP32_IP, ESP32_PORT), COMMAND_PROTOCOL, HEARTBEAT_INTERVAL)
     print(f"UDP模式启动，将向 {ESP32_IP}:{ESP32_PORT} 发送数据")
+    return sender
+
 
-    cap = cv2.VideoCapture(2, cv2.CAP_DSHOW)
+def process_live_camera(model, headless=None, cap=None, sender=None):
+    """
+    处理实时摄像头流，实现基于状态机和对象跟踪的智能避障。
+    headless=True 时跳过所有绘制与显示，通过信号退出。
+    cap / sender 可以由 startup.py 预先并行打开后传入。
+    """
+    if headless is None:
+        headless = HEADLESS
+    stop_event = install_stop_handler() if headless else None
+    snapshotter = DebugSnapshotter() if headless else None
+
+    # 初始化网络
+    if sender is None:
+        sender = open_sender()
+
+    from capture import FrameAgeStats, ThreadedCapture, open_capture
+    if cap is None:
+        cap = open_capture(CAMERA_INDEX, stop_event=stop_event)
+    elif isinstance(cap, ThreadedCapture):
+        cap.stop_event = stop_event  # startup.py 提前打开的摄像头：等待新帧时也要响应退出信号
     if not cap.isOpened():
         print("错误: 无法打开摄像头。")
+        sender.close()
         return
 
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    dead_zone_width = frame_width * CENTER_DEAD_ZONE_PERCENT
-    left_bound = (frame_width / 2) - (dead_zone_width / 2)
-    right_bound = (frame_width / 2) + (dead_zone_width / 2)
+    left_bound, right_bound = compute_bounds(frame_width)
+    state_machine = AvoidanceStateMachine(left_bound, right_bound)
+    class_mask = build_class_mask(model.names)
+    store = create_detection_store()
+    recorder = open_recorder(cap, model, CAMERA_INDEX)
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    scheduler = propagator = roi_inference = None
+    if ADAPTIVE_INFERENCE:
+        from adaptive_inference import AdaptiveScheduler, TrackPropagator
+        scheduler = AdaptiveScheduler(left_bound, right_bound, frame_width, SEARCH_INFERENCE_INTERVAL,
+                                      NEAR_CORRIDOR_MARGIN)
+        propagator = TrackPropagator()
+    if ROI_INFERENCE:
+        from roi_inference import RoiInference
+        roi_inference = RoiInference(model, frame_width, frame_height, left_bound, right_bound, class_mask,
+                                     frame_rate=int(cap.get(cv2.CAP_PROP_FPS)) or 30)
+    tracking = open_tracking(model, cap)
+    gate = None
+    if MOTION_GATING:
+        from motion_gate import MotionGate
+        gate = MotionGate()
+    deadline = watchdog = None
+    if DEADLINE_SCHEDULING:
+        from deadline import DeadlineScheduler
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        deadline = DeadlineScheduler(frame_interval=1.0 / fps if fps > 0 else None)
+    if DECISION_WATCHDOG:
+        from deadline import DecisionWatchdog
+        watchdog = DecisionWatchdog(sender).start()
+    frame_ages = FrameAgeStats()
+    from telemetry import open_telemetry
+    telemetry = open_telemetry()
+    from profiler import open_profiler
+    profiler = open_profiler()
+    frame_index = 0
+    tracks = detections = command = None
 
-    last_signal_time = 0
-    signal_interval = 0.2
+    run_stats = RunStats()
+    timer = StageTimer(STAGE_TIMING)
 
     try:
-        while True:
+        while stop_event is None or not stop_event.is_set():
+            frame_start = t = timer.start()
+            read_start = time.monotonic()
             success, frame = cap.read()
             if not success: break
+            # capture.py 的采集源带有每帧的采集时间；普通 cv2.VideoCapture 只能按 read() 是否立即返回估计
+            capture_time = getattr(cap, 'capture_time', None)
+            if capture_time is None:
+                capture_time = time.monotonic()
+                if deadline is not None:
+                    capture_time = deadline.stamp(read_start, capture_time)
+            t = timer.lap('capture', t)
+            if deadline is not None and not deadline.admit(capture_time):
+                # 卡顿后积压的旧帧已经超过预算，直接丢弃而不是晚一步处理
+                continue
 
-            # 【核心改变】使用 model.track() 而不是 model()
-            results = model.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False)
-
-            # 提取所有有效的检测结果
-            detections = []
-            if results[0].boxes.id is not None:  # 检查是否有跟踪ID
-                boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
-                ids = results[0].boxes.id.cpu().numpy().astype(int)
-                confs = results[0].boxes.conf.cpu().numpy()
-                clss = results[0].boxes.cls.cpu().numpy().astype(int)
-
-                for i, box in enumerate(boxes):
-                    class_name = model.names[clss[i]]
-                    area = (box[2] - box[0]) * (box[3] - box[1])
-                    if confs[i] > CONFIDENCE_THRESHOLD and class_name in OBSTACLE_CLASSES and area > MIN_AREA_THRESHOLD:
-                        detections.append({
-                            'id': ids[i],
-                            'box': box,
-                            'center_x': (box[0] + box[2]) / 2
-                        })
-
-            # 找到最近的障碍物
-            closest_obstacle = find_closest_obstacle(detections)
-            command = 'C'  # 默认指令
-
-            # --- 状态机逻辑 ---
-            if current_state == STATE_SEARCHING:
-                command = 'C'  # 保持直行
-                if closest_obstacle:
-                    # 如果最近的障碍物在中央区域，则启动避障
-                    if left_bound < closest_obstacle['center_x'] < right_bound:
-                        current_state = STATE_AVOIDING
-                        tracked_obstacle_id = closest_obstacle['id']
-                        command = AVOIDANCE_DIRECTION  # 发送转向指令
-                        print(f"--- 状态切换: SEARCHING -> AVOIDING (ID: {tracked_obstacle_id}) ---")
-
-            elif current_state == STATE_AVOIDING:
-                command = AVOIDANCE_DIRECTION  # 保持转向
-                obstacle_passed = True  # 假设已经越过
-
-                # 检查被跟踪的障碍物是否还在
-                for obs in detections:
-                    if obs['id'] == tracked_obstacle_id:
-                        obstacle_passed = False  # 还没越过
-                        # 如果障碍物已经移动到侧方，说明避障成功
-                        if obs['center_x'] < left_bound or obs['center_x'] > right_bound:
-                            current_state = STATE_SEARCHING
-                            tracked_obstacle_id = None
-                            command = 'C'
-                            print(f"--- 状态切换: AVOIDING -> SEARCHING (成功越过 ID: {obs['id']}) ---")
-                        break  # 找到了就不用再找了
-
-                # 如果被跟踪的障碍物已经消失，也认为避障成功
-                if obstacle_passed:
-                    current_state = STATE_SEARCHING
-                    tracked_obstacle_id = None
-                    command = 'C'
-                    print(f"--- 状态切换: AVOIDING -> SEARCHING (目标 ID 消失) ---")
+            # 运动门控：画面几乎不变时沿用上一次的跟踪结果和决策（第一帧总是推理）
+            static = gate is not None and not gate.should_run(frame, capture_time)
+            predicted = None
+            inference_start = time.perf_counter()
+            inference_seconds = 0.0
+            if scheduler is not None and not static:
+                predicted = propagator.predict(frame_index)
+            if static:
+                results = [None]
+                t = timer.lap('motion_gate', t)
+            elif scheduler is None or scheduler.should_run(state_machine.state, predicted, class_mask):
+                if watchdog is not None:
+                    watchdog.begin_inference()
+                if roi_inference is not None:
+                    # 裁剪 / 低分辨率推理，结果已是整帧坐标的跟踪框
+                    tracks = roi_inference.track(frame, state_machine.state)
+                    results = [None]
+                    t = timer.lap('track', t)
+                elif tracking is not None:
+                    # model.predict + 内置跟踪器
+                    tracks = tracking.track(frame)
+                    results = [None]
+                    t = timer.lap('track', t)
+                else:
+                    # 【核心改变】使用 model.track() 而不是 model()
+                    results = model.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False)
+                    t = timer.lap('track', t)
 
-            # 发送信号
-            current_time = time.time()
-            if current_time - last_signal_time > signal_interval:
-                sock.sendto(command.encode(), esp32_address)
-                # print(f"状态: {current_state}, 跟踪ID: {tracked_obstacle_id}, 指令: {command}")
-                last_signal_time = current_time
+                    # 提取所有有效的检测结果，并推进状态机
+                    tracks = extract_tracks(results[0])
+                    t = timer.lap('to_numpy', t)
+                inference_seconds = time.perf_counter() - inference_start
+                if watchdog is not None:
+                    watchdog.end_inference()
+                if propagator is not None:
+                    propagator.update(tracks, frame_index, (frame_width, frame_height))
+            else:
+                # 跳过推理：使用外推的跟踪框
+                results = [None]
+                tracks = predicted
+                t = timer.lap('propagate', t)
+            frame_index += 1
+            if not static:
+                if recorder is not None:
+                    # 门控跳过的帧没有新的跟踪结果，不录制（重放时这些帧沿用上一次的决策，结果相同）
+                    recorder.append(tracks, capture_time)
+                detections = load_detections(store, tracks, class_mask, timestamp=capture_time)
+                t = timer.lap('filter', t)
+                command = state_machine.update(detections)
+                t = timer.lap('state_machine', t)
 
-            # --- 可视化 ---
-            # 绘制辅助线和状态信息
-            cv2.line(frame, (int(left_bound), 0), (int(left_bound), frame.shape[0]), (255, 0, 0), 1)
-            cv2.line(frame, (int(right_bound), 0), (int(right_bound), frame.shape[0]), (255, 0, 0), 1)
-            cv2.putText(frame, f"State: {current_state}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-            cv2.putText(frame, f"Tracking ID: {tracked_obstacle_id}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1,
-                        (0, 255, 255), 2)
-            # 绘制检测框和ID
-            if results[0].boxes.id is not None:
-                annotated_frame = results[0].plot()
+            # 发送信号：决策变化立即发送，否则低频心跳；第一帧的决策总是立即发送（启动时可能已先发送过 'C'）
+            first = run_stats.frames == 0
+            if watchdog is not None:
+                sent = watchdog.decide(command, capture_time, first)
+            elif first:
+                sender.send(command, capture_time)
+                sent = True
             else:
-                annotated_frame = frame
+                sent = sender.update(command, capture_time)
+            if first:
+                print(f"首条决策指令 '{command}' 已发送，距进程启动 {(time.monotonic() - STARTUP_T0) * 1000:.0f} ms")
+            if sent:
+                # print(f"状态: {state_machine.state}, 跟踪ID: {state_machine.tracked_obstacle_id}, 指令: {command}")
+                t = timer.lap('send', t)
+            frame_ages.record(capture_time)
+            if telemetry is not None:
+                telemetry.record(run_stats.frames, capture_time, inference_seconds,
+                                 len(detections) if detections is not None else 0, state_machine.state, command, sent)
+            if deadline is not None:
+                deadline.complete(capture_time)
 
+            run_stats.tick()
+
+            # --- 可视化 ---
+            if headless:
+                snapshotter.maybe_save(frame, detections, state_machine, command)
+                timer.lap('frame', frame_start)
+                if profiler is not None:
+                    profiler.frame_done(read_start)
+                continue
+            annotated_frame = draw_overlay(frame, results[0], state_machine, detections=detections)
+            t = timer.lap('plot', t)
             cv2.imshow("YOLOv8 Advanced Obstacle Avoidance", annotated_frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                sock.sendto('C'.encode(), esp32_address)
+            key = cv2.waitKey(1)
+            timer.lap('imshow', t)
+            timer.lap('frame', frame_start)
+            if profiler is not None:
+                profiler.frame_done(read_start)
+            if key & 0xFF == ord('q'):
                 break
     finally:
+        if watchdog is not None:
+            watchdog.stop()
+        if telemetry is not None:
+            telemetry.stop()
+        if profiler is not None:
+            profiler.stop()
+        sender.send('C')
+        cap.release()
+        if recorder is not None:
+            recorder.close()
+        if not headless:
+            cv2.destroyAllWindows()
+        sender.close()
+        print(sender.summary())
+        if scheduler is not None:
+            print(f"自适应推理: 运行 {scheduler.runs} 帧, 跳过 {scheduler.skips} 帧")
+        if roi_inference is not None:
+            print(roi_inference.summary())
+        if gate is not None:
+            print(gate.summary())
+        if deadline is not None:
+            print(deadline.summary())
+        if watchdog is not None:
+            print(watchdog.summary())
+        if isinstance(cap, ThreadedCapture):
+            print(cap.summary())
+        print(frame_ages.summary())
+        if telemetry is not None:
+            print(telemetry.summary())
+        if profiler is not None:
+            print(profiler.summary())
+        run_stats.report("headless" if headless else "gui")
+        timer.report()
+        timer.write_json(TIMING_REPORT_PATH, {'mode': 'camera', 'model': MODEL_PATH, 'headless': headless})
+
+
+def process_video_file(model, video_path=None, output_path=None, headless=None):
+    """
+    处理本地视频文件，应用智能避障逻辑并保存结果。
+    headless=True 时不绘制、不显示也不写出视频，只运行检测与状态机；返回运行统计。
+    """
+    if headless is None:
+        headless = HEADLESS
+    video_path = video_path or VIDEO_INPUT_PATH
+    output_path = output_path or VIDEO_OUTPUT_PATH
+    stop_event = install_stop_handler() if headless else None
+    snapshotter = DebugSnapshotter() if headless else None
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"错误: 无法打开视频文件 {video_path}")
+        return None
+
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+
+    out = None
+    if not headless:
+        # 确保输出目录存在
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        from video_writer import open_video_output, overlay_of
+        out = open_video_output(output_path, fps, (frame_width, frame_height))
+        print(f"视频处理模式启动，输入: {video_path}, 输出: {output_path}")
+    else:
+        print(f"无界面视频处理模式启动，输入: {video_path}")
+
+    left_bound, right_bound = compute_bounds(frame_width)
+    state_machine = AvoidanceStateMachine(left_bound, right_bound)
+    class_mask = build_class_mask(model.names)
+    store = create_detection_store(fps or 30)  # 按帧号换算时间，与录像的实际时间一致
+    recorder = open_recorder(cap, model, video_path)
+    tracking = open_tracking(model, cap)
+    run_stats = RunStats()
+    timer = StageTimer(STAGE_TIMING)
+    from profiler import open_profiler
+    profiler = open_profiler()
+    frame_index = -1
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            frame_start = t = timer.start()
+            read_start = time.monotonic()
+            success, frame = cap.read()
+            if not success: break
+            frame_index += 1
+            t = timer.lap('capture', t)
+
+            # 核心逻辑与摄像头模式完全相同
+            if tracking is not None:
+                tracks = tracking.track(frame)
+                results = [None]
+                t = timer.lap('track', t)
+            else:
+                results = model.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False)
+                t = timer.lap('track', t)
+                tracks = extract_tracks(results[0])
+                t = timer.lap('to_numpy', t)
+            if recorder is not None:
+                recorder.append(tracks, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+            detections = load_detections(store, tracks, class_mask)
+            t = timer.lap('filter', t)
+            command = state_machine.update(detections)
+            t = timer.lap('state_machine', t)
+            run_stats.tick()
+
+            if headless:
+                snapshotter.maybe_save(frame, detections, state_machine, command)
+                timer.lap('frame', frame_start)
+                if profiler is not None:
+                    profiler.frame_done(read_start)
+                continue
+
+            # 可视化、写入并显示；不显示窗口时，不写出的帧和只写叠加信息的帧都不需要绘制整帧画面
+            annotated_frame = None
+            if VIDEO_DISPLAY or (not out.overlay_only and frame_index % out.stride == 0):
+                annotated_frame = draw_overlay(frame, results[0], state_machine, command, detections)
+            t = timer.lap('plot', t)
+            out.write(frame_index, annotated_frame,
+                      overlay_of(state_machine, detections, command) if out.overlay_only else None)
+            t = timer.lap('write', t)
+            key = 0
+            if VIDEO_DISPLAY:
+                cv2.imshow('YOLOv8 Video Processing', annotated_frame)
+                key = cv2.waitKey(1)
+                timer.lap('imshow', t)
+            timer.lap('frame', frame_start)
+            if profiler is not None:
+                profiler.frame_done(read_start)
+            if key & 0xFF == ord('q'): break
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            print(profiler.summary())
         cap.release()
-        cv2.destroyAllWindows()
-        sock.close()
+        if recorder is not None:
+            recorder.close()
+        if out is not None:
+            out.close()
+            if VIDEO_DISPLAY:
+                cv2.destroyAllWindows()
+            print(out.summary())
+            print(f"视频处理完成，结果已保存到 {output_path}")
+        timer.report()
+        timer.write_json(TIMING_REPORT_PATH, {'mode': 'video', 'model': MODEL_PATH, 'headless': headless,
+                                              'source': video_path})
+
+    return run_stats.report("headless" if headless else "gui")
 
 
 if __name__ == "__main__":
-    yolo_model = YOLO(MODEL_PATH)
-    print("YOLOv8 模型加载成功.")
-    process_live_camera(yolo_model)
\ No newline at end of file
+    if MODE == 'camera':
+        # 摄像头、UDP链路和模型并行准备，链路一就绪就先发送 'C'
+        from startup import parallel_startup
+        yolo_model, camera, command_sender, _ = parallel_startup()
+        process_live_camera(yolo_model, cap=camera, sender=command_sender)
+    elif MODE == 'offline':
+        from offline_engine import run_offline
+        run_offline(VIDEO_INPUT_PATH, MODEL_PATH)
+    elif MODE in ('video', 'pipeline'):
+        from backends import load_model
+        yolo_model = load_model(MODEL_PATH, INFERENCE_BACKEND, BACKEND_INT8)
+        print(f"YOLOv8 模型加载成功 (后端: {INFERENCE_BACKEND}{'-int8' if BACKEND_INT8 else ''}).")
+        if MODE == 'video':
+            process_video_file(yolo_model)
+        else:
+            from pipeline import run_pipeline
+            run_pipeline(yolo_model, headless=HEADLESS)
+    else:
+        print(f"错误: 未知的模式 '{MODE}'。请选择 'camera'、'video'、'pipeline' 或 'offline'。")
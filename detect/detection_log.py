@@ -0,0 +1,253 @@
+"""
+检测结果录制 / 重放。
+录制: 把每帧的原始跟踪框、ID、置信度、类别和时间戳按列保存为一个目录（每列一个 .npy 文件 + meta.json），
+      重放时可以用内存映射方式直接读取，不需要解码视频也不需要模型。
+      录制过程中每 FLUSH_FRAMES 帧把缓冲追加到各列的 .raw 文件，close() 时再转换为 .npy；
+      程序中途崩溃时已写入的部分仍然可以重放（DetectionSession 直接读取 .raw 文件）。
+重放: 把录制的结果直接送入筛选和 SEARCHING/AVOIDING 状态机，调整
+      CENTER_DEAD_ZONE_PERCENT / MIN_AREA_THRESHOLD / AVOIDANCE_DIRECTION 后可在毫秒级重新评估整段录像。
+用法:
+    python detection_log.py record path/to/video.mp4 sessions/walk1
+    python detection_log.py replay sessions/walk1 --dead-zone 0.3 --min-area 6000 --direction R
+    python detection_log.py replay sessions/walk1 --trigger ttc
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+
+FORMAT_VERSION = 1
+COLUMNS = {
+    'boxes': np.int32,
+    'ids': np.int32,
+    'confs': np.float32,
+    'clss': np.int16,
+}
+COLUMN_SHAPES = {'boxes': (4,)}
+FLUSH_FRAMES = 300  # 每录制这么多帧追加写入一次磁盘，内存中最多缓冲这么多帧
+
+
+def raw_path(path, name):
+    return os.path.join(path, f'{name}.raw')
+
+
+def load_raw(path, name, dtype, shape=()):
+    """以内存映射方式读取追加写入的 .raw 文件，末尾不完整的记录被忽略"""
+    item = np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+    count = os.path.getsize(raw_path(path, name)) // item
+    if count == 0:
+        return np.empty((0,) + shape, dtype=dtype)
+    return np.memmap(raw_path(path, name), dtype=dtype, mode='r', shape=(count,) + shape)
+
+
+class DetectionRecorder:
+    """逐帧追加跟踪结果，每 flush_frames 帧追加写入 .raw 文件，close() 时转换为 .npy"""
+
+    def __init__(self, path, frame_width, frame_height, fps, names, source=None, model_path=None,
+                 flush_frames=FLUSH_FRAMES):
+        self.path = path
+        self.flush_frames = flush_frames
+        self.meta = {
+            'version': FORMAT_VERSION,
+            'frame_width': frame_width,
+            'frame_height': frame_height,
+            'fps': fps,
+            'names': {int(k): v for k, v in names.items()},
+            'source': str(source) if source is not None else None,
+            'model': model_path,
+        }
+        self.frames = 0
+        self.boxes = 0
+        self._columns = {name: [] for name in COLUMNS}
+        self._counts = []
+        self._timestamps = []
+        os.makedirs(path, exist_ok=True)
+        # 先写出 meta.json（frames 为 None 表示录制未完成）并清空上一次录制留下的文件
+        self._write_meta(None)
+        for name in list(COLUMNS) + ['counts', 'timestamps']:
+            open(raw_path(path, name), 'wb').close()
+
+    def _write_meta(self, frames):
+        self.meta['frames'] = frames
+        with open(os.path.join(self.path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+
+    def append(self, tracks, timestamp):
+        """追加一帧 extract_tracks 的结果；没有跟踪结果时记为空帧"""
+        self._timestamps.append(timestamp)
+        if tracks is None:
+            self._counts.append(0)
+        else:
+            for name, value in zip(COLUMNS, tracks):
+                self._columns[name].append(value)
+            self._counts.append(len(tracks[1]))
+        if len(self._counts) >= self.flush_frames:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的帧追加到 .raw 文件；帧数和时间戳最后写入，崩溃时以它们为准"""
+        if not self._counts:
+            return
+        for name, dtype in COLUMNS.items():
+            chunks = self._columns[name]
+            if chunks:
+                with open(raw_path(self.path, name), 'ab') as f:
+                    f.write(np.concatenate(chunks).astype(dtype, copy=False).tobytes())
+            chunks.clear()
+        with open(raw_path(self.path, 'counts'), 'ab') as f:
+            f.write(np.asarray(self._counts, dtype=np.int64).tobytes())
+        with open(raw_path(self.path, 'timestamps'), 'ab') as f:
+            f.write(np.asarray(self._timestamps, dtype=np.float64).tobytes())
+        self.frames += len(self._counts)
+        self.boxes += sum(self._counts)
+        self._counts.clear()
+        self._timestamps.clear()
+
+    def close(self):
+        self.flush()
+        counts = load_raw(self.path, 'counts', np.int64)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        np.save(os.path.join(self.path, 'offsets.npy'), offsets)
+        np.save(os.path.join(self.path, 'timestamps.npy'), load_raw(self.path, 'timestamps', np.float64))
+        for name, dtype in COLUMNS.items():
+            np.save(os.path.join(self.path, f'{name}.npy'),
+                    load_raw(self.path, name, dtype, COLUMN_SHAPES.get(name, ())))
+        del counts
+        for name in list(COLUMNS) + ['counts', 'timestamps']:
+            os.remove(raw_path(self.path, name))
+        self._write_meta(self.frames)
+        print(f"录制完成: {self.frames} 帧, {self.boxes} 个跟踪框 -> {self.path}")
+
+
+class DetectionSession:
+    """以内存映射方式打开的录制结果；录制没有正常结束时读取已写入的 .raw 文件"""
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.names = {int(k): v for k, v in self.meta['names'].items()}
+        self.frame_width = self.meta['frame_width']
+        self.frame_height = self.meta['frame_height']
+        if self.meta.get('frames') is None and os.path.exists(raw_path(path, 'counts')):
+            self._load_partial(path)
+            return
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode=mmap_mode)
+        self.timestamps = np.load(os.path.join(path, 'timestamps.npy'), mmap_mode=mmap_mode)
+        self.columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in COLUMNS}
+
+    def _load_partial(self, path):
+        """只保留各列都完整写入的帧"""
+        counts = load_raw(path, 'counts', np.int64)
+        timestamps = load_raw(path, 'timestamps', np.float64)
+        self.columns = {name: load_raw(path, name, dtype, COLUMN_SHAPES.get(name, ()))
+                        for name, dtype in COLUMNS.items()}
+        frames = min(len(counts), len(timestamps))
+        self.offsets = np.zeros(frames + 1, dtype=np.int64)
+        np.cumsum(counts[:frames], out=self.offsets[1:])
+        complete = min(len(column) for column in self.columns.values())
+        frames = int(np.searchsorted(self.offsets, complete, side='right')) - 1
+        self.offsets = self.offsets[:frames + 1]
+        self.timestamps = timestamps[:frames]
+        print(f"警告: {path} 的录制没有正常结束，读取已写入的 {frames} 帧")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def tracks(self, index):
+        """第 index 帧的 (boxes, ids, confs, clss)，与 extract_tracks 的输出格式相同"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return tuple(self.columns[name][start:end] for name in COLUMNS)
+
+    def iter_tracks(self):
+        for index in range(len(self)):
+            yield self.tracks(index)
+
+
+def record_video(video_path, record_path, model_path=None):
+    """对视频文件逐帧跟踪并录制结果"""
+    from ultralytics import YOLO
+
+    model_path = model_path or core.MODEL_PATH
+    model = YOLO(model_path)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"错误: 无法打开视频文件 {video_path}")
+        return
+    recorder = DetectionRecorder(record_path, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                 int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), cap.get(cv2.CAP_PROP_FPS),
+                                 model.names, video_path, model_path)
+    tracking = core.open_tracking(model, cap)
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            recorder.append(core.track_frame(model, frame, tracking)[1], cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+    finally:
+        cap.release()
+        recorder.close()
+
+
+def replay_session(session, dead_zone_percent=None, direction=None, conf_threshold=None, min_area=None,
+                   obstacle_classes=None, trigger_mode=None):
+    """在录制结果上重新运行筛选和状态机，返回逐帧 (状态, 指令)"""
+    class_mask = core.build_class_mask(session.names, obstacle_classes)
+    return core.run_decisions(session.iter_tracks(), session.frame_width, class_mask, dead_zone_percent,
+                              direction, conf_threshold, min_area, session.timestamps, trigger_mode)
+
+
+def summarize_decisions(decisions, timestamps):
+    """统计指令切换次数和处于 AVOIDING 状态的总时长"""
+    switches = sum(1 for prev, cur in zip(decisions, decisions[1:]) if prev[1] != cur[1])
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    frame_durations = np.diff(timestamps, append=timestamps[-1:])
+    avoiding = np.array([state == core.STATE_AVOIDING for state, _ in decisions], dtype=bool)
+    return {
+        'frames': len(decisions),
+        'command_switches': switches,
+        'avoiding_frames': int(avoiding.sum()),
+        'avoiding_seconds': float(frame_durations[avoiding].sum()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检测结果录制 / 重放")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="对视频逐帧跟踪并录制结果")
+    record_parser.add_argument("video", help="输入视频")
+    record_parser.add_argument("output", help="录制结果目录")
+    record_parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+
+    replay_parser = subparsers.add_parser("replay", help="不经过模型，直接在录制结果上重新运行状态机")
+    replay_parser.add_argument("session", help="录制结果目录")
+    replay_parser.add_argument("--dead-zone", type=float, default=None, help="CENTER_DEAD_ZONE_PERCENT")
+    replay_parser.add_argument("--min-area", type=float, default=None, help="MIN_AREA_THRESHOLD")
+    replay_parser.add_argument("--conf", type=float, default=None, help="CONFIDENCE_THRESHOLD")
+    replay_parser.add_argument("--direction", choices=['L', 'R'], default=None, help="AVOIDANCE_DIRECTION")
+    replay_parser.add_argument("--trigger", choices=['area', 'ttc'], default=None, help="TRIGGER_MODE")
+    replay_parser.add_argument("--csv", default=None, help="保存逐帧决策的CSV路径")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_video(args.video, args.output, args.model)
+    else:
+        session = DetectionSession(args.session)
+        start_time = time.perf_counter()
+        decisions = replay_session(session, args.dead_zone, args.direction, args.conf, args.min_area,
+                                   trigger_mode=args.trigger)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        summary = summarize_decisions(decisions, session.timestamps)
+        print(f"重放 {summary['frames']} 帧用时 {elapsed_ms:.1f} ms: 指令切换 {summary['command_switches']} 次, "
+              f"AVOIDING {summary['avoiding_frames']} 帧 ({summary['avoiding_seconds']:.1f} s)")
+        if args.csv:
+            from offline_engine import write_decisions_csv
+            write_decisions_csv(args.csv, decisions)
@@ -0,0 +1,309 @@
+"""
+ESP32 模拟器：在本机上按 control/tactile.ino 的逻辑接收UDP指令并模拟舵机，
+用于在没有硬件时测量“画面采集 -> 触觉提示完成”的端到端延迟。
+
+- 监听 UDP 12345 端口，接受单字符指令和二进制指令帧（见 command_protocol.py）
+- 'L' / 'R' / 'C' / 'S' / 'D' 映射到 ANGLE_LEFT / ANGLE_RIGHT / ANGLE_CENTER
+- 指令帧请求应答（flags.bit3）时回复应答帧，供 command_transport.py 统计往返延迟
+- 与固件相同，每经过 SERVO_SPEED_DELAY 毫秒舵机移动1度
+- 记录每条指令的到达时间和虚拟舵机到达目标角度的时间；二进制帧携带的主机时间戳
+  是产生该决策的帧的采集时间，因此同一台机器上可以直接算出端到端延迟
+- 与固件相同，按发送时刻判断过期（推理耗时不计入）；会话号变化（主机重启）或主机时钟跳变后重新同步序号和时钟偏差，
+  --self-check 模拟这些情况
+
+用法（两个终端）:
+    python esp32_emulator.py --log output/emulator_log.csv
+    python pipeline.py --source path/to/clip.mp4 --headless --ip 127.0.0.1
+    python esp32_emulator.py --self-check
+"""
+import argparse
+import csv
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+
+from command_protocol import CommandFrame, CommandSender, FLAG_ACK_REQUEST, decode_frame, encode_ack, monotonic_ms
+
+# --- 与 tactile.ino 保持一致的配置 ---
+UDP_PORT = 12345
+ANGLE_CENTER = 90
+ANGLE_LEFT = 140
+ANGLE_RIGHT = 40
+SERVO_SPEED_DELAY = 15  # 每移动1度需要的时间（毫秒）
+STALE_PACKET_MS = 300
+REORDER_WINDOW = 64  # 序号比上一个小超过这么多时视为序号重置，而不是网络乱序
+RESYNC_SILENCE_MS = 3000  # 超过这么久没有接受数据包时，下一个数据包重新同步
+RESYNC_REJECTS = 10  # 连续丢弃这么多个数据包后重新同步
+
+COMMAND_ANGLES = {'L': ANGLE_LEFT, 'R': ANGLE_RIGHT, 'C': ANGLE_CENTER, 'S': ANGLE_CENTER,
+                  'D': ANGLE_CENTER}  # 'D': 主机看门狗发出的降级提示
+
+
+def millis():
+    return int(time.monotonic() * 1000)
+
+
+class VirtualServo:
+    """模拟固件中的平滑舵机：每次 update 时若已超过 SERVO_SPEED_DELAY 毫秒则向目标移动1度"""
+
+    def __init__(self):
+        self.target_angle = ANGLE_CENTER
+        self.current_angle = ANGLE_CENTER
+        self.last_update_time = millis()
+
+    def update(self):
+        """返回本次调用是否恰好到达目标角度"""
+        now = millis()
+        if now - self.last_update_time <= SERVO_SPEED_DELAY:
+            return False
+        self.last_update_time = now
+        if self.current_angle < self.target_angle:
+            self.current_angle += 1
+        elif self.current_angle > self.target_angle:
+            self.current_angle -= 1
+        else:
+            return False
+        return self.current_angle == self.target_angle
+
+
+def signed32(value):
+    """32位回绕差值转为有符号整数，与固件中的 (int32_t) 转换相同"""
+    return ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+class FrameFilter:
+    """与固件 acceptFrame 相同的序号 / 过期校验和重新同步"""
+
+    def __init__(self):
+        self.last_seq = None
+        self.last_session = None
+        self.min_clock_offset = None
+        self.last_accept_ms = None
+        self.consecutive_rejects = 0
+        self.duplicates = 0
+        self.stale = 0
+        self.resyncs = 0
+
+    def accept(self, frame, now_ms):
+        if frame.seq is None:
+            return True
+        seq_delta = signed32(frame.seq - self.last_seq) if self.last_seq is not None else 0
+        if self.last_seq is not None and (frame.session != self.last_session
+                                          or signed32(now_ms - self.last_accept_ms) > RESYNC_SILENCE_MS
+                                          or seq_delta < -REORDER_WINDOW
+                                          or self.consecutive_rejects >= RESYNC_REJECTS):
+            # 清除序号和时钟偏差，以本数据包重新开始
+            self.last_seq = self.min_clock_offset = None
+            self.consecutive_rejects = 0
+            self.resyncs += 1
+        if self.last_seq is not None and seq_delta <= 0:
+            self.duplicates += 1
+            self.consecutive_rejects += 1
+            return False
+        offset = (now_ms - frame.timestamp_ms) & 0xFFFFFFFF
+        if self.min_clock_offset is None or signed32(offset - self.min_clock_offset) < 0:
+            self.min_clock_offset = offset
+        age = signed32(offset - self.min_clock_offset)
+        if age > 0:
+            self.min_clock_offset = (self.min_clock_offset + 1) & 0xFFFFFFFF
+        if age > STALE_PACKET_MS:
+            self.stale += 1
+            self.consecutive_rejects += 1
+            return False
+        self.last_seq = frame.seq
+        self.last_session = frame.session
+        self.last_accept_ms = now_ms
+        self.consecutive_rejects = 0
+        return True
+
+
+class Esp32Emulator:
+    def __init__(self, port=UDP_PORT, log_path=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('0.0.0.0', port))
+        self.sock.setblocking(False)
+        self.servo = VirtualServo()
+        self.frame_filter = FrameFilter()
+        self.events = []
+        self.pending = None  # 正在等待舵机到位的指令事件
+        self.arrival_latencies = []  # 采集 -> 指令到达（毫秒）
+        self.actuation_latencies = []  # 采集 -> 舵机到位（毫秒）
+        self.log_path = log_path
+        print(f"ESP32 模拟器已启动，监听 UDP {self.sock.getsockname()[1]}")
+
+    def handle_packet(self, packet, address):
+        now_ms = monotonic_ms()
+        frame = decode_frame(packet)
+        if frame is not None and frame.flags & FLAG_ACK_REQUEST:
+            # 重复 / 过期的帧也应答，主机据此判断链路是否畅通
+            self.sock.sendto(encode_ack(frame.seq), address)
+        if frame is None or not self.frame_filter.accept(frame, now_ms):
+            return
+        target = COMMAND_ANGLES.get(frame.command)
+        if target is None:
+            return
+        if frame.angle is not None:
+            target = max(ANGLE_RIGHT, min(ANGLE_LEFT, frame.angle))
+
+        event = {
+            'arrival_ms': now_ms,
+            'command': frame.command,
+            'seq': frame.seq,
+            'host_timestamp_ms': frame.capture_ms,  # 采集时间，用于端到端延迟
+            'target_angle': target,
+            'start_angle': self.servo.current_angle,
+            'arrival_latency_ms': None,
+            'reached_ms': None,
+            'actuation_latency_ms': None,
+        }
+        if frame.capture_ms is not None:
+            event['arrival_latency_ms'] = (now_ms - frame.capture_ms) & 0xFFFFFFFF
+            self.arrival_latencies.append(event['arrival_latency_ms'])
+        self.events.append(event)
+
+        # 只有改变目标角度的指令才需要等待舵机到位（心跳和重复指令不计）
+        if target != self.servo.target_angle:
+            self.servo.target_angle = target
+            self.pending = event
+            print(f"[{now_ms}] 指令 {frame.command} seq={frame.seq} 目标 {target}° "
+                  f"(采集->到达 {event['arrival_latency_ms']} ms)")
+
+    def on_target_reached(self):
+        if self.pending is None:
+            return
+        now_ms = monotonic_ms()
+        self.pending['reached_ms'] = now_ms
+        if self.pending['host_timestamp_ms'] is not None:
+            latency = (now_ms - self.pending['host_timestamp_ms']) & 0xFFFFFFFF
+            self.pending['actuation_latency_ms'] = latency
+            self.actuation_latencies.append(latency)
+        print(f"[{now_ms}] 舵机到达 {self.servo.current_angle}° (采集->到位 {self.pending['actuation_latency_ms']} ms)")
+        self.pending = None
+
+    def run(self, duration=None):
+        start = time.monotonic()
+        try:
+            while duration is None or time.monotonic() - start < duration:
+                try:
+                    while True:
+                        packet, address = self.sock.recvfrom(255)
+                        self.handle_packet(packet, address)
+                except BlockingIOError:
+                    pass
+                if self.servo.update():
+                    self.on_target_reached()
+                time.sleep(0.0005)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.sock.close()
+            self.report()
+
+    def report(self):
+        print("--- ESP32 模拟器统计 ---")
+        print(f"接收指令 {len(self.events)} 条，丢弃重复/乱序 {self.frame_filter.duplicates} 条，"
+              f"过期 {self.frame_filter.stale} 条，重新同步 {self.frame_filter.resyncs} 次")
+        for label, values in (("采集->指令到达", self.arrival_latencies), ("采集->舵机到位", self.actuation_latencies)):
+            if values:
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                print(f"{label}: {len(values)} 次, p50 {p50:.0f} ms, p95 {p95:.0f} ms, p99 {p99:.0f} ms, "
+                      f"最大 {max(values)} ms")
+        if self.log_path:
+            output_dir = os.path.dirname(self.log_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            with open(self.log_path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(self.events[0].keys()) if self.events else ['arrival_ms'])
+                writer.writeheader()
+                writer.writerows(self.events)
+            print(f"事件日志已保存到 {self.log_path}")
+
+
+def packet(seq, host_shift_ms=0, silence_ms=0, session=1, capture_lag_ms=0):
+    """replay_packets 的一个数据包：主机时钟偏移、发送前的静默、会话号、采集到发送之间的推理耗时（毫秒）"""
+    return seq, host_shift_ms, silence_ms, session, capture_lag_ms
+
+
+def replay_packets(packets, interval_ms=33, latency_ms=20, start_ms=1_000_000):
+    """在虚拟时钟上把 packet() 列表依次送入新的 FrameFilter，返回逐个数据包是否被接受"""
+    frame_filter = FrameFilter()
+    now_ms = start_ms
+    accepted = []
+    for seq, host_shift_ms, silence_ms, session, capture_lag_ms in packets:
+        now_ms += interval_ms + silence_ms
+        sent_ms = now_ms - latency_ms + host_shift_ms
+        frame = CommandFrame('L', seq, sent_ms & 0xFFFFFFFF, None, None, 0, session,
+                             (sent_ms - capture_lag_ms) & 0xFFFFFFFF)
+        accepted.append(frame_filter.accept(frame, now_ms))
+    return accepted
+
+
+def check_resync():
+    """虚拟时钟上的几种情况：主机重启后立即恢复，其他跳变最多丢弃 RESYNC_REJECTS 个数据包，重复 / 乱序仍然被丢弃"""
+    run = [packet(seq) for seq in range(1, 31)]
+    cases = [
+        ("主机重启（新会话，序号 30 -> 1）", run + [packet(seq, session=2) for seq in range(1, 31)], len(run)),
+        ("同一会话内序号重置（30 -> 1）", run + [packet(seq) for seq in range(1, 31)], len(run) + RESYNC_REJECTS),
+        ("同一会话内序号重置（500 -> 1）",
+         [packet(seq) for seq in range(1, 501)] + [packet(seq) for seq in range(1, 31)], 500),
+        ("静默 5 s 后序号重置", run + [packet(1, silence_ms=5000)] + [packet(seq) for seq in range(2, 31)], len(run)),
+        ("主机时钟倒退 10 s", run + [packet(seq, -10000) for seq in range(31, 61)], len(run) + RESYNC_REJECTS),
+        ("主机时钟前跳 10 s", run + [packet(seq, 10000) for seq in range(31, 61)], len(run)),
+        ("推理耗时在 0 ~ 1.2 s 之间波动",
+         run + [packet(seq, capture_lag_ms=(seq * 370) % 1200) for seq in range(31, 61)], len(run)),
+    ]
+    passed = True
+    for name, packets, first_accepted in cases:
+        accepted = replay_packets(packets)
+        # 从 first_accepted 起的数据包必须全部被接受
+        ok = all(accepted[:len(run)]) and all(accepted[first_accepted:])
+        print(f"{'通过' if ok else '失败'}: {name}，重启 / 跳变后第一个被接受的数据包 "
+              f"{next((i for i in range(len(run), len(accepted)) if accepted[i]), None)}")
+        passed &= ok
+    accepted = replay_packets([packet(seq) for seq in (1, 2, 3, 2, 3, 4)])
+    ok = accepted == [True, True, True, False, False, True]
+    print(f"{'通过' if ok else '失败'}: 重复 / 乱序数据包仍被丢弃 {accepted}")
+    return passed and ok
+
+
+def self_check(count=40, interval=0.02):
+    """
+    本机端到端检查：模拟器在后台运行，发送端发送 count 条指令后关闭并重新创建（新会话，序号从 1 开始），
+    重启后的指令应全部被接受
+    """
+    passed = check_resync()
+    emulator = Esp32Emulator(0)
+    port = emulator.sock.getsockname()[1]
+    runner = threading.Thread(target=emulator.run, args=(2 * count * interval + 1.0,), daemon=True)
+    runner.start()
+    script = ['L', 'C', 'R', 'C']
+    counts = []
+    for run in range(2):
+        sender = CommandSender(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), ('127.0.0.1', port))
+        before = len(emulator.events)
+        for index in range(count):
+            sender.send(script[index % len(script)], time.monotonic())
+            time.sleep(interval)
+        time.sleep(0.1)
+        counts.append(len(emulator.events) - before)
+        sender.close()  # 模拟主机重启：新的发送端序号从 1 开始
+    runner.join()
+    ok = counts == [count, count]
+    print(f"{'通过' if ok else '失败'}: 发送端重启前接受 {counts[0]}/{count} 条，重启后接受 {counts[1]}/{count} 条")
+    return passed and ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ESP32 触觉执行器模拟器")
+    parser.add_argument("--port", type=int, default=UDP_PORT, help="监听端口")
+    parser.add_argument("--duration", type=float, default=None, help="运行时长（秒），默认直到 Ctrl+C")
+    parser.add_argument("--log", default=None, help="保存逐条事件的CSV路径")
+    parser.add_argument("--self-check", action="store_true", help="模拟主机重启和时钟跳变，检查指令能再次被接受")
+    args = parser.parse_args()
+
+    if args.self_check:
+        raise SystemExit(0 if self_check() else 1)
+    Esp32Emulator(args.port, args.log).run(args.duration)
@@ -0,0 +1,181 @@
+"""
+运动门控：用户站着不动（例如在路口等待）时画面几乎不变，没有必要每帧都运行 YOLO。
+MotionGate 把每帧缩小到 MOTION_DOWNSCALE_WIDTH 宽的灰度图，与上一次推理时的画面做帧差；
+变化像素的比例不超过 MOTION_AREA_FRACTION 时本帧跳过推理，沿用上一次的检测结果和状态机决策。
+与上一次推理的画面（而不是上一帧）比较，缓慢的累积变化最终也会触发推理；
+距上一次推理超过 MOTION_REFRESH_SECONDS 时无论画面是否变化都强制推理一次，结果不会过期。
+
+对比工具（分别用整帧逐帧推理和运动门控处理录制的片段，比较CPU时间、能耗和逐帧决策）:
+    python motion_gate.py idle=output/idle.mp4 walking=output/walking.mp4
+能耗读取 Linux 的 RAPL 计数器（/sys/class/powercap/intel-rapl:0，整个CPU封装），不可用时只报告CPU时间。
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+
+RAPL_DIR = "/sys/class/powercap/intel-rapl:0"
+
+
+class MotionGate:
+    """帧差预筛选：画面变化足够大或到了强制刷新时间时才需要推理"""
+
+    def __init__(self, width=None, pixel_threshold=None, area_fraction=None, refresh_seconds=None):
+        self.width = width or core.MOTION_DOWNSCALE_WIDTH
+        self.pixel_threshold = core.MOTION_PIXEL_THRESHOLD if pixel_threshold is None else pixel_threshold
+        self.area_fraction = core.MOTION_AREA_FRACTION if area_fraction is None else area_fraction
+        self.refresh_seconds = core.MOTION_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self.reference = None
+        self.reference_time = 0.0
+        self.size = None
+        self.diff = None
+        self.changed = 0.0  # 最近一帧变化像素的比例
+        self.runs = 0
+        self.skips = 0
+        self.refreshes = 0
+
+    def downscale(self, frame):
+        if self.size is None:
+            height, width = frame.shape[:2]
+            self.size = (self.width, max(1, round(height * self.width / width)))
+        # 先缩小再转灰度：INTER_AREA 取平均，同时压低了传感器噪声
+        return cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    def should_run(self, frame, now=None):
+        """now 为采集时间（秒）；返回 True 时调用方应运行推理，本帧随之成为新的参考画面"""
+        now = time.monotonic() if now is None else now
+        small = self.downscale(frame)
+        if self.reference is None:
+            run = True
+        else:
+            self.diff = cv2.absdiff(small, self.reference, dst=self.diff)
+            self.changed = np.count_nonzero(self.diff > self.pixel_threshold) / self.diff.size
+            run = self.changed > self.area_fraction
+            if not run and now - self.reference_time >= self.refresh_seconds:
+                run = True
+                self.refreshes += 1
+        if run:
+            self.reference = small
+            self.reference_time = now
+            self.runs += 1
+        else:
+            self.skips += 1
+        return run
+
+    def summary(self):
+        total = self.runs + self.skips
+        return (f"运动门控: 推理 {self.runs}/{total} 帧（其中强制刷新 {self.refreshes} 帧），"
+                f"跳过 {self.skips} 帧")
+
+
+def read_rapl_energy():
+    """CPU封装累计能耗（焦耳），RAPL 不可用时返回 None"""
+    try:
+        with open(os.path.join(RAPL_DIR, "energy_uj")) as f:
+            return int(f.read()) / 1e6
+    except (OSError, ValueError):
+        return None
+
+
+def rapl_range():
+    try:
+        with open(os.path.join(RAPL_DIR, "max_energy_range_uj")) as f:
+            return int(f.read()) / 1e6
+    except (OSError, ValueError):
+        return None
+
+
+def energy_between(start, end):
+    """两次 read_rapl_energy() 之间的能耗，处理计数器回绕"""
+    if start is None or end is None:
+        return None
+    if end < start:
+        end += rapl_range() or 0.0
+    return end - start
+
+
+def run_clip(model, video_path, gated):
+    """逐帧推理或运动门控处理整段视频，返回 (逐帧指令, 统计字典, MotionGate 或 None)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    left_bound, right_bound = core.compute_bounds(frame_width)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound, verbose=False)
+    class_mask = core.build_class_mask(model.names)
+    store = core.create_detection_store()
+    gate = MotionGate() if gated else None
+    tracking = core.open_tracking(model, cap)
+
+    commands = []
+    command = None
+    frame_index = 0
+    energy_start, cpu_start, wall_start = read_rapl_energy(), time.process_time(), time.perf_counter()
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            # 录像按帧号换算采集时间，强制刷新间隔与实时运行时一致
+            if gate is None or gate.should_run(frame, frame_index / fps):
+                tracks = core.track_frame(model, frame, tracking)[1]
+                command = state_machine.update(core.load_detections(store, tracks, class_mask))
+            commands.append(command)
+            frame_index += 1
+    finally:
+        cap.release()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    stats = {'frames': frame_index, 'cpu_s': cpu, 'wall_s': wall,
+             'energy_j': energy_between(energy_start, read_rapl_energy()),
+             'inferences': gate.runs if gate is not None else frame_index}
+    return commands, stats, gate
+
+
+def describe(label, stats):
+    frames = max(stats['frames'], 1)
+    line = (f"{label:<8}推理 {stats['inferences']:>5}/{stats['frames']:<5} 帧, "
+            f"CPU {stats['cpu_s'] * 1000 / frames:6.1f} ms/帧")
+    if stats['energy_j'] is not None:
+        line += f", 能耗 {stats['energy_j']:.1f} J ({stats['energy_j'] / max(stats['wall_s'], 1e-9):.1f} W)"
+    return line
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="运动门控与逐帧推理的CPU / 能耗对比")
+    parser.add_argument("clips", nargs='+', help="录制的片段，可写成 名称=路径，例如 idle=idle.mp4")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--area-fraction", type=float, default=core.MOTION_AREA_FRACTION, help="触发推理的变化像素比例")
+    parser.add_argument("--refresh", type=float, default=core.MOTION_REFRESH_SECONDS, help="强制推理间隔（秒）")
+    args = parser.parse_args()
+    core.MOTION_AREA_FRACTION, core.MOTION_REFRESH_SECONDS = args.area_fraction, args.refresh
+
+    from roi_inference import first_triggers
+    from ultralytics import YOLO
+
+    if read_rapl_energy() is None:
+        print(f"提示: 无法读取 {RAPL_DIR}（非 Intel/AMD Linux 或没有权限），只比较CPU时间")
+    for spec in args.clips:
+        label, _, path = spec.rpartition('=')
+        label = label or os.path.basename(path)
+        # 每次使用新的模型实例，避免跟踪器状态在两次运行之间共享
+        full_commands, full_stats, _ = run_clip(YOLO(args.model), path, gated=False)
+        gated_commands, gated_stats, gate = run_clip(YOLO(args.model), path, gated=True)
+
+        print(f"\n--- {label} ({path}) ---")
+        print(describe("逐帧", full_stats))
+        print(describe("门控", gated_stats))
+        print(gate.summary())
+        saved = 1 - gated_stats['cpu_s'] / max(full_stats['cpu_s'], 1e-9)
+        line = f"CPU 节省 {saved * 100:.1f}%"
+        if full_stats['energy_j'] and gated_stats['energy_j'] is not None:
+            line += f", 能耗节省 {(1 - gated_stats['energy_j'] / full_stats['energy_j']) * 100:.1f}%"
+        print(line)
+        same = sum(1 for a, b in zip(full_commands, gated_commands) if a == b)
+        print(f"逐帧决策一致 {same}/{len(full_commands)}, 避障触发帧 逐帧 {first_triggers(full_commands)} "
+              f"/ 门控 {first_triggers(gated_commands)}")
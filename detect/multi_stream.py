@@ -0,0 +1,206 @@
+"""
+多路视频流共用一个模型：每路流一个采集线程，只保留最新帧；主循环把各路的最新帧拼成一个批次，
+调用一次 model.predict，再把每路的检测结果交给该路自己的跟踪器（TRACKER，见 trackers.py）、DetectionStore 和状态机。
+模型只加载一次，增加流数占用的是批量推理的剩余吞吐量，而不是再复制一份模型内存。
+
+每路流向 --base-port 起的连续端口发送指令（第 i 路为 base_port + i），可以配合多个 esp32_emulator.py。
+退出时打印每路的处理帧率、丢帧数和采集->决策延迟，并用 Jain 公平性指数衡量各路是否得到均衡的处理
+（按每路“处理帧数 / 采集帧数”计算，1.0 表示完全均衡）。
+
+用法:
+    python multi_stream.py clip1.mp4 clip2.mp4 clip3.mp4 --ip 127.0.0.1 --base-port 12345
+    python multi_stream.py clip1.mp4 clip2.mp4 --mode sequential   # 同一模型逐路推理，作为对比
+"""
+import argparse
+import collections
+import socket
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+from backends import backend_name, load_model, parse_backend
+from command_protocol import CommandSender
+from pipeline import LatestSlot, StageStats, capture_stage, open_source
+from trackers import TRACK_CONF, create_tracker, detections_of
+
+# --- 多路流配置 ---
+MAX_BATCH = 8  # 每次批量推理最多包含的流数，超过时轮流选取
+POLL_INTERVAL = 0.002  # 所有流都没有新帧时的等待间隔（秒）
+STATS_INTERVAL = 5.0  # 运行中打印每路统计的间隔（秒），0 表示只在退出时打印
+LATENCY_WINDOW = 10000  # 每路保留最近多少帧的采集 -> 决策延迟用于统计
+
+
+class Stream:
+    """一路视频流：采集缓冲区、独立的跟踪器、检测结果存储、状态机和指令发送器"""
+
+    def __init__(self, index, source, cap, is_file, class_mask, sender):
+        self.index = index
+        self.source = source
+        self.cap = cap
+        self.is_file = is_file
+        self.class_mask = class_mask
+        self.sender = sender
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        left_bound, right_bound = core.compute_bounds(frame_width)
+        self.state_machine = core.AvoidanceStateMachine(left_bound, right_bound, verbose=False)
+        self.tracker = create_tracker(core.TRACKER, int(cap.get(cv2.CAP_PROP_FPS)) or 30)
+        self.store = core.create_detection_store()
+        self.slot = LatestSlot(f"stream{index}")
+        self.capture_stats = StageStats(f"capture{index}")
+        self.stats = StageStats(f"stream{index}", self.slot)
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.finished = False
+
+    def decide(self, result, frame_shape, capture_time):
+        boxes, confs, clss = detections_of(result)
+        tracks = self.tracker.update(boxes, confs, clss, frame_shape)
+        detections = core.load_detections(self.store, tracks, self.class_mask, timestamp=capture_time)
+        command = self.state_machine.update(detections)
+        self.sender.update(command, capture_time)
+        self.latencies.append(time.monotonic() - capture_time)
+        self.stats.tick()
+        return command
+
+    def share(self):
+        """处理帧数占采集帧数的比例"""
+        return self.stats.count / self.capture_stats.count if self.capture_stats.count else 0.0
+
+    def summary(self):
+        line = (f"流 {self.index} ({self.source}): 采集 {self.capture_stats.count} 帧, 处理 {self.stats.count} 帧 "
+                f"({self.stats.fps():.1f} FPS), 丢弃 {self.slot.drops} 帧")
+        if self.latencies:
+            p50, p95 = np.percentile(self.latencies, [50, 95]) * 1000
+            line += f", 采集->决策 p50 {p50:.0f} ms / p95 {p95:.0f} ms"
+        return line
+
+
+def jain_index(values):
+    """Jain 公平性指数：(Σx)^2 / (n·Σx^2)，全部相等时为 1，只有一路得到处理时为 1/n"""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0 or not values.any():
+        return 0.0
+    return float(values.sum() ** 2 / (len(values) * np.square(values).sum()))
+
+
+def gather(streams, start, max_batch):
+    """从 start 开始轮流取各路的最新帧，最多 max_batch 路；视频结束的流标记为 finished"""
+    batch = []
+    count = len(streams)
+    for offset in range(count):
+        stream = streams[(start + offset) % count]
+        if stream.finished:
+            continue
+        try:
+            packet = stream.slot.get(timeout=0)
+        except EOFError:
+            stream.finished = True
+            continue
+        if packet is not None:
+            batch.append((stream, packet))
+            if len(batch) >= max_batch:
+                break
+    return batch
+
+
+def infer(model, frames, batched, imgsz=None):
+    """batched=True 时一次推理整个批次，否则逐帧推理；返回与 frames 一一对应的结果"""
+    kwargs = {'imgsz': imgsz} if imgsz else {}
+    if batched:
+        return model.predict(frames, conf=TRACK_CONF, verbose=False, **kwargs)
+    return [model.predict(frame, conf=TRACK_CONF, verbose=False, **kwargs)[0] for frame in frames]
+
+
+def print_report(streams, batches, batched_frames, elapsed):
+    for stream in streams:
+        print(stream.summary())
+    processed = sum(stream.stats.count for stream in streams)
+    print(f"合计处理 {processed} 帧, {processed / max(elapsed, 1e-9):.1f} FPS, "
+          f"推理 {batches} 次, 平均批大小 {batched_frames / max(batches, 1):.2f}")
+    print(f"公平性 (Jain, 处理/采集比例): {jain_index([stream.share() for stream in streams]):.3f}, "
+          f"(Jain, FPS): {jain_index([stream.stats.fps() for stream in streams]):.3f}")
+
+
+def run_streams(model, sources, ip=None, base_port=None, batched=True, max_batch=None, imgsz=None):
+    ip = ip or core.ESP32_IP
+    base_port = base_port or core.ESP32_PORT
+    max_batch = max_batch or MAX_BATCH
+    class_mask = core.build_class_mask(model.names)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    streams = []
+    for source in sources:
+        cap, is_file = open_source(source)
+        if cap is None:
+            print(f"错误: 无法打开帧源 {source}，跳过")
+            continue
+        sender = CommandSender(sock, (ip, base_port + len(streams)), core.COMMAND_PROTOCOL, core.HEARTBEAT_INTERVAL)
+        streams.append(Stream(len(streams), source, cap, is_file, class_mask, sender))
+    if not streams:
+        sock.close()
+        return streams
+    print(f"{len(streams)} 路流共用一个模型，{'批量' if batched else '逐路'}推理，指令发往 {ip}:{base_port}..")
+
+    stop_event = core.install_stop_handler()
+    threads = [threading.Thread(target=capture_stage, name=f"capture{stream.index}",
+                                args=(stream.cap, stream.is_file, stream.slot, stream.capture_stats, stop_event),
+                                daemon=True)
+               for stream in streams]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    last_report = start
+    batches = batched_frames = 0
+    turn = 0
+    try:
+        while not stop_event.is_set() and not all(stream.finished for stream in streams):
+            batch = gather(streams, turn, max_batch)
+            turn = (turn + 1) % len(streams)
+            if not batch:
+                time.sleep(POLL_INTERVAL)
+                continue
+            frames = [packet[2] for _, packet in batch]
+            results = infer(model, frames, batched, imgsz)
+            batches += 1
+            batched_frames += len(batch)
+            for (stream, (_, capture_time, frame)), result in zip(batch, results):
+                stream.decide(result, frame.shape, capture_time)
+            if STATS_INTERVAL > 0 and time.perf_counter() - last_report >= STATS_INTERVAL:
+                last_report = time.perf_counter()
+                print_report(streams, batches, batched_frames, last_report - start)
+    finally:
+        elapsed = time.perf_counter() - start
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=2.0)
+        for stream in streams:
+            stream.sender.send('C')
+            stream.cap.release()
+        sock.close()
+        print("--- 多路流运行统计 ---")
+        print_report(streams, batches, batched_frames, elapsed)
+    return streams
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多路视频流共用一个模型的批量推理")
+    parser.add_argument("sources", nargs='+', help="摄像头编号或视频文件路径")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--backend", default='pytorch',
+                        help="推理后端；导出的 onnx / openvino 模型输入固定为 batch=1，只能逐路推理")
+    parser.add_argument("--mode", default='batched', choices=('batched', 'sequential'), help="批量推理或逐路推理")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="每次推理最多包含的流数")
+    parser.add_argument("--imgsz", type=int, default=None, help="推理输入尺寸（默认使用模型的设置）")
+    parser.add_argument("--ip", default=None, help="指令目标IP（默认使用 ESP32_IP）")
+    parser.add_argument("--base-port", type=int, default=None, help="第 0 路的指令端口，之后各路依次加 1")
+    args = parser.parse_args()
+
+    backend, int8 = parse_backend(args.backend)
+    batched = args.mode == 'batched'
+    if batched and backend != 'pytorch':
+        print(f"警告: {backend_name(backend, int8)} 模型以 batch=1 导出，改为逐路推理")
+        batched = False
+    run_streams(load_model(args.model, backend, int8), args.sources, args.ip, args.base_port, batched,
+                args.max_batch, args.imgsz)
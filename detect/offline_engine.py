@@ -0,0 +1,288 @@
+"""
+离线视频处理引擎：后台线程解码，按 N 帧一批调用 model.track；
+长视频可切分为多个片段交给进程池并行处理，片段之间保留重叠帧，
+再按重叠帧上的框匹配把各片段的 ByteTrack ID 拼接成全局一致的 ID，
+最后在拼接后的跟踪结果上串行运行状态机，得到 SEARCHING/AVOIDING 决策序列。
+"""
+import argparse
+import csv
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+
+# --- 离线引擎配置 ---
+BATCH_SIZE = 8  # 每次推理的帧数
+CHUNK_SIZE = 0  # 每个片段的帧数，0 表示不切分（单进程）
+CHUNK_OVERLAP = 30  # 相邻片段之间的重叠帧数，用于跟踪器预热和ID拼接
+NUM_WORKERS = 4  # 进程池大小
+STITCH_IOU_THRESHOLD = 0.5  # 重叠帧上判定为同一目标的最小IoU
+
+
+def decode_worker(video_path, start, end, frame_queue, stop_event):
+    """解码线程：读取 [start, end) 范围内的帧放入有界队列，结束时放入 None"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while (end is None or index < end) and not stop_event.is_set():
+            success, frame = cap.read()
+            if not success:
+                break
+            frame_queue.put(frame)
+            index += 1
+    finally:
+        cap.release()
+        frame_queue.put(None)
+
+
+def iter_batches(frame_queue, batch_size):
+    """从解码队列中按批取帧"""
+    batch = []
+    while True:
+        frame = frame_queue.get()
+        if frame is None:
+            break
+        batch.append(frame)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def track_range(model_path, video_path, start=0, end=None, batch_size=BATCH_SIZE):
+    """
+    在 [start, end) 范围内批量跟踪，返回逐帧的 extract_tracks 结果列表。
+    作为进程池任务使用时，每个进程加载自己的模型和跟踪器。
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    tracking = core.open_tracking(model, frame_rate=core.video_fps(video_path))
+    frame_queue = queue.Queue(maxsize=batch_size * 2)
+    stop_event = threading.Event()
+    decoder = threading.Thread(target=decode_worker, args=(video_path, start, end, frame_queue, stop_event),
+                               daemon=True)
+    decoder.start()
+
+    track_frames = []
+    try:
+        for batch in iter_batches(frame_queue, batch_size):
+            if tracking is not None:
+                track_frames.extend(tracking.track_batch(batch))
+                continue
+            results = model.track(batch, persist=True, tracker="bytetrack.yaml", verbose=False)
+            track_frames.extend(core.extract_tracks(result) for result in results)
+    finally:
+        stop_event.set()
+        # 解码线程可能阻塞在满队列上，清空队列让它退出
+        while decoder.is_alive():
+            try:
+                frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    return track_frames
+
+
+def plan_chunks(total_frames, chunk_size, overlap):
+    """把视频切分为片段，返回 (解码起点, 本片段负责的起点, 终点) 列表"""
+    if chunk_size <= 0 or total_frames <= chunk_size:
+        return [(0, 0, total_frames)]
+    chunks = []
+    for own_start in range(0, total_frames, chunk_size):
+        decode_start = max(0, own_start - overlap)
+        chunks.append((decode_start, own_start, min(own_start + chunk_size, total_frames)))
+    return chunks
+
+
+def box_iou(boxes_a, boxes_b):
+    """计算两组 xyxy 框两两之间的IoU矩阵"""
+    boxes_a = boxes_a.astype(np.float64)
+    boxes_b = boxes_b.astype(np.float64)
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def match_overlap_ids(prev_frames, next_frames):
+    """
+    在重叠帧上按IoU匹配两个片段的检测框，投票得到 新片段局部ID -> 上一片段全局ID 的映射。
+    """
+    votes = {}
+    for prev_tracks, next_tracks in zip(prev_frames, next_frames):
+        if prev_tracks is None or next_tracks is None:
+            continue
+        prev_boxes, prev_ids, _, prev_clss = prev_tracks
+        next_boxes, next_ids, _, next_clss = next_tracks
+        iou = box_iou(next_boxes, prev_boxes)
+        iou[next_clss[:, None] != prev_clss[None, :]] = 0.0
+        for i in range(len(next_ids)):
+            j = int(np.argmax(iou[i])) if iou.shape[1] else -1
+            if j >= 0 and iou[i, j] >= STITCH_IOU_THRESHOLD:
+                key = (int(next_ids[i]), int(prev_ids[j]))
+                votes[key] = votes.get(key, 0) + 1
+
+    # 票数多的配对优先，保证一一对应
+    mapping, used = {}, set()
+    for (local_id, global_id), _ in sorted(votes.items(), key=lambda item: -item[1]):
+        if local_id not in mapping and global_id not in used:
+            mapping[local_id] = global_id
+            used.add(global_id)
+    return mapping
+
+
+def remap_ids(tracks, mapping):
+    if tracks is None:
+        return None
+    boxes, ids, confs, clss = tracks
+    new_ids = np.array([mapping[int(i)] for i in ids], dtype=ids.dtype)
+    return boxes, new_ids, confs, clss
+
+
+def stitch_chunks(chunks, chunk_results):
+    """把各片段的跟踪结果拼接为全局一致ID的逐帧序列（去掉重叠帧）"""
+    stitched = []
+    prev_tail = None  # 上一片段在全局ID下的逐帧结果
+    prev_end = 0
+    next_global_id = 1
+
+    for (decode_start, own_start, end), track_frames in zip(chunks, chunk_results):
+        head = own_start - decode_start
+        mapping = {}
+        if prev_tail is not None and head > 0:
+            overlap_prev = prev_tail[len(prev_tail) - (prev_end - decode_start):]
+            mapping = match_overlap_ids(overlap_prev, track_frames[:head])
+
+        # 未匹配上的局部ID分配新的全局ID
+        local_ids = sorted({int(i) for tracks in track_frames if tracks is not None for i in tracks[1]})
+        for local_id in local_ids:
+            if local_id not in mapping:
+                mapping[local_id] = next_global_id
+                next_global_id += 1
+            else:
+                next_global_id = max(next_global_id, mapping[local_id] + 1)
+
+        remapped = [remap_ids(tracks, mapping) for tracks in track_frames]
+        stitched.extend(remapped[head:])
+        prev_tail = remapped
+        prev_end = end
+    return stitched
+
+
+def track_video(video_path, model_path=None, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE,
+                overlap=CHUNK_OVERLAP, num_workers=NUM_WORKERS):
+    """对整个视频做批量跟踪（可选多进程分片），返回逐帧跟踪结果"""
+    model_path = model_path or core.MODEL_PATH
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    chunks = plan_chunks(total_frames, chunk_size, overlap)
+    if len(chunks) == 1:
+        return track_range(model_path, video_path, 0, None, batch_size)
+
+    print(f"离线引擎: {total_frames} 帧切分为 {len(chunks)} 个片段，使用 {num_workers} 个进程")
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(track_range, model_path, video_path, decode_start, end, batch_size)
+                   for decode_start, _, end in chunks]
+        chunk_results = [future.result() for future in futures]
+    return stitch_chunks(chunks, chunk_results)
+
+
+def track_serial(video_path, model_path=None):
+    """逐帧串行跟踪（与 process_video_file 相同的调用方式），用于校验"""
+    from ultralytics import YOLO
+
+    model = YOLO(model_path or core.MODEL_PATH)
+    cap = cv2.VideoCapture(video_path)
+    tracking = core.open_tracking(model, cap)
+    track_frames = []
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            track_frames.append(core.track_frame(model, frame, tracking)[1])
+    finally:
+        cap.release()
+    return track_frames
+
+
+def compare_decisions(decisions, reference):
+    """比较两个决策序列，返回 (不一致帧数, 第一处不一致的帧号)"""
+    mismatches = [i for i, (a, b) in enumerate(zip(decisions, reference)) if a != b]
+    mismatches += list(range(min(len(decisions), len(reference)), max(len(decisions), len(reference))))
+    return len(mismatches), (mismatches[0] if mismatches else None)
+
+
+def write_decisions_csv(path, decisions):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['frame', 'state', 'command'])
+        for index, (state, command) in enumerate(decisions):
+            writer.writerow([index, state, command])
+
+
+def run_offline(video_path=None, model_path=None, output_csv=None, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE,
+                overlap=CHUNK_OVERLAP, num_workers=NUM_WORKERS, verify=False):
+    """离线处理整个视频，返回逐帧 (状态, 指令) 决策序列"""
+    from ultralytics import YOLO
+
+    video_path = video_path or core.VIDEO_INPUT_PATH
+    model_path = model_path or core.MODEL_PATH
+    cap = cv2.VideoCapture(video_path)
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    cap.release()
+    class_mask = core.build_class_mask(YOLO(model_path).names)
+
+    start_time = time.perf_counter()
+    track_frames = track_video(video_path, model_path, batch_size, chunk_size, overlap, num_workers)
+    decisions = core.run_decisions(track_frames, frame_width, class_mask)
+    elapsed = time.perf_counter() - start_time
+    print(f"离线引擎完成: {len(decisions)} 帧, 用时 {elapsed:.1f} s ({len(decisions) / max(elapsed, 1e-9):.1f} FPS)")
+
+    if output_csv:
+        write_decisions_csv(output_csv, decisions)
+        print(f"决策序列已保存到 {output_csv}")
+
+    if verify:
+        start_time = time.perf_counter()
+        reference = core.run_decisions(track_serial(video_path, model_path), frame_width, class_mask)
+        elapsed = time.perf_counter() - start_time
+        count, first = compare_decisions(decisions, reference)
+        print(f"串行参考: 用时 {elapsed:.1f} s ({len(reference) / max(elapsed, 1e-9):.1f} FPS)")
+        if count:
+            print(f"校验失败: {count} 帧决策与串行结果不一致，首个不一致帧 {first}")
+        else:
+            print("校验通过: 决策序列与串行运行完全一致")
+    return decisions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量 / 多进程离线视频处理")
+    parser.add_argument("video", nargs="?", default=None, help="输入视频（默认 VIDEO_INPUT_PATH）")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="每批推理的帧数")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="每个片段的帧数，0 表示不切分")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help="片段重叠帧数")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="进程池大小")
+    parser.add_argument("--csv", default=None, help="保存逐帧决策的CSV路径")
+    parser.add_argument("--verify", action="store_true", help="额外做一次逐帧串行运行并比较决策序列")
+    args = parser.parse_args()
+
+    run_offline(args.video, args.model, args.csv, args.batch, args.chunk, args.overlap, args.workers, args.verify)
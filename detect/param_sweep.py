@@ -0,0 +1,153 @@
+"""
+避障参数批量扫描：在多个录制结果（detection_log.py record 生成）上，用进程池评估
+CENTER_DEAD_ZONE_PERCENT × MIN_AREA_THRESHOLD × CONFIDENCE_THRESHOLD × AVOIDANCE_DIRECTION × 障碍物类别子集
+的所有组合，不需要重新推理。每组参数报告：
+    - 指令切换次数
+    - 处于 AVOIDING 的总时长
+    - 障碍物进入中央区域到第一条 L/R 指令的延迟（以及直到离开都没有触发的次数）
+用法:
+    python param_sweep.py sessions/walk1 sessions/walk2 --dead-zone 0.3 0.4 0.5 --min-area 4000 8000 \
+        --conf 0.4 0.5 --direction L R --classes person,car,bicycle person --csv sweep.csv
+"""
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import demo_v3 as core
+from detection_log import DetectionSession
+
+_SESSION_CACHE = {}
+
+
+def get_session(path):
+    """每个工作进程只打开一次录制结果"""
+    if path not in _SESSION_CACHE:
+        _SESSION_CACHE[path] = DetectionSession(path)
+    return _SESSION_CACHE[path]
+
+
+def evaluate(session, dead_zone_percent, min_area, conf_threshold, direction, obstacle_classes):
+    """在单个录制结果上评估一组参数"""
+    left_bound, right_bound = core.compute_bounds(session.frame_width, dead_zone_percent)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound, direction, verbose=False)
+    class_mask = core.build_class_mask(session.names, obstacle_classes)
+    timestamps = session.timestamps
+    # 与重放 / 实时运行相同，写入带轨迹历史的 DetectionStore（ttc 模式需要按录制时间估计碰撞时间）
+    store = core.create_detection_store()
+
+    switches = 0
+    avoiding_seconds = 0.0
+    delays = []
+    missed = 0
+    last_command = None
+    entry_time = None  # 当前这次“进入中央区域”的时间，已触发或已离开时为 None
+
+    for index in range(len(session)):
+        tracks = session.tracks(index)
+        boxes, ids, confs, clss = tracks
+        center_x = (boxes[:, 0] + boxes[:, 2]) / 2
+        # 只看置信度和类别（不看面积）判断是否有障碍物进入中央区域
+        occupied = bool(np.any((confs > conf_threshold) & class_mask[clss] & (center_x > left_bound)
+                               & (center_x < right_bound)))
+
+        now = timestamps[index]
+        command = state_machine.update(core.load_detections(store, tracks, class_mask, conf_threshold, min_area, now))
+
+        if occupied and entry_time is None and last_command not in ('L', 'R'):
+            entry_time = now
+        if entry_time is not None:
+            if command in ('L', 'R'):
+                delays.append(now - entry_time)
+                entry_time = None
+            elif not occupied:
+                missed += 1
+                entry_time = None
+
+        if last_command is not None and command != last_command:
+            switches += 1
+        if state_machine.state == core.STATE_AVOIDING and index + 1 < len(session):
+            avoiding_seconds += timestamps[index + 1] - now
+        last_command = command
+
+    if entry_time is not None:
+        missed += 1
+    return switches, avoiding_seconds, delays, missed
+
+
+def run_config(task):
+    """进程池任务：在所有录制结果上评估一组参数并汇总"""
+    session_paths, config = task
+    switches = 0
+    avoiding_seconds = 0.0
+    delays = []
+    missed = 0
+    for path in session_paths:
+        s, a, d, m = evaluate(get_session(path), *config)
+        switches += s
+        avoiding_seconds += a
+        delays.extend(d)
+        missed += m
+    dead_zone_percent, min_area, conf_threshold, direction, obstacle_classes = config
+    return {
+        'dead_zone': dead_zone_percent,
+        'min_area': min_area,
+        'conf': conf_threshold,
+        'direction': direction,
+        'classes': ','.join(obstacle_classes),
+        'command_switches': switches,
+        'avoiding_seconds': round(avoiding_seconds, 3),
+        'triggers': len(delays),
+        'mean_delay_ms': round(float(np.mean(delays)) * 1000, 1) if delays else None,
+        'max_delay_ms': round(float(np.max(delays)) * 1000, 1) if delays else None,
+        'missed_entries': missed,
+    }
+
+
+def build_grid(dead_zones, min_areas, confs, directions, class_subsets):
+    return list(itertools.product(dead_zones, min_areas, confs, directions, class_subsets))
+
+
+def run_sweep(session_paths, grid, num_workers=None):
+    tasks = [(session_paths, config) for config in grid]
+    chunksize = max(1, len(tasks) // ((num_workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(run_config, tasks, chunksize=chunksize))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="避障参数批量扫描")
+    parser.add_argument("sessions", nargs="+", help="录制结果目录")
+    parser.add_argument("--dead-zone", type=float, nargs="+", default=[core.CENTER_DEAD_ZONE_PERCENT])
+    parser.add_argument("--min-area", type=float, nargs="+", default=[core.default_min_area()])
+    parser.add_argument("--conf", type=float, nargs="+", default=[core.CONFIDENCE_THRESHOLD])
+    parser.add_argument("--direction", choices=['L', 'R'], nargs="+", default=[core.AVOIDANCE_DIRECTION])
+    parser.add_argument("--classes", nargs="+", default=[','.join(core.OBSTACLE_CLASSES)],
+                        help="障碍物类别子集，每个子集用逗号分隔")
+    parser.add_argument("--workers", type=int, default=None, help="进程池大小（默认CPU核数）")
+    parser.add_argument("--csv", default=None, help="保存全部结果的CSV路径")
+    parser.add_argument("--top", type=int, default=10, help="打印指令切换最少的前N组参数")
+    args = parser.parse_args()
+
+    class_subsets = [tuple(c.strip() for c in subset.split(',') if c.strip()) for subset in args.classes]
+    grid = build_grid(args.dead_zone, args.min_area, args.conf, args.direction, class_subsets)
+    print(f"参数扫描: {len(grid)} 组参数 × {len(args.sessions)} 个录制结果")
+
+    start_time = time.perf_counter()
+    rows = run_sweep(args.sessions, grid, args.workers)
+    print(f"扫描完成，用时 {time.perf_counter() - start_time:.1f} s")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"结果已保存到 {args.csv}")
+
+    rows.sort(key=lambda row: (row['missed_entries'], row['command_switches'], row['mean_delay_ms'] or 0))
+    for row in rows[:args.top]:
+        print(row)
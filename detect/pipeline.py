@@ -0,0 +1,378 @@
+"""
+多线程流水线模式：采集 / 推理 / 决策+UDP发送 / 渲染 四个阶段分别运行在独立线程上。
+阶段之间用单槽缓冲区（LatestSlot）连接：下游来不及处理时直接丢弃旧帧、只保留最新的一帧，
+因此推理总是处理最新画面，渲染再慢也不会拖住指令发送。
+推理阶段与摄像头模式使用相同的跟踪路径（TRACKER / ROI_INFERENCE / ADAPTIVE_INFERENCE / MOTION_GATING），
+渲染阶段只使用决策阶段随画面一起传来的状态副本。
+"""
+import argparse
+import threading
+import time
+
+import cv2
+
+import demo_v3 as core
+from backends import backend_name, load_model, parse_backend
+from capture import CameraCapture
+
+# --- 流水线配置 ---
+STATS_INTERVAL = 5.0  # 运行中打印各阶段吞吐量的间隔（秒），0 表示只在退出时打印
+
+
+class LatestSlot:
+    """单槽缓冲区：put 覆盖尚未被取走的旧数据并计为一次丢弃，get 取走最新数据"""
+
+    def __init__(self, name):
+        self.name = name
+        self.drops = 0
+        self._item = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.drops += 1
+            self._item = item
+            self._cond.notify()
+
+    def get(self, timeout=0.1):
+        """取走最新数据；超时返回 None，缓冲区关闭且为空时抛出 EOFError"""
+        with self._cond:
+            if self._item is None and not self._closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            if item is None and self._closed:
+                raise EOFError(self.name)
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """记录单个阶段处理的帧数，用于计算吞吐量"""
+
+    def __init__(self, name, input_slot=None):
+        self.name = name
+        self.input_slot = input_slot
+        self.count = 0
+        self.start_time = time.perf_counter()
+
+    def tick(self):
+        self.count += 1
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.start_time
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        drops = self.input_slot.drops if self.input_slot is not None else 0
+        return f"{self.name:<10} 处理 {self.count:>6} 帧, {self.fps():6.1f} FPS, 输入丢弃 {drops:>6} 帧"
+
+
+def open_source(source):
+    """打开帧源：整数为摄像头编号，否则视为视频文件；摄像头不可用时回退到 VIDEO_INPUT_PATH"""
+    if isinstance(source, int) or str(source).isdigit():
+        cap = CameraCapture(source)
+        if cap.isOpened():
+            print(f"流水线: 使用摄像头 {source}")
+            return cap, False
+        cap.release()
+        print(f"警告: 无法打开摄像头 {source}，回退到视频文件 {core.VIDEO_INPUT_PATH}")
+        source = core.VIDEO_INPUT_PATH
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        return None, True
+    print(f"流水线: 使用视频文件 {source}")
+    return cap, True
+
+
+def capture_stage(cap, is_file, out_slot, stats, stop_event):
+    """采集阶段：持续读取最新帧；视频文件按原始帧率播放，模拟实时摄像头"""
+    frame_interval = 0.0
+    if is_file:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_interval = 1.0 / fps if fps > 0 else 0.0
+    start_time = time.perf_counter()
+    frame_index = 0
+    if isinstance(cap, CameraCapture):
+        cap.stop_event = stop_event  # 摄像头没有新帧时 read() 也能按停止事件返回
+
+    try:
+        while not stop_event.is_set():
+            success, frame = cap.read()
+            if not success:
+                break
+            # 摄像头（capture.py）带有每帧的采集时间
+            capture_time = getattr(cap, 'capture_time', None) or time.monotonic()
+            out_slot.put((frame_index, capture_time, frame))
+            stats.tick()
+            frame_index += 1
+
+            if frame_interval:
+                delay = start_time + frame_index * frame_interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    finally:
+        out_slot.close()
+
+
+class FrameTracker:
+    """推理阶段的跟踪路径，与摄像头模式相同：TRACKER / ROI_INFERENCE / ADAPTIVE_INFERENCE / MOTION_GATING"""
+
+    def __init__(self, model, cap, class_mask, left_bound, right_bound):
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.model = model
+        self.class_mask = class_mask
+        self.frame_size = (frame_width, frame_height)
+        self.tracking = core.open_tracking(model, cap)
+        self.scheduler = self.propagator = self.roi_inference = self.gate = None
+        if core.ADAPTIVE_INFERENCE:
+            from adaptive_inference import AdaptiveScheduler, TrackPropagator
+            self.scheduler = AdaptiveScheduler(left_bound, right_bound, frame_width, core.SEARCH_INFERENCE_INTERVAL,
+                                               core.NEAR_CORRIDOR_MARGIN)
+            self.propagator = TrackPropagator()
+        if core.ROI_INFERENCE:
+            from roi_inference import RoiInference
+            self.roi_inference = RoiInference(model, frame_width, frame_height, left_bound, right_bound, class_mask,
+                                              frame_rate=int(cap.get(cv2.CAP_PROP_FPS)) or 30)
+        if core.MOTION_GATING:
+            from motion_gate import MotionGate
+            self.gate = MotionGate()
+        self.tracks = None
+
+    def track(self, frame, frame_index, capture_time, state):
+        """
+        返回 (result, tracks, static)。static 为 True 时画面几乎不变，决策阶段沿用上一次的决策；
+        state 为决策线程最近一次的状态（ROI / 自适应推理据此选择推理方式，可能落后一帧）
+        """
+        if self.gate is not None and not self.gate.should_run(frame, capture_time):
+            return None, self.tracks, True
+        predicted = self.propagator.predict(frame_index) if self.scheduler is not None else None
+        if self.scheduler is None or self.scheduler.should_run(state, predicted, self.class_mask):
+            if self.roi_inference is not None:
+                result, tracks = None, self.roi_inference.track(frame, state)
+            else:
+                result, tracks = core.track_frame(self.model, frame, self.tracking)
+            if self.propagator is not None:
+                self.propagator.update(tracks, frame_index, self.frame_size)
+        else:
+            # 跳过推理：使用外推的跟踪框
+            result, tracks = None, predicted
+        self.tracks = tracks
+        return result, tracks, False
+
+    def summaries(self):
+        lines = []
+        if self.scheduler is not None:
+            lines.append(f"自适应推理: 运行 {self.scheduler.runs} 帧, 跳过 {self.scheduler.skips} 帧")
+        if self.roi_inference is not None:
+            lines.append(self.roi_inference.summary())
+        if self.gate is not None:
+            lines.append(self.gate.summary())
+        return lines
+
+
+def inference_stage(tracker, state_machine, in_slot, out_slot, stats, stop_event, deadline=None, watchdog=None):
+    """推理阶段：对最新帧执行跟踪，并在本线程完成张量到 numpy 的转换；帧龄超过预算的帧直接丢弃"""
+    try:
+        while not stop_event.is_set():
+            packet = in_slot.get()
+            if packet is None:
+                continue
+            frame_index, capture_time, frame = packet
+            if deadline is not None and not deadline.admit(capture_time):
+                continue
+            if watchdog is not None:
+                watchdog.begin_inference()
+            result, tracks, static = tracker.track(frame, frame_index, capture_time, state_machine.state)
+            if watchdog is not None:
+                watchdog.end_inference()
+            out_slot.put((frame_index, capture_time, frame, result, tracks, static))
+            stats.tick()
+    except EOFError:
+        pass
+    finally:
+        out_slot.close()
+
+
+def decision_stage(state_machine, store, class_mask, sender, in_slot, out_slot, stats, stop_event, deadline=None,
+                   watchdog=None):
+    """
+    决策阶段：筛选写入 DetectionStore（本线程独占，轨迹历史按采集时间记录，ttc 触发可用），推进状态机并发送
+    UDP指令（决策变化立即发送），不等待渲染；画面静止的帧沿用上一次的决策
+    """
+    command = None
+    detections = core.EMPTY_BATCH
+    try:
+        while not stop_event.is_set():
+            packet = in_slot.get()
+            if packet is None:
+                continue
+            frame_index, capture_time, frame, result, tracks, static = packet
+            if not static or command is None:
+                detections = core.load_detections(store, tracks, class_mask, timestamp=capture_time)
+                command = state_machine.update(detections)
+            if watchdog is not None:
+                watchdog.decide(command, capture_time)
+            else:
+                sender.update(command, capture_time)
+            if deadline is not None:
+                deadline.complete(capture_time)
+
+            if out_slot is not None:
+                # 渲染线程只使用本帧的状态和检测结果副本，不读取决策线程正在修改的状态机和存储
+                boxes = core.DetectionBatch(detections.ids.copy(), detections.boxes.copy(), detections.areas.copy(),
+                                            detections.center_x.copy())
+                out_slot.put((frame, result, state_machine.snapshot(), command, boxes))
+            stats.tick()
+    except EOFError:
+        pass
+    finally:
+        if out_slot is not None:
+            out_slot.close()
+
+
+def render_stage(in_slot, stats, stop_event):
+    """渲染阶段：在主线程中绘制并显示，按 'q' 退出"""
+    try:
+        while not stop_event.is_set():
+            packet = in_slot.get()
+            if packet is None:
+                continue
+            frame, result, snapshot, command, detections = packet
+            annotated_frame = core.draw_overlay(frame, result, snapshot, command, detections)
+            cv2.imshow("YOLOv8 Pipelined Obstacle Avoidance", annotated_frame)
+            stats.tick()
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    except EOFError:
+        pass
+    finally:
+        stop_event.set()
+        cv2.destroyAllWindows()
+
+
+def print_stats(all_stats):
+    for stats in all_stats:
+        print(stats.summary())
+
+
+def run_pipeline(model, source=None, headless=None):
+    """
+    启动四阶段流水线，直到视频结束或按下 'q'。
+    headless=True 时不启动渲染阶段，通过 SIGINT / SIGTERM 退出。
+    """
+    if headless is None:
+        headless = core.HEADLESS
+    if source is None:
+        source = core.CAMERA_INDEX
+    cap, is_file = open_source(source)
+    if cap is None:
+        print(f"错误: 无法打开帧源 {source}")
+        return
+
+    sender = core.open_sender()
+    deadline = watchdog = None
+    if core.DEADLINE_SCHEDULING:
+        from deadline import DeadlineScheduler
+        deadline = DeadlineScheduler()
+    if core.DECISION_WATCHDOG:
+        from deadline import DecisionWatchdog
+        watchdog = DecisionWatchdog(sender)
+
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    left_bound, right_bound = core.compute_bounds(frame_width)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound)
+    class_mask = core.build_class_mask(model.names)
+    tracker = FrameTracker(model, cap, class_mask, left_bound, right_bound)
+    store = core.create_detection_store()
+
+    frame_slot = LatestSlot("frame")
+    result_slot = LatestSlot("result")
+    render_slot = None if headless else LatestSlot("render")
+    capture_stats = StageStats("capture")
+    inference_stats = StageStats("inference", frame_slot)
+    decision_stats = StageStats("decision", result_slot)
+    all_stats = [capture_stats, inference_stats, decision_stats]
+    if not headless:
+        render_stats = StageStats("render", render_slot)
+        all_stats.append(render_stats)
+    stop_event = core.install_stop_handler() if headless else threading.Event()
+
+    threads = [
+        threading.Thread(target=capture_stage, name="capture",
+                         args=(cap, is_file, frame_slot, capture_stats, stop_event), daemon=True),
+        threading.Thread(target=inference_stage, name="inference",
+                         args=(tracker, state_machine, frame_slot, result_slot, inference_stats, stop_event,
+                               deadline, watchdog),
+                         daemon=True),
+        threading.Thread(target=decision_stage, name="decision",
+                         args=(state_machine, store, class_mask, sender, result_slot, render_slot, decision_stats,
+                               stop_event, deadline, watchdog),
+                         daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    if watchdog is not None:
+        watchdog.start()
+
+    def report_periodically():
+        while not stop_event.wait(STATS_INTERVAL):
+            print_stats(all_stats)
+
+    if STATS_INTERVAL > 0:
+        threading.Thread(target=report_periodically, name="stats", daemon=True).start()
+
+    try:
+        if headless:
+            # 决策线程在视频结束或收到信号后退出
+            while threads[-1].is_alive() and not stop_event.is_set():
+                threads[-1].join(timeout=0.2)
+        else:
+            render_stage(render_slot, render_stats, stop_event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=2.0)
+        if watchdog is not None:
+            watchdog.stop()
+        sender.send('C')
+        cap.release()
+        sender.close()
+        print("--- 流水线运行统计 ---")
+        print_stats(all_stats)
+        print(sender.summary())
+        for line in tracker.summaries():
+            print(line)
+        if deadline is not None:
+            print(deadline.summary())
+        if watchdog is not None:
+            print(watchdog.summary())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多线程避障流水线")
+    parser.add_argument("--source", default=None, help="摄像头编号或视频文件路径（默认使用 CAMERA_INDEX）")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--backend", default=None, help="推理后端，如 pytorch / onnx / onnx-int8 / openvino（默认使用 INFERENCE_BACKEND）")
+    parser.add_argument("--headless", action="store_true", help="无界面模式：不启动渲染阶段")
+    parser.add_argument("--ip", default=None, help="覆盖 ESP32_IP（例如 127.0.0.1 配合 esp32_emulator.py）")
+    args = parser.parse_args()
+    if args.ip:
+        core.ESP32_IP = args.ip
+
+    if args.backend:
+        backend, int8 = parse_backend(args.backend)
+    else:
+        backend, int8 = core.INFERENCE_BACKEND, core.BACKEND_INT8
+    yolo_model = load_model(args.model, backend, int8)
+    print(f"YOLOv8 模型加载成功 (后端: {backend_name(backend, int8)}).")
+    run_pipeline(yolo_model, args.source, headless=args.headless or core.HEADLESS)
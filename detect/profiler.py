@@ -0,0 +1,259 @@
+"""
+帧循环采样分析：后台线程按 PROFILE_RATE_HZ 通过 sys._current_frames() 读取主循环线程的调用栈，不修改被测代码，
+可以看出时间花在预处理、NMS、跟踪、.cpu().numpy()、plot() 还是 demo_v3.py 自己的代码上。
+只能看到 Python 层的函数：cap.read()、torch 算子等 C 扩展内部的耗时计入调用它的 Python 函数的自身时间。
+
+PROFILE_MODE:
+- 'window': 从启动起采样 PROFILE_WINDOW_SECONDS 秒后停止并导出
+- 'slow':   持续采样，只保留最近 PROFILE_LOOKBACK_SECONDS 秒；某帧耗时超过 PROFILE_SLOW_FRAME_MS 时导出该帧期间的样本
+            （最多 PROFILE_MAX_CAPTURES 次），退出时再导出所有慢帧样本的合计，偶发的慢帧也能抓到
+
+每次导出写出三个文件（PROFILE_DIR 下）:
+- .collapsed.txt:   collapsed stack（每行 "根;...;叶 次数"），flamegraph.pl 和 https://www.speedscope.app 都能直接打开
+- .speedscope.json: speedscope 的 sampled 格式
+- .summary.txt:     按函数汇总的自身 / 累计样本占比
+
+用法:
+    TN_PROFILE=slow python demo_v3.py
+    python profiler.py clip.mp4 --mode window --seconds 20 --rate 500    # 在视频模式（无界面）上采样
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+import demo_v3 as core
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SUMMARY_TOP = 40  # 汇总文件中列出的函数数量
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+def short_path(filename):
+    """site-packages 之后的部分、本目录下的相对路径，其他情况只保留文件名"""
+    normalized = filename.replace(os.sep, '/')
+    marker = normalized.rfind('site-packages/')
+    if marker >= 0:
+        return normalized[marker + len('site-packages/'):]
+    if os.path.abspath(filename).startswith(BASE_DIR + os.sep):
+        return os.path.relpath(filename, BASE_DIR).replace(os.sep, '/')
+    return os.path.basename(filename)
+
+
+def frame_name(code):
+    name = getattr(code, 'co_qualname', code.co_name)  # Python 3.11+ 带类名
+    return f"{name} ({short_path(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+class StackProfile:
+    """按调用栈（code 对象元组，根在前）累计的样本数"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = collections.Counter()
+
+    def add(self, stacks):
+        self.counts.update(stacks)
+
+    @property
+    def samples(self):
+        return sum(self.counts.values())
+
+    def collapsed(self):
+        return ''.join(f"{';'.join(frame_name(code) for code in stack)} {count}\n"
+                       for stack, count in self.counts.most_common())
+
+    def speedscope(self, name):
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.counts.most_common():
+            row = []
+            for code in stack:
+                if code not in index:
+                    index[code] = len(frames)
+                    frames.append({'name': getattr(code, 'co_qualname', code.co_name),
+                                   'file': short_path(code.co_filename), 'line': code.co_firstlineno})
+                row.append(index[code])
+            samples.append(row)
+            weights.append(count * self.interval)
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'profiler.py',
+            'shared': {'frames': frames},
+            'profiles': [{'type': 'sampled', 'name': name, 'unit': 'seconds', 'startValue': 0,
+                          'endValue': sum(weights), 'samples': samples, 'weights': weights}],
+        }
+
+    def functions(self):
+        """[(函数名, 自身样本数, 累计样本数)]，按累计样本数降序"""
+        self_counts, total_counts = collections.Counter(), collections.Counter()
+        for stack, count in self.counts.items():
+            if stack:
+                self_counts[stack[-1]] += count
+            for code in set(stack):  # 递归调用只计一次
+                total_counts[code] += count
+        return [(frame_name(code), self_counts[code], total) for code, total in total_counts.most_common()]
+
+    def summary(self, top=SUMMARY_TOP):
+        samples = max(self.samples, 1)
+        lines = [f"{self.samples} 个样本, 采样间隔 {self.interval * 1000:.1f} ms",
+                 f"{'自身%':>7}{'累计%':>8}  函数"]
+        for name, own, total in self.functions()[:top]:
+            lines.append(f"{own / samples * 100:>7.1f}{total / samples * 100:>8.1f}  {name}")
+        return '\n'.join(lines)
+
+    def save(self, directory, label):
+        """写出 collapsed / speedscope / 汇总三个文件，返回文件名前缀"""
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}")
+        with open(prefix + ".collapsed.txt", 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        with open(prefix + ".speedscope.json", 'w', encoding='utf-8') as f:
+            json.dump(self.speedscope(label), f, ensure_ascii=False)
+        with open(prefix + ".summary.txt", 'w', encoding='utf-8') as f:
+            f.write(self.summary() + '\n')
+        return prefix
+
+
+class SamplingProfiler:
+    """采样 thread_id 线程（默认为创建者所在的线程，即帧循环）的调用栈"""
+
+    def __init__(self, mode=None, rate_hz=None, thread_id=None, directory=None):
+        self.mode = mode or core.PROFILE_MODE
+        self.rate_hz = rate_hz or core.PROFILE_RATE_HZ
+        self.interval = 1.0 / self.rate_hz
+        self.thread_id = thread_id or threading.get_ident()
+        self.directory = directory or core.PROFILE_DIR
+        self.slow_seconds = core.PROFILE_SLOW_FRAME_MS / 1000.0
+        lookback = int(core.PROFILE_LOOKBACK_SECONDS * self.rate_hz)
+        # slow 模式只保留最近的样本；window 模式保存窗口内的全部样本
+        self.recent = collections.deque(maxlen=lookback if self.mode == 'slow' else None)
+        self.window_end = None
+        self.slow_frames = 0
+        self.captures = 0
+        self.slow_profile = StackProfile(self.interval)
+        self.sampling_cpu_seconds = 0.0
+        self.start_time = time.monotonic()
+        self.saved = []
+        self._pending = collections.deque()  # 等待后台线程导出的 (标签, 样本)
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self.start_time = time.monotonic()
+        if self.mode == 'window':
+            self.window_end = self.start_time + core.PROFILE_WINDOW_SECONDS
+        self.thread.start()
+        print(f"采样分析已开启: 模式 {self.mode}, {self.rate_hz} Hz, 输出目录 {self.directory}")
+        return self
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if self.window_end is not None and now >= self.window_end:
+                self._export('window', list(self.recent))
+                self.recent.clear()
+                self.window_end = None
+                break
+            stack = self._sample()
+            if stack:
+                self.recent.append((now, stack))
+            while self._pending:
+                self._export(*self._pending.popleft())
+            self.sampling_cpu_seconds = time.thread_time() - cpu_start
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()  # 跟不上时不补采
+        self.sampling_cpu_seconds = time.thread_time() - cpu_start
+
+    def _export(self, label, samples):
+        if not samples:
+            return
+        profile = StackProfile(self.interval)
+        profile.add(stack for _, stack in samples)
+        prefix = profile.save(self.directory, label)
+        self.saved.append(prefix)
+        print(f"采样分析: {label} {profile.samples} 个样本已保存到 {prefix}.*")
+
+    def frame_done(self, frame_start):
+        """帧循环每帧结束时调用；frame_start 为该帧开始的 time.monotonic()"""
+        if self.mode != 'slow':
+            return
+        now = time.monotonic()
+        if now - frame_start < self.slow_seconds:
+            return
+        self.slow_frames += 1
+        samples = [item for item in list(self.recent) if item[0] >= frame_start]
+        self.slow_profile.add(stack for _, stack in samples)
+        if self.captures < core.PROFILE_MAX_CAPTURES:
+            self.captures += 1
+            self._pending.append((f"slow{self.captures}-{(now - frame_start) * 1000:.0f}ms", samples))
+
+    def stop(self):
+        self._stop.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=5.0)
+        while self._pending:
+            self._export(*self._pending.popleft())
+        if self.window_end is not None:
+            self._export('window', list(self.recent))  # 窗口结束前程序已退出
+        if self.slow_profile.samples:
+            prefix = self.slow_profile.save(self.directory, 'slow-all')
+            self.saved.append(prefix)
+            print(f"采样分析: {self.slow_frames} 个慢帧的合计已保存到 {prefix}.*")
+            print('\n'.join(self.slow_profile.summary().splitlines()[:12]))
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        text = (f"采样分析: 模式 {self.mode}, 导出 {len(self.saved)} 次, "
+                f"采样线程 CPU {self.sampling_cpu_seconds / elapsed * 100:.2f}%")
+        if self.mode == 'slow':
+            text += f", 超过 {core.PROFILE_SLOW_FRAME_MS} ms 的帧 {self.slow_frames} 个"
+        return text
+
+
+def open_profiler():
+    """PROFILE_MODE 为 'window' / 'slow' 时在当前线程（帧循环）上启动采样"""
+    if core.PROFILE_MODE not in ('window', 'slow'):
+        if core.PROFILE_MODE:
+            print(f"警告: 未知的 PROFILE_MODE '{core.PROFILE_MODE}'，采样分析未开启")
+        return None
+    return SamplingProfiler().start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在视频模式（无界面）上对帧循环进行采样分析")
+    parser.add_argument("video", help="视频文件")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--mode", choices=['window', 'slow'], default='window', help="PROFILE_MODE")
+    parser.add_argument("--rate", type=int, default=core.PROFILE_RATE_HZ, help="采样频率（Hz）")
+    parser.add_argument("--seconds", type=float, default=core.PROFILE_WINDOW_SECONDS, help="window 模式的采样时长")
+    parser.add_argument("--slow-ms", type=float, default=core.PROFILE_SLOW_FRAME_MS, help="slow 模式的慢帧阈值")
+    args = parser.parse_args()
+    core.PROFILE_MODE = args.mode
+    core.PROFILE_RATE_HZ = args.rate
+    core.PROFILE_WINDOW_SECONDS = args.seconds
+    core.PROFILE_SLOW_FRAME_MS = args.slow_ms
+
+    from backends import load_model
+
+    yolo_model = load_model(args.model, core.INFERENCE_BACKEND, core.BACKEND_INT8)
+    core.process_video_file(yolo_model, args.video, headless=True)
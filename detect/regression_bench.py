@@ -0,0 +1,249 @@
+"""
+回归基准：在固定的素材上重放完整的决策流程，把逐帧 SEARCHING/AVOIDING 状态和 L/R/C 指令与黄金轨迹比较，
+并检查吞吐量是否低于本机记录的下限。性能优化不应该悄悄改变避障行为，也不应该让速度倒退。
+
+素材:
+- 视频文件: 逐帧 model.track -> extract_tracks -> 筛选 -> 状态机（与 process_video_file 相同）
+- 图片目录（默认 datasets/demo）: 每张图片重复 IMAGE_REPEATS 帧，作为一段静止的短片
+- 检测结果录制目录（detection_log.py record 的输出）: 不经过模型，只重放筛选和状态机
+
+仓库中的 regression/golden.json 保存轨迹、生成时的模型哈希和决策参数，regression/sessions/ 下是随仓库提交的录制结果
+（walk_synthetic 为脚本生成的一段行人 / 自行车接近的检测结果），没有模型权重时也能检查决策是否改变；
+需要模型的素材在找不到权重时跳过。FPS 下限（实测 FPS x FPS_FLOOR_RATIO）只与本机有关，保存在不提交的
+regression/fps_floors.json 中。模型权重或决策参数与黄金文件不同时会给出提示，因为此时轨迹变化是预期的。
+
+用法:
+    python regression_bench.py                                # 检查黄金文件中的全部素材，失败时退出码为 1
+    python regression_bench.py --update                       # 生成 / 更新黄金轨迹和本机 FPS 下限
+    python regression_bench.py clip.mp4 sessions/walk1 --update
+    python regression_bench.py --backend onnx-int8            # 检查换用量化模型后决策是否改变
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+
+import demo_v3 as core
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(BASE_DIR, "regression", "golden.json")
+FPS_FLOORS_NAME = "fps_floors.json"  # 与黄金文件同目录，按机器记录，不提交
+SESSIONS_DIR = os.path.join(BASE_DIR, "regression", "sessions")
+DEFAULT_SOURCES = [os.path.join(BASE_DIR, "datasets", "demo")] + sorted(glob.glob(os.path.join(SESSIONS_DIR, '*')))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+IMAGE_REPEATS = 10  # 每张图片作为静止画面重复的帧数
+FPS_FLOOR_RATIO = 0.8  # --update 时记录的下限为实测 FPS 的 80%
+FPS_REPEATS = 3  # 测量吞吐量时重复运行的次数，取最快的一次
+STATE_CODES = {core.STATE_SEARCHING: 'S', core.STATE_AVOIDING: 'A'}
+
+
+def machine_id():
+    return f"{platform.node()}|{platform.processor() or platform.machine()}|{os.cpu_count()}"
+
+
+def decision_config():
+    """影响决策结果的配置，与黄金文件一起保存"""
+    return {name: getattr(core, name) for name in ('CENTER_DEAD_ZONE_PERCENT', 'MIN_AREA_THRESHOLD',
+                                                   'CONFIDENCE_THRESHOLD', 'AVOIDANCE_DIRECTION',
+                                                   'OBSTACLE_CLASSES', 'TRIGGER_MODE', 'TTC_THRESHOLD_SECONDS',
+                                                   'TTC_WINDOW', 'TTC_MIN_AREA', 'TTC_CLOSE_AREA', 'TRACKER')}
+
+
+def source_kind(path):
+    if os.path.isdir(path):
+        return 'session' if os.path.exists(os.path.join(path, "meta.json")) else 'images'
+    return 'video'
+
+
+def iter_frames(path, kind):
+    """依次返回素材的每一帧画面"""
+    if kind == 'images':
+        for image_path in sorted(p for p in glob.glob(os.path.join(path, '*')) if p.lower().endswith(IMAGE_EXTENSIONS)):
+            image = cv2.imread(image_path)
+            for _ in range(IMAGE_REPEATS):
+                yield image
+        return
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {path}")
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def encode_trace(decisions):
+    """逐帧 (状态, 指令) -> 每帧两个字符的字符串，例如 'SCSCALAL...'"""
+    return ''.join(STATE_CODES[state] + command for state, command in decisions)
+
+
+def run_source(path, kind, load_model):
+    """运行一次决策流程，返回 (轨迹字符串, 帧数, 耗时秒)"""
+    if kind == 'session':
+        from detection_log import DetectionSession, replay_session
+
+        session = DetectionSession(path)
+        start = time.perf_counter()
+        decisions = replay_session(session)
+        return encode_trace(decisions), len(decisions), time.perf_counter() - start
+
+    # 图片之间互不相关，每张图片（以及每段视频）使用新的模型实例，跟踪器从头开始
+    frames = list(iter_frames(path, kind))
+    if not frames:
+        raise IOError(f"{path} 中没有可用的画面")
+    model = load_model()
+    class_mask = core.build_class_mask(model.names)
+    frame_width = frames[0].shape[1]
+    start = time.perf_counter()
+    if kind == 'images':
+        decisions = []
+        for index in range(0, len(frames), IMAGE_REPEATS):
+            if index:
+                model = load_model()
+            tracking = core.open_tracking(model)
+            tracks = (core.track_frame(model, frame, tracking)[1] for frame in frames[index:index + IMAGE_REPEATS])
+            decisions += core.run_decisions(tracks, frames[index].shape[1], class_mask)
+    else:
+        tracking = core.open_tracking(model, frame_rate=core.video_fps(path))
+        tracks = (core.track_frame(model, frame, tracking)[1] for frame in frames)
+        decisions = core.run_decisions(tracks, frame_width, class_mask)
+    return encode_trace(decisions), len(decisions), time.perf_counter() - start
+
+
+def measure(path, kind, load_model, repeats):
+    """运行 repeats 次，检查轨迹是否每次都相同，返回 (轨迹, 帧数, 最快一次的FPS, 是否确定)"""
+    traces = []
+    best = float('inf')
+    frames = 0
+    for _ in range(repeats):
+        trace, frames, elapsed = run_source(path, kind, load_model)
+        traces.append(trace)
+        best = min(best, elapsed)
+    return traces[0], frames, frames / best if best > 0 else 0.0, len(set(traces)) == 1
+
+
+def first_difference(trace, golden):
+    for index in range(0, min(len(trace), len(golden)), 2):
+        if trace[index:index + 2] != golden[index:index + 2]:
+            return index // 2
+    return min(len(trace), len(golden)) // 2 if len(trace) != len(golden) else None
+
+
+def source_name(path):
+    return os.path.relpath(os.path.abspath(path), BASE_DIR).replace(os.sep, '/')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="决策轨迹与吞吐量回归基准")
+    parser.add_argument("sources", nargs='*',
+                        help="视频文件、图片目录或检测结果录制目录（默认黄金文件中的全部素材；--update 时另加 datasets/demo "
+                             "和 regression/sessions/）")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--backend", default=None, help="推理后端，如 onnx / openvino-int8（默认使用 INFERENCE_BACKEND）")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="黄金文件路径")
+    parser.add_argument("--update", action="store_true", help="用本次结果更新黄金轨迹和本机的 FPS 下限")
+    parser.add_argument("--repeats", type=int, default=FPS_REPEATS, help="每个素材运行的次数")
+    parser.add_argument("--no-fps", action="store_true", help="只比较轨迹，不检查吞吐量")
+    args = parser.parse_args()
+
+    from backends import load_model as load_backend_model, parse_backend, weights_hash
+
+    backend, int8 = parse_backend(args.backend) if args.backend else (None, None)
+    golden = {'sources': {}}
+    if os.path.exists(args.golden):
+        with open(args.golden, encoding='utf-8') as f:
+            golden = json.load(f)
+    elif not args.update:
+        print(f"错误: 没有找到黄金文件 {args.golden}，请先运行 --update 生成")
+        sys.exit(1)
+    floors_path = os.path.join(os.path.dirname(os.path.abspath(args.golden)), FPS_FLOORS_NAME)
+    all_floors = golden.get('fps_floors', {})
+    if os.path.exists(floors_path):
+        with open(floors_path, encoding='utf-8') as f:
+            all_floors = json.load(f)
+
+    golden_sources = [os.path.join(BASE_DIR, name) for name in golden['sources']]
+    if args.sources:
+        sources = args.sources
+    elif args.update:
+        sources = DEFAULT_SOURCES + [path for path in golden_sources if path not in DEFAULT_SOURCES]
+    else:
+        sources = golden_sources
+    has_weights = os.path.exists(args.model)
+    needs_model = [path for path in sources if source_kind(path) != 'session']
+    model_hash = weights_hash(args.model) if has_weights and needs_model else None
+    if not args.update:
+        if model_hash is not None and golden.get('model_hash') != model_hash:
+            print(f"提示: 模型权重与生成黄金文件时不同（{golden.get('model_hash')} -> {model_hash}），轨迹变化可能是预期的")
+        if golden.get('config') != decision_config():
+            print(f"提示: 决策参数与黄金文件不同: {golden.get('config')} -> {decision_config()}")
+
+    machine = machine_id()
+    floors = all_floors.get(machine, {})
+    failures = 0
+    for path in sources:
+        name = source_name(path)
+        kind = source_kind(path)
+        if kind != 'session' and not has_weights:
+            print(f"{name} [{kind}] -> 跳过: 没有找到模型权重 {args.model}")
+            continue
+        trace, frames, fps, deterministic = measure(path, kind,
+                                                    lambda: load_backend_model(args.model, backend, int8, warmup=0),
+                                                    max(1, args.repeats))
+        line = f"{name} [{kind}] {frames} 帧, {fps:.1f} FPS"
+        if not deterministic:
+            line += "，警告: 多次运行的轨迹不一致"
+            failures += 1
+        if args.update:
+            golden['sources'][name] = {'kind': kind, 'frames': frames, 'trace': trace}
+            floors[name] = fps * FPS_FLOOR_RATIO
+            print(f"{line} -> 已记录，FPS 下限 {floors[name]:.1f}")
+            continue
+
+        expected = golden['sources'].get(name)
+        if expected is None:
+            print(f"{line} -> 失败: 黄金文件中没有该素材（运行 --update 添加）")
+            failures += 1
+            continue
+        difference = first_difference(trace, expected['trace'])
+        if difference is not None:
+            mismatched = sum(1 for i in range(0, min(len(trace), len(expected['trace'])), 2)
+                             if trace[i:i + 2] != expected['trace'][i:i + 2])
+            print(f"{line} -> 失败: 决策轨迹从第 {difference} 帧开始不同（{mismatched} 帧不同，"
+                  f"帧数 {frames} / 黄金 {expected['frames']}）: "
+                  f"{trace[difference * 2:difference * 2 + 20]} != {expected['trace'][difference * 2:difference * 2 + 20]}")
+            failures += 1
+        elif args.no_fps or name not in floors:
+            print(f"{line} -> 轨迹一致" + ("" if args.no_fps else "（本机没有记录 FPS 下限，运行 --update 记录）"))
+        elif fps < floors[name]:
+            print(f"{line} -> 失败: 低于本机 FPS 下限 {floors[name]:.1f}")
+            failures += 1
+        else:
+            print(f"{line} -> 通过（FPS 下限 {floors[name]:.1f}）")
+
+    if args.update:
+        golden.update({'created': time.strftime("%Y-%m-%d %H:%M:%S"), 'config': decision_config()})
+        if model_hash is not None:
+            golden.update({'model': args.model, 'model_hash': model_hash})
+        golden.pop('fps_floors', None)  # 旧版本把 FPS 下限写在黄金文件中
+        all_floors[machine] = floors
+        os.makedirs(os.path.dirname(os.path.abspath(args.golden)), exist_ok=True)
+        with open(args.golden, 'w', encoding='utf-8') as f:
+            json.dump(golden, f, ensure_ascii=False, indent=2)
+        with open(floors_path, 'w', encoding='utf-8') as f:
+            json.dump(all_floors, f, ensure_ascii=False, indent=2)
+        print(f"黄金文件已保存到 {args.golden}，本机 FPS 下限已保存到 {floors_path}")
+    elif failures:
+        print(f"回归检查失败: {failures} 项")
+    else:
+        print("回归检查通过")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,143 @@
+"""
+中央通道 ROI / 动态分辨率推理。
+
+避障决策只关心中心落在 left_bound..right_bound 之间的障碍物，因此 SEARCHING 时只对
+[left_bound - 余量, right_bound + 余量] 这一竖条做推理，并可使用更小的 imgsz；AVOIDING 时恢复整帧、
+原始分辨率推理。检测框映射回整帧坐标后交给独立的跟踪器（TRACKER，见 trackers.py），因此在裁剪推理和
+整帧推理之间切换时跟踪ID保持连续。若有障碍物框贴在裁剪区域的边缘（可能被截断，面积和中心都不可靠），
+本帧立即改用整帧重新推理，保证触发避障的时机不变。
+
+对比工具（与整帧 model.track 比较推理耗时和逐帧决策）:
+    python roi_inference.py path/to/clip.mp4 --margin 0.15 --imgsz 480
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+from trackers import TRACK_CONF, create_tracker, detections_of
+
+EDGE_TOLERANCE = 2  # 距裁剪边缘小于该像素数的框视为被截断
+
+
+class RoiInference:
+    """SEARCHING 时裁剪中央通道推理，AVOIDING 或框被截断时整帧推理"""
+
+    def __init__(self, model, frame_width, frame_height, left_bound, right_bound, class_mask, margin=None,
+                 search_imgsz=None, full_imgsz=None, frame_rate=30):
+        if margin is None:
+            margin = core.ROI_SIDE_MARGIN
+        if search_imgsz is None:
+            search_imgsz = core.ROI_SEARCH_IMGSZ
+        self.model = model
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.x1 = max(0, int(left_bound - frame_width * margin))
+        self.x2 = min(frame_width, int(np.ceil(right_bound + frame_width * margin)))
+        self.class_mask = class_mask
+        self.search_imgsz = search_imgsz
+        self.full_imgsz = full_imgsz
+        self.tracker = create_tracker(core.TRACKER, frame_rate)
+        self.roi_runs = 0
+        self.full_runs = 0
+        self.reruns = 0
+
+    def detect(self, image, imgsz=None):
+        kwargs = {'imgsz': imgsz} if imgsz else {}
+        return detections_of(self.model.predict(image, conf=TRACK_CONF, verbose=False, **kwargs)[0])
+
+    def is_clipped(self, boxes, confs, clss, conf_threshold=None):
+        """是否有可能参与决策的障碍物框贴在裁剪区域的左右边缘（整帧边缘除外）"""
+        if conf_threshold is None:
+            conf_threshold = core.CONFIDENCE_THRESHOLD
+        relevant = (confs > conf_threshold) & self.class_mask[clss]
+        at_left = (boxes[:, 0] <= self.x1 + EDGE_TOLERANCE) if self.x1 > 0 else False
+        at_right = (boxes[:, 2] >= self.x2 - EDGE_TOLERANCE) if self.x2 < self.frame_width else False
+        return bool(np.any(relevant & (at_left | at_right)))
+
+    def track(self, frame, state):
+        """推理并跟踪一帧，返回整帧坐标下与 extract_tracks 相同格式的结果"""
+        if state != core.STATE_AVOIDING:
+            boxes, confs, clss = self.detect(frame[:, self.x1:self.x2], self.search_imgsz)
+            boxes[:, [0, 2]] += self.x1
+            if not self.is_clipped(boxes, confs, clss):
+                self.roi_runs += 1
+                return self.tracker.update(boxes, confs, clss, frame.shape)
+            self.reruns += 1
+        self.full_runs += 1
+        boxes, confs, clss = self.detect(frame, self.full_imgsz)
+        return self.tracker.update(boxes, confs, clss, frame.shape)
+
+    def summary(self):
+        return (f"ROI推理 {self.roi_runs} 帧, 整帧推理 {self.full_runs} 帧 "
+                f"(其中因框被截断重新推理 {self.reruns} 帧), 裁剪区域 x={self.x1}..{self.x2}")
+
+
+def run_video(model, video_path, roi, margin=None, search_imgsz=None):
+    """在视频上运行整帧跟踪或 ROI 推理，返回 (逐帧指令, 每帧推理+跟踪耗时列表, RoiInference 或 None)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {video_path}")
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    left_bound, right_bound = core.compute_bounds(frame_width)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound, verbose=False)
+    class_mask = core.build_class_mask(model.names)
+    roi_inference = tracking = None
+    if not roi:
+        tracking = core.open_tracking(model, cap)
+    else:
+        roi_inference = RoiInference(model, frame_width, frame_height, left_bound, right_bound, class_mask, margin,
+                                     search_imgsz, frame_rate=int(cap.get(cv2.CAP_PROP_FPS)) or 30)
+
+    commands = []
+    costs = []
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            start = time.process_time()
+            if roi_inference is not None:
+                tracks = roi_inference.track(frame, state_machine.state)
+            else:
+                tracks = core.track_frame(model, frame, tracking)[1]
+            costs.append(time.process_time() - start)
+            commands.append(state_machine.update(core.filter_detections(tracks, class_mask)))
+    finally:
+        cap.release()
+    return commands, costs, roi_inference
+
+
+def first_triggers(commands):
+    """每次从非 L/R 指令（通常为 'C'）切换到 'L' / 'R' 的帧序号"""
+    return [i for i, command in enumerate(commands)
+            if command in ('L', 'R') and (i == 0 or commands[i - 1] not in ('L', 'R'))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="中央通道 ROI / 低分辨率推理与整帧推理对比")
+    parser.add_argument("video", help="用于对比的视频文件")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--margin", type=float, default=core.ROI_SIDE_MARGIN, help="中央区域两侧额外裁剪的宽度（占画面宽度）")
+    parser.add_argument("--imgsz", type=int, default=core.ROI_SEARCH_IMGSZ, help="SEARCHING 时 ROI 推理的输入尺寸")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    full_commands, full_costs, _ = run_video(YOLO(args.model), args.video, False)
+    roi_commands, roi_costs, roi_inference = run_video(YOLO(args.model), args.video, True, args.margin, args.imgsz)
+
+    full_ms = np.mean(full_costs) * 1000 if full_costs else 0.0
+    roi_ms = np.mean(roi_costs) * 1000 if roi_costs else 0.0
+    print(f"整帧推理: {full_ms:.1f} ms/帧 (CPU)")
+    print(f"ROI推理:  {roi_ms:.1f} ms/帧 (CPU), 降低 {(1 - roi_ms / max(full_ms, 1e-9)) * 100:.1f}%")
+    print(roi_inference.summary())
+    same = sum(1 for a, b in zip(full_commands, roi_commands) if a == b)
+    print(f"逐帧决策一致 {same}/{len(full_commands)}")
+    full_triggers, roi_triggers = first_triggers(full_commands), first_triggers(roi_commands)
+    print(f"避障触发帧: 整帧 {full_triggers}")
+    print(f"            ROI  {roi_triggers}")
+    print("触发时机一致" if full_triggers == roi_triggers else "触发时机不一致")
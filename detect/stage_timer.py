@@ -0,0 +1,130 @@
+"""
+低开销的分阶段计时：每个阶段的耗时落入固定大小的对数直方图（1 µs ~ 100 s），
+退出时打印 p50/p95/p99 并写出 JSON 报告。关闭时所有方法都是空操作。
+用法:
+    timer = StageTimer(enabled=True)
+    t = timer.start()
+    ...              # 采集
+    t = timer.lap('capture', t)
+    ...              # 推理
+    t = timer.lap('track', t)
+"""
+import json
+import math
+import os
+import platform
+import time
+
+# 直方图配置：对数刻度，每10倍分 BINS_PER_DECADE 个桶
+HIST_MIN_SECONDS = 1e-6
+HIST_DECADES = 8
+BINS_PER_DECADE = 40
+NUM_BINS = HIST_DECADES * BINS_PER_DECADE + 1  # 最后一个桶收集超出范围的值
+_LOG_MIN = math.log10(HIST_MIN_SECONDS)
+
+
+def bin_upper_edge(index):
+    """第 index 个桶的上边界（秒）"""
+    return 10 ** (_LOG_MIN + (index + 1) / BINS_PER_DECADE)
+
+
+class StageHistogram:
+    """单个阶段的固定大小直方图"""
+    __slots__ = ('counts', 'total', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * NUM_BINS
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds <= HIST_MIN_SECONDS:
+            index = 0
+        else:
+            index = min(int((math.log10(seconds) - _LOG_MIN) * BINS_PER_DECADE), NUM_BINS - 1)
+        self.counts[index] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """按直方图估计分位数（取所在桶的上边界，误差约 6%）"""
+        if self.count == 0:
+            return 0.0
+        target = q / 100.0 * self.count
+        cumulative = 0
+        for index, value in enumerate(self.counts):
+            cumulative += value
+            if cumulative >= target:
+                return min(bin_upper_edge(index), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class StageTimer:
+    """按阶段名记录耗时；enabled=False 时不做任何事"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+        self.wall_start = time.perf_counter()
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def lap(self, stage, start):
+        """记录从 start 到现在的耗时，并返回现在的时间作为下一阶段的起点"""
+        if not self.enabled:
+            return 0.0
+        now = time.perf_counter()
+        self.record(stage, now - start)
+        return now
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = StageHistogram()
+        histogram.record(seconds)
+
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in self.stages.items()}
+
+    def report(self, title="分阶段耗时"):
+        if not self.enabled or not self.stages:
+            return
+        print(f"--- {title} (ms) ---")
+        print(f"{'阶段':<14}{'次数':>8}{'平均':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'最大':>9}")
+        for stage, stats in self.summary().items():
+            print(f"{stage:<14}{stats['count']:>8}{stats['mean_ms']:>9.2f}{stats['p50_ms']:>9.2f}"
+                  f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['max_ms']:>9.2f}")
+
+    def write_json(self, path, extra=None):
+        if not self.enabled:
+            return
+        report = {
+            'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'machine': {'node': platform.node(), 'processor': platform.processor(), 'python': platform.python_version()},
+            'wall_seconds': time.perf_counter() - self.wall_start,
+            'stages': self.summary(),
+        }
+        if extra:
+            report.update(extra)
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"计时报告已保存到 {path}")
@@ -0,0 +1,212 @@
+"""
+快速冷启动：摄像头、UDP链路和模型加载并行进行，链路一就绪就先发送中性指令 'C'，
+模型使用 backends.py 中缓存的融合 / 导出结果。
+
+冷启动基准（每次都启动一个新的 Python 进程，在本机UDP端口上接收指令，
+统计“进程启动 -> 首个 'C'”与“进程启动 -> 首条决策指令”的耗时）:
+    python startup.py --measure 5 --source path/to/clip.mp4
+    python startup.py --measure 5 --source path/to/clip.mp4 --sequential   # 旧的串行启动方式，作为对比
+    python startup.py --measure 5 --source path/to/clip.mp4 --json output/startup.json --compare output/startup_old.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+
+import demo_v3 as core
+
+MEASURE_TIMEOUT = 120.0  # 单次冷启动测量的超时时间（秒）
+
+
+def open_camera(source=None):
+    """整数为摄像头编号，否则视为按实时速度播放的视频文件（见 capture.py）"""
+    from capture import open_capture
+    return open_capture(source)
+
+
+def elapsed_ms():
+    return (time.monotonic() - core.STARTUP_T0) * 1000
+
+
+def parallel_startup(model_path=None, backend=None, int8=None, source=None):
+    """
+    并行打开摄像头、加载模型，同时在主线程建立UDP链路并立即发送 'C'。
+    返回 (model, cap, sender, timings)，timings 为各步骤完成时距进程启动的毫秒数。
+    """
+    timings = {}
+    opened = {}
+
+    def load():
+        from backends import load_model
+        opened['model'] = load_model(model_path, backend, int8)
+        timings['model_ready_ms'] = elapsed_ms()
+
+    def camera():
+        opened['cap'] = open_camera(source)
+        timings['camera_ready_ms'] = elapsed_ms()
+
+    threads = [threading.Thread(target=load, name="model-load", daemon=True),
+               threading.Thread(target=camera, name="camera-open", daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    sender = core.open_sender()
+    sender.send('C')
+    timings['first_command_ms'] = elapsed_ms()
+    print(f"链路就绪，已发送 'C'，距进程启动 {timings['first_command_ms']:.0f} ms")
+
+    for thread in threads:
+        thread.join()
+    # open_capture 打不开设备时不抛异常，而是返回未打开的采集源
+    if 'model' not in opened or 'cap' not in opened or not opened['cap'].isOpened():
+        sender.close()
+        if 'cap' in opened:
+            opened['cap'].release()
+        raise RuntimeError("模型加载失败" if 'model' not in opened else "摄像头打开失败")
+    print(f"摄像头就绪 {timings['camera_ready_ms']:.0f} ms，模型就绪 {timings['model_ready_ms']:.0f} ms（距进程启动）")
+    return opened['model'], opened['cap'], sender, timings
+
+
+def sequential_startup(model_path=None, backend=None, int8=None, source=None):
+    """旧的启动顺序：先加载模型，再打开UDP链路和摄像头，不提前发送 'C'"""
+    from backends import load_model
+
+    timings = {}
+    model = load_model(model_path, backend, int8)
+    timings['model_ready_ms'] = elapsed_ms()
+    sender = core.open_sender()
+    cap = open_camera(source)
+    if not cap.isOpened():
+        sender.close()
+        cap.release()
+        raise RuntimeError("摄像头打开失败")
+    timings['camera_ready_ms'] = elapsed_ms()
+    return model, cap, sender, timings
+
+
+def send_first_decision(model, cap, sender):
+    """处理第一帧并立即发送状态机的决策（与 process_live_camera 的第一帧相同），返回距进程启动的毫秒数"""
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    left_bound, right_bound = core.compute_bounds(frame_width)
+    state_machine = core.AvoidanceStateMachine(left_bound, right_bound, verbose=False)
+    class_mask = core.build_class_mask(model.names)
+    success, frame = cap.read()
+    if not success:
+        return None
+    capture_time = time.monotonic()
+    tracks = core.track_frame(model, frame, core.open_tracking(model, cap))[1]
+    command = state_machine.update(core.filter_detections(tracks, class_mask))
+    sender.send(command, capture_time)
+    return elapsed_ms()
+
+
+def child_main(args):
+    core.ESP32_IP = '127.0.0.1'
+    core.ESP32_PORT = args.port
+    backend, int8 = (None, None)
+    if args.backend:
+        from backends import parse_backend
+        backend, int8 = parse_backend(args.backend)
+    startup = sequential_startup if args.sequential else parallel_startup
+    model, cap, sender, timings = startup(args.model, backend, int8, args.source)
+    timings['first_decision_ms'] = send_first_decision(model, cap, sender)
+    cap.release()
+    sender.close()
+    print(json.dumps(timings))
+
+
+def measure_once(args):
+    """启动一个新进程，以本机UDP端口收到的数据包计时（包含解释器启动和全部导入）"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(0.2)
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--port', str(sock.getsockname()[1]),
+               '--model', args.model]
+    if args.source is not None:
+        command += ['--source', str(args.source)]
+    if args.backend:
+        command += ['--backend', args.backend]
+    if args.sequential:
+        command.append('--sequential')
+
+    start = time.monotonic()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL if args.quiet else None, stderr=subprocess.STDOUT)
+    # 并行启动时第一个数据包是链路就绪后的 'C'，第二个才是第一帧的决策；串行启动时第一个数据包就是决策
+    decision_index = 0 if args.sequential else 1
+    arrivals = []
+    try:
+        while len(arrivals) <= decision_index and time.monotonic() - start < MEASURE_TIMEOUT:
+            try:
+                sock.recvfrom(255)
+            except socket.timeout:
+                if process.poll() is not None:
+                    break
+                continue
+            arrivals.append((time.monotonic() - start) * 1000)
+    finally:
+        sock.close()
+    if len(arrivals) <= decision_index:
+        print("警告: 没有收到决策指令")
+    process.wait()
+    return {'first_command_ms': arrivals[0] if arrivals else None,
+            'first_decision_ms': arrivals[decision_index] if len(arrivals) > decision_index else None}
+
+
+def summarize(runs):
+    summary = {}
+    for key in ('first_command_ms', 'first_decision_ms'):
+        values = sorted(run[key] for run in runs if run[key] is not None)
+        if values:
+            summary[key] = {'min': values[0], 'p50': values[len(values) // 2], 'max': values[-1]}
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="冷启动与首条指令耗时")
+    parser.add_argument("--measure", type=int, default=3, help="冷启动测量次数")
+    parser.add_argument("--source", default=None, help="摄像头编号或视频文件路径（默认使用 CAMERA_INDEX）")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--backend", default=None, help="推理后端，如 onnx / openvino-int8（默认使用 INFERENCE_BACKEND）")
+    parser.add_argument("--sequential", action="store_true", help="使用旧的串行启动方式作为对比")
+    parser.add_argument("--json", default=None, help="保存结果的JSON路径")
+    parser.add_argument("--compare", default=None, help="与之前保存的JSON结果比较")
+    parser.add_argument("--quiet", action="store_true", help="不显示子进程的输出")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=core.ESP32_PORT, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args)
+        sys.exit(0)
+
+    # 第一次运行可能需要导出 / 融合模型，先运行一次填充缓存，不计入结果
+    measure_once(args)
+    runs = [measure_once(args) for _ in range(args.measure)]
+    summary = summarize(runs)
+    label = "串行启动" if args.sequential else "并行启动"
+    for key, name in (('first_command_ms', "首个指令"), ('first_decision_ms', "首条决策")):
+        if key in summary:
+            stats = summary[key]
+            print(f"{label} 进程启动 -> {name}: p50 {stats['p50']:.0f} ms (最小 {stats['min']:.0f}, 最大 {stats['max']:.0f})")
+
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)['summary']
+        for key in summary:
+            if key in previous:
+                print(f"{key}: p50 {previous[key]['p50']:.0f} -> {summary[key]['p50']:.0f} ms")
+    if args.json:
+        output_dir = os.path.dirname(args.json)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.strftime("%Y-%m-%d %H:%M:%S"), 'sequential': args.sequential,
+                       'model': args.model, 'backend': args.backend, 'runs': runs, 'summary': summary},
+                      f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.json}")
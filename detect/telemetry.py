@@ -0,0 +1,362 @@
+"""
+运行遥测：摄像头主循环每帧把一条定长记录写入预分配的环形缓冲区（numpy 结构化数组，单写单读，不加锁），
+后台线程每 TELEMETRY_FLUSH_INTERVAL 秒把新记录批量写入按大小轮转的日志，并可在本机提供 HTTP 指标页。
+
+记录: 帧序号、采集时间、决策时间、帧龄、推理耗时、障碍物数量、状态、指令、是否发送及发送时间。
+日志: TELEMETRY_FORMAT = 'jsonl'（每行一条 JSON）或 'binary'（RECORD_DTYPE 的原始字节，np.fromfile 读取）；
+      超过 TELEMETRY_MAX_BYTES 时轮转为 .1 / .2 ...，最多保留 TELEMETRY_BACKUPS 个旧文件。
+指标页: http://127.0.0.1:TELEMETRY_HTTP_PORT/ 显示最近 METRICS_WINDOW 秒的 FPS、帧龄 / 推理耗时分位数、
+        状态切换次数；/metrics.json 返回同样的数据。
+环形缓冲区只由主循环写入：先写槽位再递增 written；后台线程读到 written 为止，被写入端追上覆盖的记录计为丢失。
+主循环中 record() 自身的耗时会被累计，退出时打印占帧时间的比例（目标低于 1%）。
+
+用法:
+    TN_TELEMETRY=1 python demo_v3.py
+    python telemetry.py output/telemetry/telemetry.jsonl     # 汇总日志
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import demo_v3 as core
+
+METRICS_WINDOW = 10.0  # 指标页统计最近多少秒的记录
+STATE_CODES = {core.STATE_SEARCHING: 0, core.STATE_AVOIDING: 1}
+STATE_NAMES = {code: state for state, code in STATE_CODES.items()}
+
+RECORD_DTYPE = np.dtype([
+    ('frame', np.int64),
+    ('capture_time', np.float64),  # time.monotonic() 秒
+    ('decision_time', np.float64),
+    ('frame_age_ms', np.float32),  # 决策时刻 - 采集时间
+    ('inference_ms', np.float32),  # 本帧推理（含跟踪）耗时，跳过推理的帧为 0
+    ('detections', np.int32),
+    ('state', np.uint8),
+    ('command', 'S1'),
+    ('sent', np.bool_),
+    ('send_time', np.float64),  # 没有发送时为 nan
+])
+
+
+class TelemetryRing:
+    """单写单读的定长环形缓冲区；written 只由写入端递增"""
+
+    def __init__(self, size):
+        self.size = size
+        self.buffer = np.zeros(size, dtype=RECORD_DTYPE)
+        self.written = 0
+
+    def append(self, record):
+        self.buffer[self.written % self.size] = record
+        self.written += 1  # 先写槽位再发布
+
+    def read(self, start, end):
+        """复制第 [start, end) 条记录，返回 (记录, 实际起点)；已被覆盖的记录跳过"""
+        start = max(start, end - self.size)
+        indices = np.arange(start, end) % self.size
+        records = self.buffer[indices]
+        # 复制期间写入端可能又追上了一部分
+        overwritten = self.written - self.size + 1 - start  # +1: 正在写入的槽位
+        if overwritten > 0:
+            records = records[overwritten:]
+            start += overwritten
+        return records, start
+
+    def latest(self):
+        """最多 size 条最近记录的副本"""
+        end = self.written
+        return self.read(max(0, end - self.size), end)[0]
+
+
+class RotatingLog:
+    """按大小轮转的 JSONL / 二进制日志"""
+
+    def __init__(self, directory, fmt=None, max_bytes=None, backups=None):
+        self.format = fmt or core.TELEMETRY_FORMAT
+        self.max_bytes = core.TELEMETRY_MAX_BYTES if max_bytes is None else max_bytes
+        self.backups = core.TELEMETRY_BACKUPS if backups is None else backups
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "telemetry.jsonl" if self.format == 'jsonl' else "telemetry.bin")
+        self.file = None
+        # 单调时钟 -> 墙钟，写入 JSONL 便于与外部日志对照
+        self.wall_offset = time.time() - time.monotonic()
+        self._open()
+
+    def _open(self):
+        self.file = open(self.path, 'a' if self.format == 'jsonl' else 'ab')
+
+    def _rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write(self, records):
+        if len(records) == 0:
+            return
+        if self.format == 'jsonl':
+            self.file.write(''.join(self._line(record) for record in records))
+        else:
+            self.file.write(records.tobytes())
+        self.file.flush()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _line(self, record):
+        send_time = float(record['send_time'])
+        return json.dumps({
+            'frame': int(record['frame']),
+            'wall': round(float(record['decision_time']) + self.wall_offset, 6),
+            'capture_time': float(record['capture_time']),
+            'decision_time': float(record['decision_time']),
+            'frame_age_ms': round(float(record['frame_age_ms']), 3),
+            'inference_ms': round(float(record['inference_ms']), 3),
+            'detections': int(record['detections']),
+            'state': STATE_NAMES[int(record['state'])],
+            'command': record['command'].decode(),
+            'sent': bool(record['sent']),
+            'send_time': None if np.isnan(send_time) else send_time,
+        }) + '\n'
+
+    def close(self):
+        self.file.close()
+
+
+def read_log(path):
+    """读取一个日志文件，返回 RECORD_DTYPE 数组"""
+    if path.endswith('.bin') or '.bin.' in os.path.basename(path):
+        return np.fromfile(path, dtype=RECORD_DTYPE)
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            item = json.loads(line)
+            rows.append((item['frame'], item['capture_time'], item['decision_time'], item['frame_age_ms'],
+                         item['inference_ms'], item['detections'], STATE_CODES[item['state']], item['command'],
+                         item['sent'], np.nan if item['send_time'] is None else item['send_time']))
+    return np.array(rows, dtype=RECORD_DTYPE)
+
+
+def split_sessions(records):
+    """在帧序号不再递增（程序重启）或决策时间倒退（机器重启）处把记录切分为多次运行"""
+    if not len(records):
+        return []
+    restarts = (np.diff(records['frame']) <= 0) | (np.diff(records['decision_time']) < 0)
+    return np.split(records, np.flatnonzero(restarts) + 1)
+
+
+def compute_metrics(records, window=None):
+    """最近 window 秒记录的 FPS、帧龄 / 推理耗时分位数、发送次数和状态切换次数"""
+    window = METRICS_WINDOW if window is None else window
+    if len(records):
+        records = records[records['decision_time'] >= records['decision_time'][-1] - window]
+    metrics = {'frames': len(records), 'window_s': window}
+    if len(records) < 2:
+        return metrics
+    span = records['decision_time'][-1] - records['decision_time'][0]
+    inferred = records['inference_ms'][records['inference_ms'] > 0]
+    metrics['fps'] = (len(records) - 1) / span if span > 0 else 0.0
+    for name, values in (('frame_age_ms', records['frame_age_ms']), ('inference_ms', inferred)):
+        if len(values):
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            metrics[name] = {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(values.max())}
+    metrics['sends'] = int(records['sent'].sum())
+    metrics['state'] = STATE_NAMES[int(records['state'][-1])]
+    metrics['command'] = records['command'][-1].decode()
+    return metrics
+
+
+class TransitionCounter:
+    """累计状态切换和指令切换次数（由后台线程在刷新时更新，不受环形缓冲区长度限制）"""
+
+    def __init__(self):
+        self.last_state = None
+        self.last_command = None
+        self.transitions = {}
+        self.command_switches = 0
+
+    def update(self, records):
+        for state, command in zip(records['state'].tolist(), records['command'].tolist()):
+            if self.last_state is not None and state != self.last_state:
+                key = f"{STATE_NAMES[self.last_state]}->{STATE_NAMES[state]}"
+                self.transitions[key] = self.transitions.get(key, 0) + 1
+            if self.last_command is not None and command != self.last_command:
+                self.command_switches += 1
+            self.last_state, self.last_command = state, command
+
+
+class Telemetry:
+    """主循环调用 record()；后台线程刷新日志，HTTP 线程提供指标页"""
+
+    def __init__(self, directory=None, ring_size=None, flush_interval=None, http_port=None, fmt=None):
+        self.ring = TelemetryRing(ring_size or core.TELEMETRY_RING_SIZE)
+        self.flush_interval = flush_interval or core.TELEMETRY_FLUSH_INTERVAL
+        self.log = RotatingLog(directory or core.TELEMETRY_DIR, fmt)
+        self.http_port = core.TELEMETRY_HTTP_PORT if http_port is None else http_port
+        self.counter = TransitionCounter()
+        self.flushed = 0
+        self.lost = 0
+        self.record_seconds = 0.0  # 主循环中 record() 的累计耗时
+        self.flush_cpu_seconds = 0.0  # 后台线程的累计 CPU 时间
+        self.start_time = time.perf_counter()
+        self.server = None
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        if self.http_port:
+            self.server = ThreadingHTTPServer((core.TELEMETRY_HTTP_HOST, self.http_port), _handler_for(self))
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="telemetry-http", daemon=True).start()
+            print(f"遥测指标页: http://{core.TELEMETRY_HTTP_HOST}:{self.server.server_address[1]}/")
+        print(f"遥测日志: {self.log.path}")
+        return self
+
+    def record(self, frame, capture_time, inference_seconds, detections, state, command, sent):
+        """主循环每帧调用一次；sent 为本帧是否发送了指令"""
+        start = time.perf_counter()
+        now = time.monotonic()
+        self.ring.append((frame, capture_time, now, (now - capture_time) * 1000, inference_seconds * 1000,
+                          detections, STATE_CODES[state], command, sent, now if sent else np.nan))
+        self.record_seconds += time.perf_counter() - start
+
+    def flush(self):
+        """把新记录写入日志；返回写入条数"""
+        with self._flush_lock:
+            end = self.ring.written
+            records, start = self.ring.read(self.flushed, end)
+            self.lost += start - self.flushed
+            self.flushed = end
+            self.counter.update(records)
+            self.log.write(records)
+            return len(records)
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            self.flush_cpu_seconds = time.thread_time() - cpu_start
+
+    def metrics(self):
+        metrics = compute_metrics(self.ring.latest())
+        metrics.update({
+            'total_frames': self.ring.written,
+            'transitions': dict(self.counter.transitions),
+            'command_switches': self.counter.command_switches,
+            'lost_records': self.lost,
+            'overhead': self.overhead(),
+        })
+        return metrics
+
+    def overhead(self):
+        """record() 与后台刷新线程的耗时占运行时间的比例（%）"""
+        wall = time.perf_counter() - self.start_time
+        frames = max(self.ring.written, 1)
+        return {
+            'record_us_per_frame': self.record_seconds / frames * 1e6,
+            'record_percent': self.record_seconds / wall * 100 if wall > 0 else 0.0,
+            'flush_cpu_percent': self.flush_cpu_seconds / wall * 100 if wall > 0 else 0.0,
+        }
+
+    def stop(self):
+        self._stop.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=2.0)
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.flush()
+        self.log.close()
+
+    def summary(self):
+        overhead = self.overhead()
+        return (f"遥测: 记录 {self.ring.written} 帧, 丢失 {self.lost} 条, 主循环开销 "
+                f"{overhead['record_us_per_frame']:.1f} us/帧 ({overhead['record_percent']:.3f}% 运行时间), "
+                f"刷新线程 CPU {overhead['flush_cpu_percent']:.3f}%")
+
+
+def render_page(metrics):
+    """指标页 HTML（每 2 秒自动刷新）"""
+    rows = [('帧数（窗口内 / 累计）', f"{metrics['frames']} / {metrics['total_frames']}"),
+            ('FPS', f"{metrics.get('fps', 0.0):.1f}"),
+            ('当前状态 / 指令', f"{metrics.get('state', '-')} / {metrics.get('command', '-')}")]
+    for name, label in (('frame_age_ms', '帧龄 ms'), ('inference_ms', '推理 ms')):
+        if name in metrics:
+            values = metrics[name]
+            rows.append((label, f"p50 {values['p50']:.1f} / p95 {values['p95']:.1f} / p99 {values['p99']:.1f} / "
+                                f"最大 {values['max']:.1f}"))
+    rows.append(('发送次数（窗口内）', str(metrics.get('sends', 0))))
+    rows += [(f"状态切换 {key}", str(count)) for key, count in sorted(metrics['transitions'].items())]
+    rows.append(('指令切换（累计）', str(metrics['command_switches'])))
+    rows.append(('丢失记录', str(metrics['lost_records'])))
+    overhead = metrics['overhead']
+    rows.append(('遥测开销', f"{overhead['record_us_per_frame']:.1f} us/帧, 主循环 {overhead['record_percent']:.3f}%, "
+                          f"刷新线程 {overhead['flush_cpu_percent']:.3f}%"))
+    body = ''.join(f"<tr><th>{label}</th><td>{value}</td></tr>" for label, value in rows)
+    return (f"<!doctype html><html><head><meta charset='utf-8'><meta http-equiv='refresh' content='2'>"
+            f"<title>避障运行指标</title></head><body><h3>最近 {metrics['window_s']:.0f} 秒</h3>"
+            f"<table border='1' cellpadding='4'>{body}</table></body></html>")
+
+
+def _handler_for(telemetry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            metrics = telemetry.metrics()
+            if self.path.startswith('/metrics.json'):
+                body, content_type = json.dumps(metrics, ensure_ascii=False).encode(), 'application/json'
+            elif self.path in ('/', '/index.html'):
+                body, content_type = render_page(metrics).encode(), 'text/html; charset=utf-8'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # 不在终端打印每次请求
+
+    return MetricsHandler
+
+
+def open_telemetry():
+    """TELEMETRY 开启时创建并启动遥测"""
+    if not core.TELEMETRY:
+        return None
+    return Telemetry().start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="汇总遥测日志")
+    parser.add_argument("logs", nargs='+', help="telemetry.jsonl / telemetry.bin（及轮转出的旧文件）")
+    args = parser.parse_args()
+
+    # 轮转出的旧文件修改时间更早；每个文件内的记录已按写入顺序排列，帧序号每次运行都从头开始，不能按它排序
+    records = np.concatenate([read_log(path) for path in sorted(args.logs, key=os.path.getmtime)])
+    sessions = split_sessions(records)
+    for index, session in enumerate(sessions, 1):
+        counter = TransitionCounter()
+        counter.update(session)
+        metrics = compute_metrics(session, window=float('inf'))
+        prefix = f"第 {index} 次运行: " if len(sessions) > 1 else ""
+        print(f"{prefix}{len(session)} 帧, {metrics.get('fps', 0.0):.1f} FPS, 发送 {metrics.get('sends', 0)} 次, "
+              f"指令切换 {counter.command_switches} 次, 状态切换 {counter.transitions}")
+        for name in ('frame_age_ms', 'inference_ms'):
+            if name in metrics:
+                values = metrics[name]
+                print(f"  {name}: p50 {values['p50']:.1f} / p95 {values['p95']:.1f} / p99 {values['p99']:.1f} / "
+                      f"最大 {values['max']:.1f}")
@@ -0,0 +1,218 @@
+"""
+预分配的检测结果存储和按跟踪ID索引的轨迹表。
+
+DetectionStore 每帧把筛选后的障碍物写入同一块结构化数组，不再为每个检测框创建 Python 对象；
+它提供与 DetectionBatch 相同的接口（ids / boxes / areas / center_x、closest_index、find），
+可以直接交给 AvoidanceStateMachine。
+
+TrackTable 以 track_id % size 作为槽位（ByteTrack 的ID单调递增，旧ID早已过期，槽位可以循环复用），
+每个槽位保存该轨迹最近 history 帧的框、面积和中心，find(track_id) 是 O(1) 的查表。
+同一帧内两个活动ID落在同一槽位时，find 退回线性查找，两条轨迹的历史会互相覆盖。
+growth_rates / time_to_collision 用每条轨迹最近几帧的框高和面积，一次性对当前帧的所有轨迹估计碰撞时间。
+注意：load 返回的视图在下一次 load 时会被覆盖，需要跨帧保存时请先 copy()。
+"""
+import numpy as np
+
+DETECTION_DTYPE = np.dtype([
+    ('id', np.int64),
+    ('box', np.int64, (4,)),
+    ('area', np.int64),
+    ('center_x', np.float64),
+])
+
+
+class TrackTable:
+    """按跟踪ID索引的环形轨迹表，每条轨迹保留最近 history 帧"""
+
+    def __init__(self, size=256, history=30):
+        self.size = size
+        self.history = history
+        self.track_id = np.full(size, -1, dtype=np.int64)
+        self.last_frame = np.full(size, -1, dtype=np.int64)
+        self.row = np.full(size, -1, dtype=np.int64)  # 该轨迹在当前帧 DetectionStore 中的行号
+        self.length = np.zeros(size, dtype=np.int64)
+        self.head = np.zeros(size, dtype=np.int64)  # 下一次写入的位置
+        self.frames = np.full((size, history), -1, dtype=np.int64)
+        self.times = np.zeros((size, history), dtype=np.float64)  # 每帧的时间（秒）
+        self.records = np.zeros((size, history), dtype=DETECTION_DTYPE)  # 每帧的 id / box / area / center_x
+        self.frame_index = -1
+
+    def reset(self):
+        self.track_id.fill(-1)
+        self.last_frame.fill(-1)
+        self.row.fill(-1)
+        self.length.fill(0)
+        self.head.fill(0)
+        self.frame_index = -1
+
+    def update(self, frame_index, records, rows, timestamp=0.0):
+        """写入一帧的所有轨迹（DETECTION_DTYPE 记录）；rows 为它们在 DetectionStore 中的行号，timestamp 为该帧的时间（秒）"""
+        self.frame_index = frame_index
+        if len(records) == 0:
+            return
+        ids = records['id']
+        slots = ids % self.size
+        reused = self.track_id[slots] != ids
+        if reused.any():
+            # 槽位原来属于一条已结束的旧轨迹（或同一帧内两个ID落在同一槽位），清空后给新轨迹使用
+            fresh = slots[reused]
+            self.track_id[fresh] = ids[reused]
+            self.length[fresh] = 0
+            self.head[fresh] = 0
+        position = self.head[slots]
+        self.frames[slots, position] = frame_index
+        self.times[slots, position] = timestamp
+        self.records[slots, position] = records
+        self.head[slots] = (position + 1) % self.history
+        self.length[slots] = np.minimum(self.length[slots] + 1, self.history)
+        self.last_frame[slots] = frame_index
+        self.row[slots] = rows
+
+    def slot_of(self, track_id):
+        """当前帧中该ID所在的槽位，不在当前帧或槽位冲突时返回 -1"""
+        slot = track_id % self.size
+        if self.track_id[slot] == track_id and self.last_frame[slot] == self.frame_index:
+            return slot
+        return -1
+
+    def lookup(self, track_id):
+        """当前帧中该ID在 DetectionStore 中的行号，不存在时返回 -1"""
+        slot = self.slot_of(track_id)
+        return int(self.row[slot]) if slot >= 0 else -1
+
+    def history_of(self, track_id):
+        """按时间顺序返回该轨迹的 (帧号, 框, 面积, 中心x)，不在当前帧时返回 None"""
+        slot = self.slot_of(track_id)
+        if slot < 0:
+            return None
+        length = self.length[slot]
+        order = (self.head[slot] - length + np.arange(length)) % self.history
+        records = self.records[slot, order]
+        return self.frames[slot, order], records['box'], records['area'], records['center_x']
+
+    def growth_rates(self, slots, window, min_points=4):
+        """
+        slots 中每条轨迹在最近 window 帧内的尺度增长率（1/秒）：ln(框高) 与 ln(面积)/2 的平均值对时间的最小二乘斜率。
+        目标匀速靠近时框的尺度与距离成反比，增长率的倒数就是碰撞时间。有效点少于 min_points 的轨迹返回 0。
+        """
+        window = min(window, self.history)
+        steps = np.arange(window)
+        order = (self.head[slots, None] - window + steps) % self.history  # (n, window)，按时间顺序
+        rows = slots[:, None]
+        frames = self.frames[rows, order]
+        times = self.times[rows, order]
+        boxes = self.records['box'][rows, order]
+        # 只用该轨迹实际写入过的、且不早于 window 帧之前的记录
+        valid = (steps >= window - self.length[slots, None]) & (frames > self.frame_index - window)
+        heights = np.maximum(boxes[..., 3] - boxes[..., 1], 1)
+        areas = np.maximum(self.records['area'][rows, order], 1)
+        scale = (np.log(heights) + 0.5 * np.log(areas)) / 2
+        weight = valid.astype(np.float64)
+        count = weight.sum(axis=1)
+        safe = np.maximum(count, 1)
+        times = times - times[:, -1:]  # 以最新一帧为 0，避免单调时钟的大数值损失精度
+        mean_t = (weight * times).sum(axis=1) / safe
+        mean_s = (weight * scale).sum(axis=1) / safe
+        dt = (times - mean_t[:, None]) * weight
+        variance = (dt * dt).sum(axis=1)
+        covariance = (dt * (scale - mean_s[:, None])).sum(axis=1)
+        rates = np.zeros(len(slots))
+        np.divide(covariance, variance, out=rates, where=(count >= min_points) & (variance > 0))
+        return rates
+
+
+class DetectionStore:
+    """预分配的单帧障碍物存储，接口与 DetectionBatch 相同"""
+
+    def __init__(self, capacity=300, table_size=256, history=30, frame_rate=30):
+        self._allocate(capacity)
+        self.table = TrackTable(table_size, history)
+        self.frame_interval = 1.0 / frame_rate  # load() 没有传入时间时按帧号换算
+        self.frame_index = -1
+        self._set_count(0)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.rows = np.zeros(capacity, dtype=DETECTION_DTYPE)
+        # 字段视图只创建一次
+        self._ids = self.rows['id']
+        self._boxes = self.rows['box']
+        self._areas = self.rows['area']
+        self._center_x = self.rows['center_x']
+        self._row_numbers = np.arange(capacity, dtype=np.int64)
+        self._scratch_areas = np.zeros(capacity, dtype=np.int64)
+        self._scratch_keep = np.zeros(capacity, dtype=bool)
+
+    def _set_count(self, count):
+        self.count = count
+        self.ids = self._ids[:count]
+        self.boxes = self._boxes[:count]
+        self.areas = self._areas[:count]
+        self.center_x = self._center_x[:count]
+
+    def reset(self):
+        self.table.reset()
+        self.frame_index = -1
+        self._set_count(0)
+
+    def load(self, tracks, class_mask, conf_threshold, min_area, timestamp=None):
+        """
+        按置信度、类别、面积筛选一帧的跟踪结果（extract_tracks 的输出），写入存储并更新轨迹表，返回自身。
+        timestamp 为该帧的采集时间（秒），用于估计碰撞时间；未指定时按帧号和 frame_rate 换算。
+        """
+        self.frame_index += 1
+        count = 0
+        if tracks is not None:
+            boxes, ids, confs, clss = tracks
+            n = len(ids)
+            if n > self.capacity:
+                # 超过 MAX_DETECTIONS（例如调大了模型的 max_det）时扩容，之后不再重新分配
+                self._allocate(n)
+            areas = self._scratch_areas[:n]
+            keep = self._scratch_keep[:n]
+            np.subtract(boxes[:, 2], boxes[:, 0], out=areas)
+            areas *= boxes[:, 3] - boxes[:, 1]
+            np.greater(confs, conf_threshold, out=keep)
+            keep &= class_mask[clss]
+            keep &= areas > min_area
+            count = int(np.count_nonzero(keep))
+            if count:
+                self._ids[:count] = ids[keep]
+                self._boxes[:count] = boxes[keep]
+                self._areas[:count] = areas[keep]
+                kept = self._boxes[:count]
+                np.add(kept[:, 0], kept[:, 2], out=self._center_x[:count])
+                self._center_x[:count] /= 2
+        self._set_count(count)
+        if timestamp is None:
+            timestamp = self.frame_index * self.frame_interval
+        self.table.update(self.frame_index, self.rows[:count], self._row_numbers[:count], timestamp)
+        return self
+
+    def __len__(self):
+        return self.count
+
+    def closest_index(self):
+        """面积最大的障碍物（作为最近的代表）的下标，没有障碍物时返回 -1"""
+        if self.count == 0:
+            return -1
+        return int(np.argmax(self.areas))
+
+    def find(self, track_id):
+        """O(1) 查找指定跟踪ID的下标，不存在时返回 -1"""
+        index = self.table.lookup(track_id)
+        if index >= 0 and self._ids[index] == track_id:
+            return index
+        if self.table.last_frame[track_id % self.table.size] != self.frame_index:
+            return -1  # 槽位本帧没有写入，该ID一定不在当前帧
+        # 同一帧内两个ID落在同一槽位（极少见），退回线性查找
+        matches = np.flatnonzero(self.ids == track_id)
+        return int(matches[0]) if len(matches) else -1
+
+    def time_to_collision(self, window):
+        """当前帧每个障碍物的碰撞时间（秒），框没有变大（远离、静止）或历史不足时为 inf"""
+        ttc = np.full(self.count, np.inf)
+        if self.count:
+            rates = self.table.growth_rates(self.ids % self.table.size, window)
+            np.divide(1.0, rates, out=ttc, where=rates > 0)
+        return ttc
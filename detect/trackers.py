@@ -0,0 +1,322 @@
+"""
+在检测器之外单独运行的跟踪器。model.track() 把检测和跟踪绑在一起，跟踪器始终工作在输入图像的坐标系里；
+裁剪 / 缩放推理时需要先把检测框映射回整帧坐标，再交给这里的跟踪器，跟踪ID才能在整帧与裁剪推理之间保持连续。
+输出与 demo_v3.extract_tracks 相同的 (boxes, ids, confs, clss)，没有跟踪结果时返回 None。
+
+所有跟踪器都实现 update(boxes, confs, clss, frame_shape) 和 reset()，按名称通过 create_tracker() 创建:
+- 'bytetrack': ultralytics 自带的 BYTETracker（ByteTrackAdapter）
+- 'iou': 内置的轻量 IoU / 中心点匹配（IouTracker），全部用预先分配的 numpy 矩阵计算，没有卡尔曼滤波和匈牙利算法。
+  决策只用跟踪ID确认“同一个障碍物已经离开中央区域”，这个匹配精度已经够用，在性能较弱的CPU上跟踪开销低得多
+
+对比工具（同一批 model.predict 检测结果分别交给各跟踪器，比较每帧跟踪耗时、ID切换率和逐帧决策）:
+    python trackers.py clip1.mp4 clip2.mp4
+"""
+import argparse
+import time
+
+import numpy as np
+
+import demo_v3 as core
+
+TRACK_CONF = 0.1  # 与 model.track 的默认置信度一致，低分框只用于延续已有轨迹
+
+# --- IoU 跟踪器配置 ---
+MAX_TRACKS = 64  # 同时保留的轨迹数上限（含暂时丢失的），满了时覆盖丢失最久的轨迹
+MAX_DETECTIONS = 128  # 每帧参与匹配的检测框上限，超出时只保留置信度最高的
+MATCH_IOU = 0.3  # IoU 达到该值的配对优先匹配，否则按中心点距离匹配
+CENTER_GATE = 0.5  # 中心点距离不超过轨迹框对角线的该比例时也可以匹配（快速移动、框大小突变）
+NEW_TRACK_CONF = 0.25  # 置信度低于该值的检测只用于延续已有轨迹，不新建轨迹（与 bytetrack.yaml 相同）
+TRACK_BUFFER = 30  # 轨迹丢失后保留的帧数（按 30 FPS 计，与 bytetrack.yaml 的 track_buffer 相同）
+
+
+def detections_of(result):
+    """model.predict 的单张结果 -> (xyxy, conf, cls) numpy 数组，作为 update() 的输入"""
+    boxes = result.boxes
+    return (boxes.xyxy.cpu().numpy().astype(np.float32), boxes.conf.cpu().numpy(),
+            boxes.cls.cpu().numpy().astype(int))
+
+
+class ByteTrackAdapter:
+    """ultralytics 自带的 BYTETracker，参数取自 bytetrack.yaml，与 model.track(tracker="bytetrack.yaml") 一致"""
+
+    def __init__(self, frame_rate=30, config="bytetrack.yaml"):
+        import yaml
+        from ultralytics.trackers.byte_tracker import BYTETracker
+        from ultralytics.utils import IterableSimpleNamespace
+        from ultralytics.utils.checks import check_yaml
+
+        with open(check_yaml(config), encoding='utf-8') as f:
+            args = IterableSimpleNamespace(**yaml.safe_load(f))
+        self.tracker = BYTETracker(args, frame_rate=frame_rate)
+
+    def update(self, boxes, confs, clss, frame_shape):
+        """boxes 为整帧坐标的 xyxy 检测框；frame_shape 为 (高, 宽)"""
+        from ultralytics.engine.results import Boxes
+
+        data = np.column_stack([boxes, confs, clss]).astype(np.float32).reshape(-1, 6)
+        tracked = self.tracker.update(Boxes(data, frame_shape[:2]))
+        if len(tracked) == 0:
+            return None
+        return tracked[:, :4].astype(int), tracked[:, 4].astype(int), tracked[:, 5], tracked[:, 6].astype(int)
+
+    def reset(self):
+        self.tracker.reset()
+
+
+class IouTracker:
+    """
+    贪心 IoU / 中心点匹配。轨迹保存在定长数组的前 count 行，代价矩阵在构造时一次分配，每帧只使用其中 轨迹数x检测数 的部分。
+    匹配顺序与 ByteTrack 的两轮关联相同：高分检测（>= NEW_TRACK_CONF）先于低分检测，IoU 配对先于中心点配对。
+    """
+
+    def __init__(self, frame_rate=30, max_tracks=None, max_detections=None):
+        self.max_tracks = max_tracks or MAX_TRACKS
+        self.max_detections = max_detections or MAX_DETECTIONS
+        self.max_age = max(1, int(round(TRACK_BUFFER * frame_rate / 30)))
+        self.boxes = np.zeros((self.max_tracks, 4), dtype=np.float32)
+        self.ids = np.zeros(self.max_tracks, dtype=int)
+        self.ages = np.zeros(self.max_tracks, dtype=int)  # 距上一次匹配的帧数，0 表示本帧已匹配
+        size = self.max_tracks * self.max_detections
+        self._score = np.empty(size, dtype=np.float32)
+        self._a = np.empty(size, dtype=np.float32)
+        self._b = np.empty(size, dtype=np.float32)
+        self._mask = np.empty(size, dtype=bool)
+        self.count = 0
+        self.next_id = 1
+
+    def _matrix(self, buffer, n, m):
+        return buffer[:n * m].reshape(n, m)
+
+    def _scores(self, tracks, dets, high):
+        """轨迹 x 检测 的匹配分数：IoU 配对为 3+IoU，中心点配对在 (0, 1] 之间，高分检测再加 4，不能匹配的为 0"""
+        n, m = len(tracks), len(dets)
+        score, a, b, mask = (self._matrix(buf, n, m) for buf in (self._score, self._a, self._b, self._mask))
+        t, d = tracks[:, None, :], dets[None, :, :]
+        # IoU
+        np.minimum(t[..., 2], d[..., 2], out=a)
+        np.maximum(t[..., 0], d[..., 0], out=b)
+        np.subtract(a, b, out=a)
+        np.minimum(t[..., 3], d[..., 3], out=b)
+        np.maximum(t[..., 1], d[..., 1], out=score)
+        np.subtract(b, score, out=b)
+        np.clip(a, 0, None, out=a)
+        np.clip(b, 0, None, out=b)
+        np.multiply(a, b, out=a)  # 交集面积
+        track_area = (tracks[:, 2] - tracks[:, 0]) * (tracks[:, 3] - tracks[:, 1])
+        det_area = (dets[:, 2] - dets[:, 0]) * (dets[:, 3] - dets[:, 1])
+        np.add(track_area[:, None], det_area[None, :], out=b)
+        np.subtract(b, a, out=b)
+        np.maximum(b, 1e-6, out=b)
+        np.divide(a, b, out=score)
+        np.greater_equal(score, MATCH_IOU, out=mask)
+        # 中心点距离，以轨迹框对角线的 CENTER_GATE 倍归一化
+        np.subtract((t[..., 0] + t[..., 2]) / 2, (d[..., 0] + d[..., 2]) / 2, out=a)
+        np.subtract((t[..., 1] + t[..., 3]) / 2, (d[..., 1] + d[..., 3]) / 2, out=b)
+        np.hypot(a, b, out=a)
+        gate = CENTER_GATE * np.hypot(tracks[:, 2] - tracks[:, 0], tracks[:, 3] - tracks[:, 1])
+        np.divide(a, np.maximum(gate, 1e-6)[:, None], out=a)
+        np.subtract(1, a, out=a)
+        np.clip(a, 0, None, out=a)
+        np.add(score, 3, out=score)
+        np.copyto(score, a, where=~mask)
+        np.greater(score, 0, out=mask)
+        np.add(score, np.where(high, 4.0, 0.0)[None, :], out=score, where=mask)
+        return score
+
+    def _match(self, score):
+        """按分数从高到低贪心匹配，返回 (轨迹下标, 检测下标) 数组"""
+        rows, cols = [], []
+        m = score.shape[1]
+        for _ in range(min(score.shape)):
+            index = int(np.argmax(score))
+            i, j = divmod(index, m)
+            if score[i, j] <= 0:
+                break
+            rows.append(i)
+            cols.append(j)
+            score[i, :] = 0
+            score[:, j] = 0
+        return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+    def update(self, boxes, confs, clss, frame_shape=None):
+        """boxes 为 xyxy 检测框（model.predict 的输出，见 detections_of）；frame_shape 不使用，保持接口一致"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        confs = np.asarray(confs, dtype=np.float32)
+        clss = np.asarray(clss, dtype=int)
+        if len(boxes) > self.max_detections:
+            keep = np.argsort(-confs)[:self.max_detections]
+            boxes, confs, clss = boxes[keep], confs[keep], clss[keep]
+
+        n, m = self.count, len(boxes)
+        self.ages[:n] += 1
+        matched = np.zeros(m, dtype=bool)
+        det_ids = np.zeros(m, dtype=int)
+        if n and m:
+            rows, cols = self._match(self._scores(self.boxes[:n], boxes, confs >= NEW_TRACK_CONF))
+            self.boxes[rows] = boxes[cols]
+            self.ages[rows] = 0
+            matched[cols] = True
+            det_ids[cols] = self.ids[rows]
+
+        # 丢失超过 max_age 帧的轨迹移除，其余轨迹保持在数组前部
+        alive = self.ages[:n] <= self.max_age
+        if not alive.all():
+            self.count = n = int(alive.sum())
+            self.boxes[:n], self.ids[:n], self.ages[:n] = self.boxes[:len(alive)][alive], \
+                self.ids[:len(alive)][alive], self.ages[:len(alive)][alive]
+
+        # 未匹配的高分检测新建轨迹；数组已满时覆盖丢失最久的轨迹，没有丢失的轨迹时放弃
+        for j in np.flatnonzero(~matched & (confs >= NEW_TRACK_CONF)):
+            if self.count < self.max_tracks:
+                slot = self.count
+                self.count += 1
+            else:
+                slot = int(np.argmax(self.ages[:self.count]))
+                if self.ages[slot] == 0:
+                    continue
+            self.boxes[slot] = boxes[j]
+            self.ids[slot] = det_ids[j] = self.next_id
+            self.ages[slot] = 0
+            self.next_id += 1
+            matched[j] = True
+
+        if not matched.any():
+            return None
+        return boxes[matched].astype(int), det_ids[matched], confs[matched], clss[matched]
+
+    def reset(self):
+        self.count = 0
+        self.next_id = 1
+
+
+TRACKERS = {'bytetrack': ByteTrackAdapter, 'iou': IouTracker}
+
+
+def create_tracker(name=None, frame_rate=30):
+    """按名称创建跟踪器，未指定时使用 demo_v3.TRACKER"""
+    name = name or core.TRACKER
+    if name not in TRACKERS:
+        raise ValueError(f"未知的跟踪器 '{name}'，可选: {', '.join(TRACKERS)}")
+    return TRACKERS[name](frame_rate)
+
+
+class PredictTracking:
+    """model.predict + 独立跟踪器，代替 model.track(persist=True)"""
+
+    def __init__(self, model, tracker, imgsz=None):
+        self.model = model
+        self.tracker = tracker
+        self.kwargs = {'imgsz': imgsz} if imgsz else {}
+
+    def track(self, frame):
+        """返回与 extract_tracks 相同格式的结果"""
+        result = self.model.predict(frame, conf=TRACK_CONF, verbose=False, **self.kwargs)[0]
+        return self.tracker.update(*detections_of(result), frame.shape)
+
+    def track_batch(self, frames):
+        """整批推理，再按顺序逐帧更新跟踪器"""
+        results = self.model.predict(frames, conf=TRACK_CONF, verbose=False, **self.kwargs)
+        return [self.tracker.update(*detections_of(result), frame.shape) for result, frame in zip(results, frames)]
+
+
+def box_iou(a, b):
+    """两组 xyxy 框的 IoU 矩阵"""
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    inter_w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def id_switches(track_frames, iou_threshold=0.5, gap=None):
+    """
+    没有标注时估计ID切换：新出现的ID与 gap 帧内刚消失的某个ID的最后位置 IoU >= iou_threshold，
+    说明同一物体换了ID，记为一次切换。返回 (切换次数, 出现过的ID数, 跟踪框总数)
+    """
+    gap = gap or TRACK_BUFFER
+    last_seen = {}  # id -> (最后的框, 帧号)
+    switches = 0
+    detections = 0
+    for frame_index, tracks in enumerate(track_frames):
+        if tracks is None:
+            continue
+        boxes, ids = tracks[0], tracks[1]
+        detections += len(ids)
+        current = set(ids.tolist())
+        lost = [(track_id, box) for track_id, (box, seen) in last_seen.items()
+                if track_id not in current and frame_index - seen <= gap]
+        new = [i for i, track_id in enumerate(ids) if track_id not in last_seen]
+        if lost and new:
+            overlap = box_iou(boxes[new], np.array([box for _, box in lost]))
+            switches += int(np.count_nonzero(overlap.max(axis=1) >= iou_threshold))
+        for box, track_id in zip(boxes, ids):
+            last_seen[int(track_id)] = (box, frame_index)
+    return switches, len(last_seen), detections
+
+
+def detect_clip(model, video_path, imgsz=None):
+    """对整段视频运行 model.predict，返回 (逐帧检测结果, 画面尺寸, 帧率)"""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {video_path}")
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
+    kwargs = {'imgsz': imgsz} if imgsz else {}
+    frames = []
+    shape = None
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            shape = frame.shape
+            frames.append(detections_of(model.predict(frame, conf=TRACK_CONF, verbose=False, **kwargs)[0]))
+    finally:
+        cap.release()
+    return frames, shape, fps
+
+
+def run_tracker(name, detections, shape, fps):
+    """把缓存的检测结果逐帧交给跟踪器，返回 (逐帧跟踪结果, 每帧跟踪耗时列表)"""
+    tracker = create_tracker(name, fps)
+    track_frames, times = [], []
+    for boxes, confs, clss in detections:
+        start = time.perf_counter()
+        track_frames.append(tracker.update(boxes, confs, clss, shape))
+        times.append(time.perf_counter() - start)
+    return track_frames, times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ByteTrack 与内置 IoU 跟踪器的耗时 / ID切换 / 决策对比")
+    parser.add_argument("clips", nargs='+', help="录制的视频片段")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--imgsz", type=int, default=None, help="推理输入尺寸（默认使用模型的设置）")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    model = YOLO(args.model)
+    class_mask = core.build_class_mask(model.names)
+    for path in args.clips:
+        detections, shape, fps = detect_clip(model, path, args.imgsz)
+        if shape is None:
+            print(f"{path}: 没有读到画面，跳过")
+            continue
+        print(f"\n--- {path} ({len(detections)} 帧, {shape[1]}x{shape[0]}) ---")
+        print(f"{'跟踪器':<12}{'平均 ms/帧':>12}{'p99 ms/帧':>12}{'ID数':>8}{'ID切换':>8}{'切换/千框':>10}{'决策一致':>12}")
+        reference = None
+        for name in TRACKERS:
+            track_frames, times = run_tracker(name, detections, shape, fps)
+            switches, id_count, boxes = id_switches(track_frames)
+            commands = [command for _, command in core.run_decisions(track_frames, shape[1], class_mask)]
+            if reference is None:
+                reference = commands
+            same = sum(1 for a, b in zip(reference, commands) if a == b)
+            times_ms = np.array(times) * 1000
+            print(f"{name:<12}{times_ms.mean():>12.3f}{np.percentile(times_ms, 99):>12.3f}{id_count:>8}{switches:>8}"
+                  f"{switches * 1000 / max(boxes, 1):>10.2f}{f'{same}/{len(commands)}':>12}")
+
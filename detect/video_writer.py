@@ -0,0 +1,254 @@
+"""
+视频模式的结果写出。原来在主循环里同步调用 cv2.VideoWriter.write，mp4v 编码的耗时直接叠加在每帧的推理时间上。
+AsyncVideoWriter 把编码放到单独的进程：主循环只把画面复制进共享内存环形缓冲区（RING_SLOTS 个槽位），
+编码进程取出、缩放后写入文件，再把槽位还回来；环满时主循环等待空槽位，不丢帧。等待时每 ENCODER_POLL_INTERVAL
+检查一次编码进程，编码进程意外退出时抛出 RuntimeError，而不是一直等下去。
+
+两种写出方式都支持:
+- scale: 输出分辨率缩放比例（例如 0.5 为半尺寸），缩放在编码进程中完成
+- stride: 每隔几帧写一帧（输出视频的帧率相应降低）
+- overlay_only: 只写检测框和决策信息（黑色背景，不含原始画面），不需要复制整帧画面
+
+端到端对比（同一段视频分别用同步写出和编码进程运行 process_video_file，不显示窗口）:
+    python video_writer.py path/to/long_clip.mp4 --scale 0.5 --stride 2
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import demo_v3 as core
+
+RING_SLOTS = 8  # 共享内存环形缓冲区的槽位数
+ENCODER_POLL_INTERVAL = 0.5  # 等待槽位时检查编码进程是否存活的间隔（秒）
+ENCODER_CLOSE_TIMEOUT = 30.0  # close() 等待编码进程写完剩余帧的最长时间（秒），超时后终止编码进程
+FOURCC = 'mp4v'
+
+
+def output_size(frame_size, scale):
+    width, height = frame_size
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+def render_overlay(overlay, frame_size):
+    """在黑色背景上只绘制检测框、辅助线和状态信息；overlay 由 overlay_of() 生成"""
+    boxes, ids, left_bound, right_bound, state, tracked_id, command = overlay
+    canvas = np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+    for box, track_id in zip(boxes, ids):
+        cv2.rectangle(canvas, (int(box[0]), int(box[1])), (int(box[2]), int(box[3])), (0, 200, 255), 2)
+        cv2.putText(canvas, f"id:{track_id}", (int(box[0]), int(box[1]) - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                    (0, 200, 255), 2)
+    return core.draw_status(canvas, left_bound, right_bound, state, tracked_id, command)
+
+
+def overlay_of(state_machine, detections, command):
+    """overlay_only 模式下代替整帧画面传给写出器的内容（框的副本和状态机信息）"""
+    return (detections.boxes.copy(), detections.ids.copy(), state_machine.left_bound, state_machine.right_bound,
+            state_machine.state, state_machine.tracked_obstacle_id, command)
+
+
+def prepare(frame, overlay, frame_size, size, overlay_only):
+    image = render_overlay(overlay, frame_size) if overlay_only else frame
+    if (image.shape[1], image.shape[0]) != size:
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image
+
+
+class VideoOutput:
+    """同步写出（原来的方式），参数和接口与 AsyncVideoWriter 相同"""
+
+    def __init__(self, path, fps, frame_size, scale=1.0, stride=1, overlay_only=False):
+        self.path = path
+        self.frame_size = frame_size
+        self.size = output_size(frame_size, scale)
+        self.stride = stride
+        self.overlay_only = overlay_only
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*FOURCC), max(1.0, fps / stride), self.size)
+        self.submitted = 0
+
+    def write(self, frame_index, frame, overlay=None):
+        """frame_index 不是 stride 的整数倍时跳过；返回本帧是否写出"""
+        if frame_index % self.stride:
+            return False
+        self.writer.write(prepare(frame, overlay, self.frame_size, self.size, self.overlay_only))
+        self.submitted += 1
+        return True
+
+    def close(self):
+        self.writer.release()
+
+    def summary(self):
+        return f"同步写出 {self.submitted} 帧 ({self.size[0]}x{self.size[1]})"
+
+
+def _encoder_main(path, fps, frame_size, size, overlay_only, shm_name, slots, filled, free):
+    """编码进程：从 filled 取 (槽位, overlay)，写入视频后把槽位放回 free；收到 None 时退出"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = None if overlay_only else np.ndarray((slots, frame_size[1], frame_size[0], 3), dtype=np.uint8,
+                                                buffer=shm.buf)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*FOURCC), fps, size)
+    try:
+        while True:
+            item = filled.get()
+            if item is None:
+                break
+            slot, overlay = item
+            frame = ring[slot] if slot >= 0 else None
+            writer.write(prepare(frame, overlay, frame_size, size, overlay_only))
+            if slot >= 0:
+                free.put(slot)
+    finally:
+        writer.release()
+        del ring
+        shm.close()
+
+
+class AsyncVideoWriter:
+    """在单独的进程中编码，主循环通过共享内存环形缓冲区传递画面"""
+
+    def __init__(self, path, fps, frame_size, scale=1.0, stride=1, overlay_only=False, slots=RING_SLOTS):
+        self.path = path
+        self.frame_size = frame_size
+        self.size = output_size(frame_size, scale)
+        self.stride = stride
+        self.overlay_only = overlay_only
+        self.slots = slots
+        width, height = frame_size
+        # overlay_only 时不传画面，只需要一个占位的共享内存块
+        frame_bytes = 1 if overlay_only else slots * height * width * 3
+        self.shm = shared_memory.SharedMemory(create=True, size=frame_bytes)
+        self.ring = None if overlay_only else np.ndarray((slots, height, width, 3), dtype=np.uint8,
+                                                         buffer=self.shm.buf)
+        context = multiprocessing.get_context('spawn')
+        self.filled = context.Queue(maxsize=slots)
+        self.free = context.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.process = context.Process(
+            target=_encoder_main, name="video-encoder", daemon=True,
+            args=(path, max(1.0, fps / stride), frame_size, self.size, overlay_only, self.shm.name, slots,
+                  self.filled, self.free))
+        self.process.start()
+        self.submitted = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def write(self, frame_index, frame, overlay=None):
+        """把本帧交给编码进程；环满时等待空槽位。返回本帧是否写出"""
+        if frame_index % self.stride:
+            return False
+        if self.overlay_only:
+            self._put((-1, overlay))
+        else:
+            try:
+                slot = self.free.get_nowait()
+            except queue.Empty:
+                slot = self._wait(self.free.get)
+            if frame.shape[:2] != self.ring.shape[1:3]:
+                frame = cv2.resize(frame, self.frame_size)
+            self.ring[slot] = frame
+            self._put((slot, None))
+        self.submitted += 1
+        return True
+
+    def _put(self, item):
+        try:
+            self.filled.put_nowait(item)
+        except queue.Full:
+            self._wait(lambda timeout: self.filled.put(item, timeout=timeout))
+
+    def _wait(self, operation):
+        """带超时地重复 operation(timeout=...)，每次超时检查编码进程；编码进程已退出时抛出 RuntimeError"""
+        start = time.perf_counter()
+        while True:
+            try:
+                result = operation(timeout=ENCODER_POLL_INTERVAL)
+                break
+            except (queue.Empty, queue.Full):
+                self._check_encoder()
+        self.waits += 1
+        self.wait_time += time.perf_counter() - start
+        return result
+
+    def _check_encoder(self):
+        if not self.process.is_alive():
+            # 编码进程不会再取走队列中的数据，退出时不等待队列的后台线程
+            self.filled.cancel_join_thread()
+            raise RuntimeError(f"编码进程已退出（退出码 {self.process.exitcode}），{self.path} 未写完")
+
+    def close(self):
+        """等待编码进程写完剩余的帧；编码进程已退出时只释放共享内存，超过 ENCODER_CLOSE_TIMEOUT 时终止编码进程"""
+        try:
+            self._check_encoder()
+            self._wait(lambda timeout: self.filled.put(None, timeout=timeout))
+            self.process.join(ENCODER_CLOSE_TIMEOUT)
+            if self.process.is_alive():
+                print(f"编码进程 {ENCODER_CLOSE_TIMEOUT:.0f} s 内没有写完，已终止，{self.path} 可能不完整")
+                self.filled.cancel_join_thread()
+                self.process.terminate()
+                self.process.join()
+        except RuntimeError as e:
+            print(f"错误: {e}")
+        finally:
+            self.ring = None
+            self.shm.close()
+            self.shm.unlink()
+
+    def summary(self):
+        return (f"编码进程写出 {self.submitted} 帧 ({self.size[0]}x{self.size[1]})，"
+                f"环满等待 {self.waits} 次共 {self.wait_time * 1000:.0f} ms")
+
+
+def open_video_output(path, fps, frame_size, asynchronous=None, scale=None, stride=None, overlay_only=None):
+    """按 demo_v3.py 顶部的视频输出配置创建写出器"""
+    asynchronous = core.ASYNC_VIDEO_WRITER if asynchronous is None else asynchronous
+    scale = core.OUTPUT_SCALE if scale is None else scale
+    stride = core.OUTPUT_STRIDE if stride is None else stride
+    overlay_only = core.OUTPUT_OVERLAY_ONLY if overlay_only is None else overlay_only
+    writer_class = AsyncVideoWriter if asynchronous else VideoOutput
+    return writer_class(path, fps, frame_size, scale, max(1, stride), overlay_only)
+
+
+def run_once(model_path, video_path, output_path, asynchronous):
+    from ultralytics import YOLO
+
+    core.ASYNC_VIDEO_WRITER = asynchronous
+    # 每次使用新的模型实例，避免跟踪器状态在两次运行之间共享
+    return core.process_video_file(YOLO(model_path), video_path, output_path, headless=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="同步写出 / 编码进程写出的端到端对比")
+    parser.add_argument("video", help="用于测试的视频文件（越长越能体现编码开销）")
+    parser.add_argument("--model", default=core.MODEL_PATH, help="YOLO 模型路径")
+    parser.add_argument("--scale", type=float, default=core.OUTPUT_SCALE, help="输出分辨率缩放比例")
+    parser.add_argument("--stride", type=int, default=core.OUTPUT_STRIDE, help="每隔几帧写出一帧")
+    parser.add_argument("--overlay-only", action="store_true", help="只写检测框和决策信息")
+    parser.add_argument("--show", action="store_true", help="同时显示窗口（默认不显示，只比较写出开销）")
+    args = parser.parse_args()
+
+    core.VIDEO_DISPLAY = args.show
+    core.OUTPUT_SCALE, core.OUTPUT_STRIDE, core.OUTPUT_OVERLAY_ONLY = args.scale, args.stride, args.overlay_only
+    output_dir = tempfile.mkdtemp(prefix="video_writer_")
+    results = {}
+    for label, asynchronous in (("同步写出", False), ("编码进程", True)):
+        results[label] = run_once(args.model, args.video, os.path.join(output_dir, f"{int(asynchronous)}.mp4"),
+                                  asynchronous)
+    if any(stats is None for stats in results.values()):
+        raise SystemExit(1)
+
+    print("\n--- 同步写出 vs 编码进程（含结束时等待编码完成） ---")
+    print(f"{'方式':<10}{'帧数':>8}{'FPS':>10}{'主进程CPU ms/帧':>18}")
+    for label, stats in results.items():
+        print(f"{label:<10}{stats['frames']:>8}{stats['fps']:>10.1f}{stats['cpu_ms_per_frame']:>18.1f}")
+    sync_stats, async_stats = results["同步写出"], results["编码进程"]
+    if sync_stats['fps'] > 0:
+        print(f"端到端加速: {async_stats['fps'] / sync_stats['fps']:.2f}x "
+              f"(scale={args.scale}, stride={args.stride}, overlay_only={args.overlay_only})")
+    print(f"输出视频保存在 {output_dir}")